@@ -4,6 +4,7 @@ from __future__ import print_function
 import os, sys
 import struct
 from icecube.domtest import rapcal, hits, domcal
+from icecube.daq.demux import HitDemux
 from getopt import getopt
 
 def usage():
@@ -25,29 +26,25 @@ for o, a in opts:
 basename = args.pop(0)
 
 fhit = open(basename + '.hit', 'rb')
-tcal = rapcal.TimeCalibrator(open(basename + '.tcal', 'rb'))
-fout = dict()
+dmx = HitDemux('.', max_open=64)
 
-nrec = 0
-
-while nrec < maxrec:
-    nrec += 1
-    # Read the header
-    hdr = fhit.read(32)
-    if len(hdr) != 32: break
-    recl, fmt, mbid, utc = struct.unpack('>iiq8xq', hdr)
-    buf = fhit.read(recl-32)
-    if do_tcal:
-        hit = hits.domhit("%12.12x" % mbid)
-        hit.decode(buf)
-        tcal.translateDOMtoDOR(hit)
-        utc = hit.utclk
-    if mbid not in fout:
-        fout[mbid] = open(("%12.12x" % mbid) + '.hit', 'wb')
-    fout[mbid].write(
-        struct.pack(
-            '>iiqiiq', recl, fmt, mbid, 0, 0, utc
-            )
-        )
-    fout[mbid].write(buf)
-    
+if not do_tcal and maxrec == 1000000000:
+    # Plain split - route the records in large chunks
+    dmx.demux(fhit)
+else:
+    tcal = rapcal.TimeCalibrator(open(basename + '.tcal', 'rb'))
+    nrec = 0
+    while nrec < maxrec:
+        nrec += 1
+        # Read the header
+        hdr = fhit.read(32)
+        if len(hdr) != 32: break
+        recl, fmt, mbid, utc = struct.unpack('>iiq8xq', hdr)
+        buf = fhit.read(recl-32)
+        if do_tcal:
+            hit = hits.domhit("%12.12x" % mbid)
+            hit.decode(buf)
+            tcal.translateDOMtoDOR(hit)
+            utc = hit.utclk
+        dmx.write(mbid, struct.pack('>iiqiiq', recl, fmt, mbid, 0, 0, utc) + buf)
+dmx.close()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+# Compare the table-driven delta decoder with the reference decoder
+# on the delta-compressed hits of captured payload files (type 3 and
+# 18 hits and the hit records of type 19/20/21 events).
+
+from __future__ import print_function
+import sys
+import time
+from struct import pack
+from icecube.daq.payload import read_payloads, DeltaSenderHit, \
+     DeltaCompressedHitPayload, DeltaHitRecord
+from icecube.daq.slchit import DeltaCompressedHit, delta_codec
+from icecube.daq.deltacodec import delta_decoder
+from icecube.daq.stream import open_daq_stream
+
+def hit_buffers(p):
+    if isinstance(p, DeltaSenderHit):
+        yield pack(">qII", p.domclk, p.word0, p.word2) + bytes(p.data)
+    elif isinstance(p, DeltaCompressedHitPayload):
+        yield bytes(p.data)
+    elif p.type == 21:
+        for tr in p.trigger_records:
+            for h in tr.hits:
+                if isinstance(h, DeltaHitRecord): yield bytes(h.data)
+    elif p.type in (19, 20):
+        for rd in p.readout_data:
+            for d in rd.data:
+                if isinstance(d, DeltaCompressedHitPayload):
+                    yield bytes(d.data)
+
+def decode_all(hits, codec):
+    out = [ ]
+    for h in hits:
+        c = codec(h.buf[8:])
+        if h.fadc_avail: out.append(c.decode(256))
+        if h.atwd_avail:
+            for i in range(h.atwd_channels + 1):
+                out.append(c.decode(128))
+    return out
+
+hits = [ ]
+seen = set()
+for filename in sys.argv[1:]:
+    f = open_daq_stream(filename)
+    for p in read_payloads(f, types=(3, 18, 19, 20, 21)):
+        for buf in hit_buffers(p):
+            # Hits appear in both trigger records and readouts
+            if buf not in seen:
+                seen.add(buf)
+                hits.append(DeltaCompressedHit(buf))
+    f.close()
+
+if len(hits) == 0:
+    print("Usage: %s payload-file ... (no delta-compressed hits found)" %
+          sys.argv[0])
+    sys.exit(1)
+
+delta_decoder(b"")              # build the lookup table up front
+results = [ ]
+for codec in (delta_codec, delta_decoder):
+    t0 = time.time()
+    results.append(decode_all(hits, codec))
+    results[-1] = (results[-1], time.time() - t0)
+nsample = sum([ len(w) for w in results[0][0] ])
+print("%d hits, %d samples" % (len(hits), nsample))
+for name, (w, dt) in zip(("delta_codec", "delta_decoder"), results):
+    print("%-14s %8.3f s %8.3f us/sample" %
+          (name, dt, 1.0E6 * dt / max(nsample, 1)))
+print("speed-up %.1f, identical output: %s" %
+      (results[0][1] / results[1][1], results[0][0] == results[1][0]))
@@ -3,70 +3,73 @@
 from __future__ import print_function
 import sys
 from pickle import load
-from icecube.domtest.payload import decode_payload, tohitstack
+from icecube.daq.payload import read_payloads
+from icecube.daq.stream import open_daq_stream
+from icecube.daq.runsummary import RunSummary, SummaryCache, EVENT_TYPES
 from getopt import getopt
 
-triggerHisto = dict()
-
 nevent = 2000000000
 
-def triggerStats(trig):
-    if trig.srcid // 1000 == 6:
-        # GlobalTrigger
-        for t in trig.hits:
-            triggerStats(t)
-    else:
-        if trig.trigger_type not in triggerHisto: triggerHisto[trig.trigger_type] = 0
-        triggerHisto[trig.trigger_type] += 1
-
 opts, args = getopt(sys.argv[1:], 'n:')
 for o, a in opts:
     if o == '-n':
         nevent = int(a)
         
 domdb = args.pop(0)
-doms = load(open(domdb, 'r'))
+doms = load(open(domdb, 'rb'))
 
 db   = dict()
 for d in doms: db[d[0]] = d
 
-events = list()
-nev    = 0
-
-while len(args) > 0:
-    f = open(args.pop(0), 'rb')
-    while nev < nevent:
-        evt = decode_payload(f)
-        nev += 1
-        if evt is None: break
-        events.append(evt)
+if nevent < 2000000000:
+    # Partial files cannot be cached
+    summary = RunSummary(args)
+    nev = 0
+    for filename in args:
+        f = open_daq_stream(filename)
+        for evt in read_payloads(f, types=EVENT_TYPES):
+            if nev == nevent: break
+            summary.add(evt)
+            nev += 1
+        f.close()
+else:
+    summary = SummaryCache().summarize(args)
 
-hits = tohitstack(events)
+if summary.nevents == 0:
+    print("No events found")
+    sys.exit(1)
 
-print("DAQ thinks this is run #", events[0].run_number)
-print("Found", len(events), "events,", len(list(hits.keys())), "DOMs.")
-runlength = 1.0E-10*(events[-1].utime - events[0].utime)
+run = sorted(summary.subruns.items(), key=lambda x: x[1][1])[0][0][0]
+print("DAQ thinks this is run #", run)
+print("Found", summary.nevents, "events,", len(summary.doms), "DOMs.")
+runlength = summary.timespan()
 print("Run length is %.1f" % runlength)
-print("Event rate is %.3f Hz" % (len(events)/runlength))
+print("Event rate is %.3f Hz" % (summary.nevents/runlength))
+
+# Count the triggers below the global trigger
+triggerHisto = dict()
+for (srcid, trig_id, cfgid), num in list(summary.triggers.items()):
+    if srcid // 1000 == 6: continue
+    triggerHisto[trig_id] = triggerHisto.get(trig_id, 0) + num
 
-for evt in events:
-    triggerStats(evt.trigger_request)
-    
 for trig_id, num in list(triggerHisto.items()):
     print("Trigger ID:", trig_id, "-", num, " - rate %.2f" % (num / runlength)) 
     
 rates = dict()
 nhits = 0
-for mbid, hlist in list(hits.items()):
-    nhits += len(hlist)
-    t0 = 1.0E-10 * hlist[0].utclk
-    t1 = 1.0E-10 * hlist[-1].utclk
-    beacons = [ x for x in hlist if x.evt_trig_flag == 1 ]
+for mbid, (nhit, nbeacon, t0, t1) in list(summary.doms.items()):
+    nhits += nhit
+    t0 = 1.0E-10 * t0
+    t1 = 1.0E-10 * t1
     hrate = brate = 0.0
     if t1 > t0:
-        hrate = 1000.0 * len(hlist) / (t1-t0)
-        brate = 1000.0 * len(beacons) / (t1-t0)
-    rates[db[mbid][3]] = (len(hlist), len(beacons), t0, t1, hrate, brate)
+        hrate = 1000.0 * nhit / (t1-t0)
+        brate = 1000.0 * nbeacon / (t1-t0)
+    if mbid in db:
+        loc = db[mbid][3]
+    else:
+        loc = str(mbid)
+    rates[loc] = (nhit, nbeacon, t0, t1, hrate, brate)
 
 print('DOM hit summary information for all discovered DOMs follows')
 print('Total # of hits:', nhits)
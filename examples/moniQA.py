@@ -4,34 +4,42 @@ from __future__ import print_function
 from builtins import range
 import sys
 from pickle import load
-from icecube.domtest.payload import decode_payload
-from icecube.domtest.monitoring import *
-
-def sum(lx):
-    s = 0.0
-    for x in lx: s += x
-    return x
+import numpy
+from icecube.daq.monitable import read_moni_table
 
 args = sys.argv[1:]
+if len(args) < 2:
+    print("Usage %s domdb-pickle file ..." % sys.argv[0])
+    sys.exit(-1)
 domdb = args.pop(0)
-doms = load(open(domdb, 'r'))
+doms = load(open(domdb, 'rb'))
 db   = dict()
 for d in doms: db[d[0]] = d
 
-monitoring = dict()
-while len(args) > 0:
-    f = open(args.pop(0), 'rb')
-    while True:
-        mp = decode_payload(f)
-        if mp is None: break
-        mbid = '%12.12x' % mp.mbid
-        domid = db[mbid][3]
-        if isinstance(mp.rec, HardwareMonitorRecord): 
-            if domid not in monitoring: monitoring[domid] = list()
-            monitoring[domid].append(mp.rec)
-                
+# Read the hardware records of each file into a table
+mbids = [ ]
+index = dict()
+dom = [ ]
+spe = [ ]
+mpe = [ ]
+for filename in args:
+    f = open(filename, 'rb')
+    t = read_moni_table(f, 'payload')
+    f.close()
+    for mbid in t.doms:
+        if mbid not in index:
+            index[mbid] = len(mbids)
+            mbids.append(mbid)
+    rows = numpy.array([ index[mbid] for mbid in t.doms ], 'i4')
+    dom.append(rows[t['dom']])
+    spe.append(t['spe_rate'])
+    mpe.append(t['mpe_rate'])
+dom = numpy.concatenate(dom)
+spe = numpy.concatenate(spe)
+mpe = numpy.concatenate(mpe)
+
 # Summarize stats
-domids = list(monitoring.keys())
+domids = [ db[mbid][3] for mbid in mbids ]
 
 for string in range(1, 81):
     onstr = [ int(domid[3:5]) for domid in domids if int(domid[0:2]) == string ]
@@ -43,23 +51,13 @@ for string in range(1, 81):
 #        print "String", string, "in-ice:", len(inice), "icetop:", len(icetop)
 #        print missii
 #        print missit
-        
-for domid in sorted(domids):
-    mlist = monitoring[domid]
-    t0 = mlist[0].timestamp * 1.0E-10
-    t2 = mlist[-1].timestamp * 1.0E-10
-    n  = len(mlist)
-    mx = [ x for x in mlist if x.getSPERate() > 0 ]
-    t1 = mx[0].timestamp * 1.0E-10
-    t3 = mx[-1].timestamp * 1.0E-10
-    if len(mx) > 0:
-        avgsperate = sum([ x.getSPERate() for x in mx ]) / len(mx)
-        avgmperate = sum([ x.getMPERate() for x in mx ]) / len(mx)
-    else:
-        avgsperate = 0.0
-        avgmperate = 0.0
-    print(domid, '%.1f %.1f' % (avgsperate, avgmperate))
-    #print domid, n, '%.3f' % t0, '%.3f' % t1, '%.3f' % t2, '%.3f' % t3,\
-    #    '%.1f' % (n / (t2 - t0)), '(%.1f:%.1f)' % (avgsperate, avgmperate)
-    
 
+# Average rates of the records with a non-zero SPE rate, per DOM
+live = spe > 0
+n = numpy.bincount(dom[live], minlength=len(mbids))
+avgsperate = numpy.bincount(dom[live], spe[live], len(mbids)) / \
+    numpy.maximum(n, 1)
+avgmperate = numpy.bincount(dom[live], mpe[live], len(mbids)) / \
+    numpy.maximum(n, 1)
+for domid, i in sorted(zip(domids, range(len(mbids)))):
+    print(domid, '%.1f %.1f' % (avgsperate[i], avgmperate[i]))
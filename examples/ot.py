@@ -49,7 +49,7 @@ while len(args) > 0:
 f = open(hitfile, 'rb')
 while n > 0:
     n -= 1
-    hit = nextHit(f)
+    hit = nextHit(f, lazy=True)
     if hit is None: break
     if hit.domid not in calibs: continue
     cal = calibs[hit.domid]
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+# Time read_payloads_parallel() against the serial read_payloads() on
+# the payload files given, for 1, 2, 4, ... workers up to the number
+# of CPUs, e.g.
+#   parallelBench.py physics_*.dat
+
+from __future__ import print_function
+import multiprocessing
+import os
+import sys
+import time
+from icecube.daq.payload import read_payloads
+from icecube.daq.parallel import read_payloads_parallel
+
+def event_uid(p):
+    """The reduction done in the workers - keep just the event uid."""
+    if p.type in (13, 19, 20, 21): return p.uid
+
+def main(files):
+    mb = sum([ os.path.getsize(f) for f in files ]) * 1.0E-6
+    t0 = time.time()
+    n = 0
+    for filename in files:
+        f = open(filename, 'rb')
+        n += len([ p for p in read_payloads(f) if event_uid(p) is not None ])
+        f.close()
+    serial = time.time() - t0
+    print("%.1f MB, %d events" % (mb, n))
+    print("serial            : %6.2f s %8.1f MB/s" % (serial, mb / serial))
+    workers = 1
+    while True:
+        for merge in (False, True):
+            t0 = time.time()
+            m = len(list(read_payloads_parallel(files, workers, merge,
+                                                func=event_uid)))
+            dt = time.time() - t0
+            assert m == n
+            print("%2d workers%s : %6.2f s %8.1f MB/s  x%.2f" %
+                  (workers, merge and ' merged' or '       ', dt, mb / dt,
+                   serial / dt))
+        if workers >= multiprocessing.cpu_count(): break
+        workers = min(2 * workers, multiprocessing.cpu_count())
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage %s file ..." % sys.argv[0])
+        sys.exit(-1)
+    main(sys.argv[1:])
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+# Measure the memory held per decoded event, as fileQA.py holds it, for
+# the __slots__ payload classes and for the same objects with a
+# per-instance __dict__ as the payload classes used to have.
+
+from __future__ import print_function
+import sys
+import gc
+import tracemalloc
+from icecube.daq.payload import read_payloads
+
+class DictObject(object):
+    pass
+
+def todict(obj):
+    """Rebuild a decoded payload tree out of __dict__ objects."""
+    if isinstance(obj, list):
+        return [ todict(x) for x in obj ]
+    if isinstance(obj, tuple):
+        return tuple([ todict(x) for x in obj ])
+    slots = [ ]
+    for cls in type(obj).__mro__:
+        slots += getattr(cls, '__slots__', ())
+    if len(slots) == 0:
+        return obj
+    d = DictObject()
+    for name in slots:
+        if hasattr(obj, name):
+            setattr(d, name.lstrip('_'), todict(getattr(obj, name)))
+    return d
+
+def measure(func):
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    x = func()
+    gc.collect()
+    return x, tracemalloc.get_traced_memory()[0] - before
+
+tracemalloc.start()
+print("%-40s %8s %12s %12s" % ("file", "events", "slots B/evt", "dict B/evt"))
+for filename in sys.argv[1:]:
+    f = open(filename, 'rb')
+    events, nslots = measure(lambda: [ e for e in read_payloads(f)
+                                       if hasattr(e, 'uid') ])
+    f.close()
+    del events
+    f = open(filename, 'rb')
+    events, ndict = measure(lambda: [ todict(e) for e in read_payloads(f)
+                                      if hasattr(e, 'uid') ])
+    f.close()
+    n = len(events)
+    del events
+    print("%-40s %8d %12.0f %12.0f" %
+          (filename, n, float(nslots) / max(n, 1), float(ndict) / max(n, 1)))
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+# Compare the vectorized SN scaler rebinning of snseries with the
+# supernova.rebin() loop, in DOM-seconds of scalers processed per
+# second.  Uses the supernova payloads of the files given, or
+# synthetic records for 5000 DOMs if there are none.
+
+from __future__ import print_function
+import random
+import sys
+import time
+from struct import pack
+from icecube.daq.supernova import SNData, SNPayloadReader, rebin
+from icecube.daq.snseries import SNTimeSeries, DOM_BIN
+from icecube.daq.stream import open_daq_stream
+
+def synthetic(ndom=5000, seconds=2):
+    rng = random.Random(1)
+    recs = [ ]
+    n = int(1.0E+10 / DOM_BIN)          # about one second per record
+    for d in range(ndom):
+        t = 10**13 + rng.randrange(DOM_BIN)
+        for s in range(seconds):
+            data = pack(">hh", 10 + n, 300) + b"\0" * 6 + \
+                bytes(bytearray([ rng.randrange(4) for i in range(n) ]))
+            recs.append(SNData(data, d, t))
+            t += n * DOM_BIN
+    return recs
+
+recs = [ ]
+for filename in sys.argv[1:]:
+    f = open_daq_stream(filename)
+    recs += list(SNPayloadReader(f))
+    f.close()
+if len(recs) == 0:
+    recs = synthetic()
+
+bw = 5000000000
+start = min([ r.utc for r in recs ]) // bw * bw
+domsec = 1.0E-10 * DOM_BIN * sum([ len(r.scalers) for r in recs ])
+
+# The loop is slow - time it on a sample of the records
+sample = recs[:max(1, len(recs) // 50)]
+t0 = time.time()
+a = [ 0 ] * 16
+for r in sample:
+    rebin(a, start, bw, r.scalers, r.utc, DOM_BIN)
+t1 = time.time()
+loop = 1.0E-10 * DOM_BIN * sum([ len(r.scalers) for r in sample ]) / (t1 - t0)
+
+t0 = time.time()
+ts = SNTimeSeries(bw, start)
+for i in range(0, len(recs), 5000):
+    ts.addBatch(recs[i:i + 5000])
+t1 = time.time()
+
+print("%d records, %.0f DOM-seconds" % (len(recs), domsec))
+print("rebin loop   : %10.0f DOM-s/s" % loop)
+print("SNTimeSeries : %10.0f DOM-s/s" % (ts.dom_seconds / (t1 - t0)))
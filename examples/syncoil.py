@@ -20,7 +20,7 @@ def read_hits(f):
     n = 0
     while n < 10000:
         n += 1
-        hit = nextHit(f)
+        hit = nextHit(f, lazy=True)
         if hit is None: return hits
         hits.append(hit)
     return hits
@@ -0,0 +1,163 @@
+"""
+Per-DOM charge histograms from the chargestamps of compressed hits.
+
+The header of a delta-compressed hit carries a chargestamp - the peak
+FADC sample, its neighbours and its position - so a charge estimate
+needs no waveform decoding.  A ChargeMap collects the header words of
+the hits it is given and histograms them per DOM in vectorized
+batches.  ChargeMaps filled by parallel workers are combined with
+merge(); chargemap_files() does both for a list of payload files.
+"""
+
+from builtins import object
+import multiprocessing
+from struct import Struct
+import numpy
+from .payload import read_payloads, DeltaCompressedHitPayload, DeltaHitRecord
+from .slchit import SLCHit
+from .hitarrays import slc_header_columns
+from .stream import open_daq_stream
+
+_words = Struct(">II")
+
+class ChargeMap(object):
+    """
+    Histograms of the chargestamp charge - the sum of the three
+    chargestamp samples - and of the chargestamp peak position, per DOM.
+        - cmap = ChargeMap()
+        - cmap.addEvent(evt)    : add the compressed hits of an event
+        - cmap.addHits(hits)    : add SLCHit objects, e.g. evt.getHits()
+        - cmap.doms             : DOM keys - '%12.12x' mainboard IDs, or
+                                  channel IDs for type-21 events
+        - cmap.getCharge(dom)   : charge histogram of a DOM
+        - cmap.getPeak(dom)     : peak position histogram of a DOM
+    Charges of max_charge or more are counted in the last bin.
+    """
+    def __init__(self, nbins=128, max_charge=3072, batch=65536):
+        self.nbins = nbins
+        self.max_charge = max_charge
+        self.batch = batch
+        self.doms = [ ]
+        self.index = { }
+        self.charge = numpy.zeros((0, nbins), 'i8')
+        self.peak = numpy.zeros((0, 16), 'i8')
+        self.pending_dom = [ ]
+        self.pending_words = [ ]
+
+    def __add(self, dom, words):
+        i = self.index.get(dom)
+        if i is None:
+            i = self.index[dom] = len(self.doms)
+            self.doms.append(dom)
+        self.pending_dom.append(i)
+        self.pending_words.append(words)
+        if len(self.pending_dom) >= self.batch:
+            self.flush()
+
+    def addEvent(self, evt):
+        """Add the delta-compressed hits of a type 13/19/20/21 event."""
+        if evt.type == 21:
+            seen = set()
+            for tr in evt.trigger_records:
+                for h in tr.hits:
+                    if not isinstance(h, DeltaHitRecord) or id(h) in seen \
+                       or len(h.data) < 16:
+                        continue
+                    seen.add(id(h))
+                    self.__add(h.chanid, _words.unpack_from(h.data, 8))
+            return
+        for rd in evt.readout_data:
+            for d in rd.data:
+                if isinstance(d, DeltaCompressedHitPayload) and \
+                   len(d.data) >= 16:
+                    self.__add('%12.12x' % d.mbid,
+                               _words.unpack_from(d.data, 8))
+
+    def addHits(self, hits):
+        """Add compressed hits; hits of other kinds are skipped."""
+        for h in hits:
+            if isinstance(h, SLCHit):
+                self.__add(h.mbid, h.words)
+
+    def flush(self):
+        """Histogram the hits added since the last flush."""
+        ndom = len(self.doms)
+        if ndom > len(self.charge):
+            self.charge = numpy.concatenate((self.charge,
+                numpy.zeros((ndom - len(self.charge), self.nbins), 'i8')))
+            self.peak = numpy.concatenate((self.peak,
+                numpy.zeros((ndom - len(self.peak), 16), 'i8')))
+        if len(self.pending_dom) == 0: return
+        dom = numpy.array(self.pending_dom, 'i8')
+        words = numpy.array(self.pending_words, 'i8') & 0xffffffff
+        self.pending_dom = [ ]
+        self.pending_words = [ ]
+        c = slc_header_columns(words)
+        q = c.chargestamp_pre.astype('i8') + c.chargestamp_max + \
+            c.chargestamp_post
+        bins = numpy.minimum(q * self.nbins // self.max_charge, self.nbins - 1)
+        self.charge += numpy.bincount(dom * self.nbins + bins,
+            minlength=ndom * self.nbins).reshape(ndom, self.nbins)
+        self.peak += numpy.bincount(dom * 16 + c.chargestamp_pos,
+            minlength=ndom * 16).reshape(ndom, 16)
+
+    def merge(self, other):
+        """Add the histograms of the ChargeMap other to this one."""
+        if (other.nbins, other.max_charge) != (self.nbins, self.max_charge):
+            raise ValueError("Cannot merge charge maps with different bins")
+        other.flush()
+        for dom in other.doms:
+            if dom not in self.index:
+                self.index[dom] = len(self.doms)
+                self.doms.append(dom)
+        self.flush()
+        rows = [ self.index[dom] for dom in other.doms ]
+        self.charge[rows] += other.charge
+        self.peak[rows] += other.peak
+
+    def getCharge(self, dom):
+        self.flush()
+        return self.charge[self.index[dom]]
+
+    def getPeak(self, dom):
+        self.flush()
+        return self.peak[self.index[dom]]
+
+    def binEdges(self):
+        """The lower edges of the charge bins."""
+        return numpy.arange(self.nbins) * (float(self.max_charge) / self.nbins)
+
+def chargemap_file(filename, nbins=128, max_charge=3072):
+    """Return the ChargeMap of the events in one payload file."""
+    cmap = ChargeMap(nbins, max_charge)
+    f = open_daq_stream(filename)
+    try:
+        for evt in read_payloads(f, types=(13, 19, 20, 21)):
+            cmap.addEvent(evt)
+    finally:
+        f.close()
+    cmap.flush()
+    return cmap
+
+def _chargemap_task(args):
+    return chargemap_file(*args)
+
+def chargemap_files(files, workers=None, nbins=128, max_charge=3072):
+    """
+    Return the merged ChargeMap of a list of payload files, filled by
+    a pool of worker processes (default: one per CPU).
+    """
+    total = ChargeMap(nbins, max_charge)
+    if workers == 1:
+        for f in files:
+            total.merge(chargemap_file(f, nbins, max_charge))
+        return total
+    pool = multiprocessing.Pool(workers)
+    try:
+        for cmap in pool.imap(_chargemap_task,
+                              [ (f, nbins, max_charge) for f in files ]):
+            total.merge(cmap)
+    finally:
+        pool.terminate()
+        pool.join()
+    return total
@@ -0,0 +1,251 @@
+"""
+Table-driven codec for the delta-compressed waveform format.
+
+The waveforms of delta-compressed hits are stored as sample-to-sample
+differences packed LSB-first with an adaptive width of 1, 2, 3, 6 or
+11 bits.  The code 2**(width-1) switches to the next wider width and a
+difference smaller than the width's threshold switches back to the
+next narrower one; each waveform starts at 3 bits.  See
+icecube.daq.slchit.delta_codec for the reference decoder.
+
+Rather than extracting one code at a time, delta_decoder looks up the
+next 12 bits of the stream in a table holding all the differences
+completely contained in them for the current width.  delta_encoder
+writes the same format, and encode_hit() builds the header words and
+waveform data of a delta-compressed hit.
+"""
+
+from builtins import range
+from builtins import object
+from itertools import accumulate
+
+WIDTHS      = (1, 2, 3, 6, 11)
+THRESHOLDS  = (0, 1, 2, 4, 32)
+START       = 2                 # index of the 3-bit state
+
+_WINDOW     = 12
+_MASK       = (1 << _WINDOW) - 1
+
+def _decode_code(window, pos, state, nbits):
+    """
+    Decode one difference from the bits of window starting at pos.
+    Returns (delta, pos, state) or None if it does not fit in nbits.
+    """
+    while True:
+        w = WIDTHS[state]
+        if pos + w > nbits: return None
+        val = (window >> pos) & ((1 << w) - 1)
+        pos += w
+        half = 1 << (w - 1)
+        if val > half: val -= 1 << w
+        if val != half: break
+        if state == len(WIDTHS) - 1:
+            raise ValueError("Bad shift up from %d bits" % w)
+        state += 1
+    if abs(val) < THRESHOLDS[state]: state -= 1
+    return val, pos, state
+
+def _build_table():
+    """
+    Flat table indexed by state << 12 | window: for each state and
+    12-bit window, the differences it holds, the bit position and the
+    (shifted) state after each of them, and the totals of the three.
+    """
+    table = [ ]
+    for state in range(len(WIDTHS)):
+        for window in range(1 << _WINDOW):
+            deltas, ends, states = [ ], [ ], [ ]
+            pos, st = 0, state
+            while True:
+                try:
+                    r = _decode_code(window, pos, st, _WINDOW)
+                except ValueError:
+                    # Leave the error to the slow path
+                    r = None
+                if r is None: break
+                d, pos, st = r
+                deltas.append(d)
+                ends.append(pos)
+                states.append(st << _WINDOW)
+            table.append((tuple(deltas), len(deltas), pos, st << _WINDOW,
+                          tuple(ends), tuple(states)))
+    return table
+
+_table = None
+
+class delta_decoder(object):
+    """
+    Decoder of a delta-compressed byte stream, a drop-in replacement
+    for slchit.delta_codec:
+        - codec = delta_decoder(buf)
+        - codec.decode(256) : list of the 256 FADC samples
+    """
+    def __init__(self, buf):
+        global _table
+        if _table is None:
+            _table = _build_table()
+        self.buf = bytes(buf)
+        self.pos = 0
+        self.register = 0
+        self.valid_bits = 0
+
+    def decode(self, length):
+        return list(accumulate(self.decode_deltas(length)))
+
+    def decode_deltas(self, length):
+        """Return the list of the next length sample differences."""
+        table = _table
+        buf = self.buf
+        nbuf = len(buf)
+        deltas = [ ]
+        count = 0
+        state = START << _WINDOW
+        reg, nbits, pos = self.register, self.valid_bits, self.pos
+        # Whole table entries fit while 12 or more samples are missing
+        limit = length - _WINDOW
+        while count < length:
+            if nbits < 24 and pos < nbuf:
+                # Top up the register to 56 or more bits
+                n = (63 - nbits) >> 3
+                if n > nbuf - pos: n = nbuf - pos
+                reg |= int.from_bytes(buf[pos:pos + n], 'little') << nbits
+                pos += n
+                nbits += n << 3
+            ds, k, used, st, ends, states = table[state | (reg & _MASK)]
+            if k > 0 and used <= nbits and count <= limit:
+                deltas.extend(ds)
+                count += k
+                reg >>= used
+                nbits -= used
+                state = st
+                continue
+            if k > length - count: k = length - count
+            while k > 0 and ends[k - 1] > nbits: k -= 1
+            if k > 0:
+                deltas.extend(ds[:k])
+                count += k
+                reg >>= ends[k - 1]
+                nbits -= ends[k - 1]
+                state = states[k - 1]
+                continue
+            # Wide codes and escapes are decoded one at a time
+            r = _decode_code(reg, 0, state >> _WINDOW, nbits)
+            if r is None:
+                raise ValueError("Delta-compressed stream exhausted")
+            delta, used, st = r
+            deltas.append(delta)
+            count += 1
+            reg >>= used
+            nbits -= used
+            state = st << _WINDOW
+        self.register, self.valid_bits, self.pos = reg, nbits, pos
+        return deltas
+
+class delta_encoder(object):
+    """
+    Encoder of waveforms into a delta-compressed byte stream:
+        - enc = delta_encoder()
+        - enc.encode(fadc); enc.encode(atwd0) ...
+        - enc.getvalue()    : the stream, padded to a whole byte
+    Each waveform starts at 3 bits, as delta_decoder.decode() expects.
+    """
+    def __init__(self):
+        self.out = bytearray()
+        self.register = 0
+        self.valid_bits = 0
+
+    def encode(self, samples):
+        out = self.out
+        reg, nbits = self.register, self.valid_bits
+        state = START
+        last = 0
+        for x in samples:
+            d = x - last
+            last = x
+            w = WIDTHS[state]
+            half = 1 << (w - 1)
+            while not -half < d < half:
+                if state == len(WIDTHS) - 1:
+                    raise ValueError("Sample difference %d too large" % d)
+                # The code half shifts the decoder up a width
+                reg |= half << nbits
+                nbits += w
+                state += 1
+                w = WIDTHS[state]
+                half = 1 << (w - 1)
+            reg |= (d & ((1 << w) - 1)) << nbits
+            nbits += w
+            if abs(d) < THRESHOLDS[state]: state -= 1
+            if nbits >= 32:
+                out += (reg & 0xffffffff).to_bytes(4, 'little')
+                reg >>= 32
+                nbits -= 32
+        self.register, self.valid_bits = reg, nbits
+
+    def getvalue(self):
+        n = (self.valid_bits + 7) >> 3
+        return bytes(self.out) + self.register.to_bytes(n, 'little')
+
+def delta_encode(waveforms):
+    """Return the delta-compressed stream of a list of waveforms."""
+    enc = delta_encoder()
+    for w in waveforms:
+        enc.encode(w)
+    return enc.getvalue()
+
+def _pad(samples, n):
+    """Cut or extend samples to n, repeating the last sample."""
+    samples = list(samples)[:n]
+    if len(samples) == 0: return [ 0 ] * n
+    return samples + [ samples[-1] ] * (n - len(samples))
+
+def chargestamp(fadc):
+    """
+    Return the chargestamp header word of an FADC waveform: the
+    position of the peak in the first 16 samples and the samples
+    around it, halved with the range bit set if any exceeds 9 bits.
+    """
+    head = list(fadc[:16])
+    if len(head) == 0: return 0
+    pos = head.index(max(head))
+    pre = head[max(pos - 1, 0)]
+    post = head[min(pos + 1, len(head) - 1)]
+    peak = head[pos]
+    word = 0
+    if max(pre, peak, post) > 0x1ff:
+        word = 0x80000000
+        pre, peak, post = pre >> 1, peak >> 1, post >> 1
+    return word | (pos << 27) | ((pre & 0x1ff) << 18) | \
+        ((peak & 0x1ff) << 9) | (post & 0x1ff)
+
+def encode_hit(fadc, atwd, atwd_chip=0, trigger=0, lc=0):
+    """
+    Delta-compress the waveforms of a hit.  fadc is a list of samples
+    (or None) and atwd a list of up to four channels (or None).
+    Returns (word0, word2, data) - the header words as read by
+    slchit.SLCHit and the compressed waveforms.  The FADC is stored
+    with 256 samples and the leading ATWD channels up to the last one
+    present with 128 samples each; shorter waveforms are extended by
+    repeating their last sample and missing channels are zero.
+    """
+    enc = delta_encoder()
+    word0 = ((trigger & 0x1fff) << 18) | ((lc & 0x3) << 16) | \
+        ((atwd_chip & 1) << 11)
+    word2 = 0
+    if fadc is not None and len(fadc) > 0:
+        enc.encode(_pad(fadc, 256))
+        word0 |= 0x8000
+        word2 = chargestamp(fadc)
+    chans = [ i for i in range(len(atwd)) if atwd[i] is not None ]
+    if len(chans) > 0:
+        for i in range(chans[-1] + 1):
+            if atwd[i] is None:
+                enc.encode([ 0 ] * 128)
+            else:
+                enc.encode(_pad(atwd[i], 128))
+        word0 |= 0x4000 | (chans[-1] << 12)
+    data = enc.getvalue()
+    size = 8 + len(data)
+    if size > 0x7ff:
+        raise ValueError("Compressed hit of %d bytes is too large" % size)
+    return word0 | size, word2, data
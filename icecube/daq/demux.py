@@ -0,0 +1,184 @@
+"""
+Per-DOM demultiplexing of TestDAQ .hit streams.
+
+A .hit stream is a sequence of records with a 32-byte header (record
+length, hit format, mainboard ID, reserved, UT time) - see
+util.nextHit().  HitDemux reads such a stream in large chunks and
+routes the records, unchanged, to one output file per mainboard ID.
+The records of each DOM are collected in a memory buffer and written
+out when it fills up, through at most max_open file handles which are
+closed least recently used first.  demux_files() splits several input
+files in parallel, keeping the records of each DOM in input order.
+"""
+
+from builtins import object
+from collections import OrderedDict
+import multiprocessing
+import os
+import shutil
+import tempfile
+from struct import Struct
+
+_header = Struct(">iiq8xq")
+
+CHUNK_SIZE = 1 << 22
+
+class HitDemux(object):
+    """
+    Demultiplex .hit records into the files pattern % mbid in outdir.
+        - dmx = HitDemux('split', max_open=64)
+        - dmx.demux(f)          : route all records of the stream f
+        - dmx.write(mbid, rec)  : route one record
+        - dmx.close()           : flush the buffers, close the files
+        - dmx.counts            : {mbid: number of records}
+    Output files are truncated when first written unless append is
+    True.  A truncated record at the end of a stream is dropped and
+    counted in dmx.truncated.
+    """
+    def __init__(self, outdir='.', pattern='%12.12x.hit', max_open=64,
+                 bufsize=1 << 16, append=False):
+        self.outdir = outdir
+        self.pattern = pattern
+        self.max_open = max_open
+        self.bufsize = bufsize
+        self.append = append
+        self.files = OrderedDict()
+        self.buffers = { }
+        self.started = set()
+        self.counts = { }
+        self.truncated = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def filename(self, mbid):
+        return os.path.join(self.outdir, self.pattern % mbid)
+
+    def write(self, mbid, rec):
+        buf = self.buffers.get(mbid)
+        if buf is None:
+            buf = self.buffers[mbid] = bytearray()
+        buf += rec
+        self.counts[mbid] = self.counts.get(mbid, 0) + 1
+        if len(buf) >= self.bufsize:
+            self.__flush(mbid)
+
+    def demux(self, f, chunk_size=CHUNK_SIZE):
+        """Route the records of the stream f; returns their number."""
+        n = 0
+        tail = b''
+        while True:
+            chunk = f.read(chunk_size)
+            if len(chunk) == 0: break
+            if len(tail) > 0:
+                chunk = tail + chunk
+            mv = memoryview(chunk)
+            pos = 0
+            while pos + 32 <= len(chunk):
+                recl, fmt, mbid, utc = _header.unpack_from(chunk, pos)
+                if recl < 32:
+                    raise ValueError("Bad .hit record length %d" % recl)
+                if pos + recl > len(chunk): break
+                self.write(mbid, mv[pos:pos + recl])
+                pos += recl
+                n += 1
+            tail = bytes(mv[pos:])
+            del mv
+        if len(tail) > 0:
+            self.truncated += 1
+        return n
+
+    def flush(self):
+        for mbid in list(self.buffers):
+            self.__flush(mbid)
+
+    def close(self):
+        self.flush()
+        while len(self.files) > 0:
+            mbid, f = self.files.popitem(last=False)
+            f.close()
+
+    def __flush(self, mbid):
+        buf = self.buffers.get(mbid)
+        if not buf: return
+        f = self.files.get(mbid)
+        if f is None:
+            if len(self.files) >= self.max_open:
+                oldest, g = self.files.popitem(last=False)
+                g.close()
+            if self.append or mbid in self.started:
+                mode = 'ab'
+            else:
+                mode = 'wb'
+                self.started.add(mbid)
+            f = self.files[mbid] = open(self.filename(mbid), mode)
+        else:
+            self.files.move_to_end(mbid)
+        f.write(buf)
+        del buf[:]
+
+def demux_file(path, outdir='.', pattern='%12.12x.hit', max_open=64,
+               append=False):
+    """Split the .hit file path per DOM; returns {mbid: records}."""
+    dmx = HitDemux(outdir, pattern, max_open, append=append)
+    f = open(path, 'rb')
+    try:
+        dmx.demux(f)
+    finally:
+        f.close()
+        dmx.close()
+    return dmx.counts
+
+def _demux_task(args):
+    path, outdir, max_open = args
+    return demux_file(path, outdir, '%12.12x', max_open)
+
+def demux_files(paths, outdir='.', pattern='%12.12x.hit', max_open=64,
+                workers=None):
+    """
+    Split several .hit files per DOM into the files pattern % mbid in
+    outdir, each DOM's records in input file order.  Each input is
+    split by a pool of worker processes (default: one per CPU) into
+    a scratch directory, and the parts are appended to the outputs
+    in input order as they become ready.  Returns {mbid: records}.
+    """
+    counts = { }
+    if workers == 1:
+        dmx = HitDemux(outdir, pattern, max_open)
+        for path in paths:
+            f = open(path, 'rb')
+            try:
+                dmx.demux(f)
+            finally:
+                f.close()
+        dmx.close()
+        return dmx.counts
+    scratch = tempfile.mkdtemp(dir=outdir)
+    pool = multiprocessing.Pool(workers)
+    try:
+        parts = [ os.path.join(scratch, '%d' % i) for i in range(len(paths)) ]
+        for part in parts:
+            os.mkdir(part)
+        tasks = [ (path, part, max_open) for path, part in zip(paths, parts) ]
+        started = set()
+        for part, part_counts in zip(parts, pool.imap(_demux_task, tasks)):
+            for mbid, n in part_counts.items():
+                mode = mbid in started and 'ab' or 'wb'
+                started.add(mbid)
+                src = open(os.path.join(part, '%12.12x' % mbid), 'rb')
+                dst = open(os.path.join(outdir, pattern % mbid), mode)
+                try:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+                finally:
+                    src.close()
+                    dst.close()
+                counts[mbid] = counts.get(mbid, 0) + n
+            shutil.rmtree(part)
+    finally:
+        pool.terminate()
+        pool.join()
+        shutil.rmtree(scratch, ignore_errors=True)
+    return counts
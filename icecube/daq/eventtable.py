@@ -0,0 +1,175 @@
+"""
+Columnar decoding of type-21 (v5) event payloads.
+
+Rather than building one Python object per hit record and trigger
+record, read_event21_table() decodes a range of type-21 events into
+NumPy structured arrays.  The hit records are described by their
+position in the source buffer; the waveform bytes are not copied.
+"""
+
+from builtins import range
+from builtins import object
+from struct import Struct
+import numpy
+from .payload import PayloadException
+
+EVENT_DTYPE = numpy.dtype([
+    ('offset',          'i8'),
+    ('utime',           'i8'),
+    ('span',            'u4'),
+    ('year',            'u2'),
+    ('uid',             'u4'),
+    ('run',             'u4'),
+    ('subrun',          'u4'),
+    ('hit_start',       'i8'),
+    ('hit_stop',        'i8'),
+    ('trigger_start',   'i8'),
+    ('trigger_stop',    'i8')
+    ])
+
+HIT_DTYPE = numpy.dtype([
+    ('event',           'i4'),
+    ('chanid',          'u2'),
+    ('utime',           'i8'),
+    ('flags',           'u1'),
+    ('rtype',           'u1'),
+    ('offset',          'i8'),
+    ('length',          'i4')
+    ])
+
+TRIGGER_DTYPE = numpy.dtype([
+    ('event',           'i4'),
+    ('type',            'i4'),
+    ('cfgid',           'i4'),
+    ('srcid',           'i4'),
+    ('start',           'i8'),
+    ('end',             'i8'),
+    ('hit_start',       'i8'),
+    ('hit_stop',        'i8')
+    ])
+
+_envelope   = Struct(">iiq")
+_event21    = Struct(">IHIIII")
+_reclen     = Struct(">H")
+_count      = Struct(">I")
+_trigrec    = Struct(">ii4I")
+
+class Event21Table(object):
+    """
+    Columnar view of a range of type-21 events.  Data members:
+        - events        : EVENT_DTYPE array, one row per event; the
+                          hit_start:hit_stop and trigger_start:trigger_stop
+                          slices select the event rows in hits and triggers
+        - hits          : HIT_DTYPE array, one row per hit record; offset
+                          and length locate the hit data (after the 10-byte
+                          record header) in buf
+        - triggers      : TRIGGER_DTYPE array, one row per trigger record
+        - trigger_hits  : indices into hits; trigger_hits[hit_start:hit_stop]
+                          are the hits of a trigger record
+        - buf           : the source buffer
+    """
+    def __init__(self, buf, events, hits, triggers, trigger_hits):
+        self.buf = buf
+        self.events = events
+        self.hits = hits
+        self.triggers = triggers
+        self.trigger_hits = trigger_hits
+
+    def getHitData(self, i):
+        """Return the data of hit record i as a memoryview of buf."""
+        h = self.hits[i]
+        return memoryview(self.buf)[h['offset']:h['offset'] + h['length']]
+
+    def getTriggerHits(self, i):
+        """Return the hit indices of trigger record i."""
+        t = self.triggers[i]
+        return self.trigger_hits[t['hit_start']:t['hit_stop']]
+
+def scan_event21(buf, start=0, stop=None, max_events=None):
+    """
+    Return the offsets of the type-21 payloads in buf between the byte
+    offsets start and stop, skipping payloads of other types.  Raises
+    PayloadException if a payload length is bad or runs past stop.
+    """
+    mv = memoryview(buf)
+    if stop is None: stop = len(mv)
+    offsets = [ ]
+    pos = start
+    while pos < stop:
+        if max_events is not None and len(offsets) >= max_events: break
+        if pos + 16 > stop:
+            raise PayloadException("Truncated payload envelope at offset %d"
+                                   % pos)
+        length, type, utime = _envelope.unpack_from(mv, pos)
+        if length < 16 or pos + length > stop:
+            raise PayloadException("Bad payload length %d at offset %d"
+                                   % (length, pos))
+        if type == 21: offsets.append(pos)
+        pos += length
+    return offsets
+
+def read_event21_table(buf, offsets=None, start=0, stop=None,
+                       max_events=None):
+    """
+    Decode type-21 events from buf (bytes, memoryview or mmap) into an
+    Event21Table.  The events are either given by their byte offsets -
+    for example from a PayloadIndex - or found by scan_event21().
+    """
+    mv = memoryview(buf)
+    if offsets is None:
+        offsets = scan_event21(mv, start, stop, max_events)
+
+    events   = numpy.zeros(len(offsets), EVENT_DTYPE)
+    hit_off  = [ ]
+    trigs    = [ ]
+    trighits = [ ]
+    ntrighit = 0
+
+    for iev in range(len(offsets)):
+        pos = offsets[iev]
+        length, type, utime = _envelope.unpack_from(mv, pos)
+        span, year, uid, run, subrun, nhits = _event21.unpack_from(mv, pos + 16)
+        pos += 38
+        hit_start = len(hit_off)
+        for i in range(nhits):
+            hit_off.append(pos)
+            pos += _reclen.unpack_from(mv, pos)[0]
+        ntrig, = _count.unpack_from(mv, pos)
+        pos += 4
+        trig_start = len(trigs)
+        for i in range(ntrig):
+            ttype, cfgid, srcid, t0, t1, n = _trigrec.unpack_from(mv, pos)
+            pos += 24
+            trigs.append((iev, ttype, cfgid, srcid, utime + t0, utime + t1,
+                          ntrighit, ntrighit + n))
+            trighits.append(numpy.frombuffer(mv, '>u4', n, pos) + hit_start)
+            ntrighit += n
+            pos += 4 * n
+        events[iev] = (offsets[iev], utime, span, year, uid, run, subrun,
+                       hit_start, len(hit_off), trig_start, len(trigs))
+
+    # Gather the hit record headers straight from the buffer bytes
+    raw = numpy.frombuffer(mv, 'u1')
+    off = numpy.array(hit_off, 'i8')
+    hits = numpy.zeros(len(off), HIT_DTYPE)
+    if len(off) > 0:
+        reclen = (raw[off].astype('i4') << 8) | raw[off + 1]
+        dt = numpy.zeros(len(off), 'i8')
+        for k in range(6, 10):
+            dt = (dt << 8) | raw[off + k]
+        hits['event']   = numpy.repeat(numpy.arange(len(events)),
+                                       events['hit_stop'] - events['hit_start'])
+        hits['rtype']   = raw[off + 2]
+        hits['flags']   = raw[off + 3]
+        hits['chanid']  = (raw[off + 4].astype('u2') << 8) | raw[off + 5]
+        hits['utime']   = events['utime'][hits['event']] + dt
+        hits['offset']  = off + 10
+        hits['length']  = reclen - 10
+
+    triggers = numpy.array(trigs, TRIGGER_DTYPE)
+    if len(trighits) > 0:
+        trigger_hits = numpy.concatenate(trighits).astype('i8')
+    else:
+        trigger_hits = numpy.zeros(0, 'i8')
+
+    return Event21Table(buf, events, hits, triggers, trigger_hits)
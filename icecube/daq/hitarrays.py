@@ -0,0 +1,227 @@
+"""
+Batch decoding of DOM hits into NumPy arrays.
+
+decode_eng_hits() turns a buffer of concatenated engineering-format
+records - as returned by DOMApp.getWaveformData() or found in the
+type-2 payloads read by readDHHits() - into per-hit header columns and
+dense (nhits, nsamples) waveform matrices.  Records sharing a layout
+are decoded together through a big-endian record dtype rather than
+one struct.unpack() per hit and channel.  decode_delta_waveforms()
+does the same for the waveforms of delta-compressed hits and
+slc_header_columns() for their header fields.
+"""
+
+from builtins import range
+from builtins import object
+from struct import Struct
+import numpy
+from .deltacodec import delta_decoder
+
+# Sample counts of the ATWD channel format nibble bits 2-3
+_ATWD_SAMPLES = (32, 64, 16, 128)
+_ATWD_COUNTS  = numpy.array(_ATWD_SAMPLES, 'i4')
+
+_reclen = Struct(">H")
+
+def atwd_format(nibble):
+    """
+    Return (dtype, nsamples) of an ATWD channel format nibble; nsamples
+    is 0 if the channel is not read out.
+    """
+    if nibble & 1 == 0:
+        return None, 0
+    if nibble & 2:
+        return '>i2', _ATWD_SAMPLES[(nibble >> 2) & 3]
+    return 'i1', _ATWD_SAMPLES[(nibble >> 2) & 3]
+
+def eng_record_dtype(length, nfadc, fmt0, fmt1):
+    """
+    NumPy dtype of an engineering record of length bytes with nfadc
+    FADC samples and the ATWD format bytes fmt0, fmt1.
+    """
+    fields = [ ('length',   '>u2'),
+               ('format',   '>u2'),
+               ('chip',     'u1'),
+               ('nfadc',    'u1'),
+               ('atwdfmt',  'u1', (2,)),
+               ('trigger',  'u1'),
+               ('spare',    'u1'),
+               ('domclk',   'u1', (6,)),
+               ('fadc',     '>u2', (nfadc,)) ]
+    for ich, nibble in enumerate((fmt0 & 0xf, fmt0 >> 4, fmt1 & 0xf, fmt1 >> 4)):
+        dt, n = atwd_format(nibble)
+        if n > 0:
+            fields.append(('atwd%d' % ich, dt, (n,)))
+    size = numpy.dtype(fields).itemsize
+    if size > length:
+        raise ValueError("Engineering record of %d bytes cannot hold "
+                         "%d bytes of samples" % (length, size))
+    if size < length:
+        fields.append(('pad', 'V%d' % (length - size)))
+    return numpy.dtype(fields)
+
+class EngHitBatch(object):
+    """
+    Decoded engineering records - data members, one row per hit:
+        - offset        : record offset in the source buffer
+        - length        : record length
+        - domclk        : 48-bit DOM clock
+        - atwd_chip     : 0 if atwd-a, 1 if atwd-b
+        - evt_trig_flag : trigger flag
+        - nfadc         : number of FADC samples
+        - natwd         : (nhits, 4) number of samples per ATWD channel
+        - fadc          : (nhits, max(nfadc)) int16 FADC samples
+        - atwd[i]       : (nhits, max(natwd[:,i])) int16 samples of ATWD
+                          channel i
+    Hits with fewer samples than the widest hit are padded with zeros.
+    """
+    def __len__(self):
+        return len(self.offset)
+
+def scan_eng_records(buf, start=0, stop=None):
+    """Return the offsets of the engineering records in buf."""
+    mv = memoryview(buf)
+    if stop is None: stop = len(mv)
+    offsets = [ ]
+    pos = start
+    while pos + 2 <= stop:
+        n, = _reclen.unpack_from(mv, pos)
+        if n < 16 or pos + n > stop:
+            raise ValueError("Bad engineering record length %d at %d" %
+                             (n, pos))
+        offsets.append(pos)
+        pos += n
+    return offsets
+
+def decode_eng_hits(buf, offsets=None):
+    """
+    Decode the concatenated engineering records in buf (bytes,
+    bytearray, memoryview or mmap), or the records at the given
+    offsets, into an EngHitBatch.
+    """
+    mv = memoryview(buf)
+    if offsets is None:
+        offsets = scan_eng_records(mv)
+    off = numpy.asarray(offsets, 'i8')
+    nhit = len(off)
+    raw = numpy.frombuffer(mv, 'u1')
+
+    b = EngHitBatch()
+    b.offset = off
+    b.length = (raw[off].astype('i4') << 8) | raw[off + 1]
+    b.atwd_chip = raw[off + 4] & 1
+    b.nfadc = raw[off + 5].astype('i4')
+    b.evt_trig_flag = raw[off + 8]
+    clk = numpy.zeros(nhit, 'i8')
+    for k in range(10, 16):
+        clk = (clk << 8) | raw[off + k]
+    b.domclk = clk
+
+    fmt0 = raw[off + 6].astype('i4')
+    fmt1 = raw[off + 7].astype('i4')
+    b.natwd = numpy.zeros((nhit, 4), 'i4')
+    for ich, nibble in enumerate((fmt0 & 0xf, fmt0 >> 4, fmt1 & 0xf, fmt1 >> 4)):
+        b.natwd[:, ich] = numpy.where(nibble & 1,
+                                      _ATWD_COUNTS[(nibble >> 2) & 3], 0)
+
+    b.fadc = numpy.zeros((nhit, b.nfadc.max() if nhit else 0), 'i2')
+    b.atwd = [ numpy.zeros((nhit, b.natwd[:, ich].max() if nhit else 0), 'i2')
+               for ich in range(4) ]
+
+    # Decode each distinct record layout in one go
+    key = (b.length.astype('i8') << 24) | (b.nfadc << 16) | (fmt0 << 8) | fmt1
+    layouts, which = numpy.unique(key, return_inverse=True)
+    for g in range(len(layouts)):
+        rows = numpy.nonzero(which == g)[0]
+        i = rows[0]
+        dt = eng_record_dtype(b.length[i], b.nfadc[i], fmt0[i], fmt1[i])
+        o = off[rows]
+        if len(layouts) == 1 and \
+           numpy.all(o == o[0] + dt.itemsize * numpy.arange(len(o))):
+            # Back-to-back records - decode straight from the buffer
+            recs = numpy.frombuffer(mv, dt, len(o), o[0])
+        else:
+            idx = o[:, numpy.newaxis] + numpy.arange(dt.itemsize)
+            recs = raw[idx].view(dt)[:, 0]
+        nf = b.nfadc[i]
+        if nf > 0:
+            b.fadc[rows, :nf] = recs['fadc']
+        for ich in range(4):
+            n = b.natwd[i, ich]
+            if n > 0:
+                b.atwd[ich][rows, :n] = recs['atwd%d' % ich]
+    return b
+
+def decode_delta_waveforms(hits):
+    """
+    Decode the waveforms of a list of slchit.DeltaCompressedHit objects
+    into the arrays (fadc, atwd): fadc is (nhits, 256) and atwd is
+    (nhits, 4, 128), both int16.  The waveforms a hit does not carry
+    (see slc_header_columns()) are left zero.
+    """
+    nhit = len(hits)
+    fadc = numpy.zeros((nhit, 256), 'i2')
+    atwd = numpy.zeros((nhit, 4, 128), 'i2')
+    for i in range(nhit):
+        h = hits[i]
+        codec = delta_decoder(h.buf[8:])
+        if h.fadc_avail:
+            fadc[i] = codec.decode_deltas(256)
+        if h.atwd_avail:
+            for ich in range(h.atwd_channels + 1):
+                atwd[i, ich] = codec.decode_deltas(128)
+    # The samples are the running sums of the decoded differences
+    numpy.cumsum(fadc, axis=1, out=fadc)
+    numpy.cumsum(atwd, axis=2, out=atwd)
+    return fadc, atwd
+
+class SLCHitColumns(object):
+    """
+    Header fields of N compressed hits as columns - the fields of
+    slchit.SLCHit: trigger, lc, fadc_avail, atwd_avail, atwd_channels,
+    atwd_chip, hit_size, and the chargestamp split into
+    chargestamp_pos, chargestamp_pre, chargestamp_max and
+    chargestamp_post, the three samples with the range bit applied.
+    """
+    def __len__(self):
+        return len(self.trigger)
+
+def slc_words(hits):
+    """Return the (N, 2) uint32 header words of a list of SLCHit objects."""
+    w = numpy.array([ h.words for h in hits ], 'i8').reshape(len(hits), 2)
+    return (w & 0xffffffff).astype('u4')
+
+def slc_words_from(buf, offsets, little_endian=False):
+    """
+    Return the (N, 2) uint32 header words of the compressed hits
+    starting (with their 8-byte DOM clock) at offsets in buf - for
+    example the hit data offsets of an eventtable.Event21Table.
+    """
+    raw = numpy.frombuffer(memoryview(buf), 'u1')
+    off = numpy.asarray(offsets, 'i8')
+    b = raw[off[:, numpy.newaxis] + numpy.arange(8, 16)]
+    return b.view(little_endian and '<u4' or '>u4').astype('u4')
+
+def slc_header_columns(words):
+    """
+    Decode the header words of N compressed hits, given as an (N, 2)
+    array of word0 and word2 (see slc_words()), into SLCHitColumns.
+    """
+    words = numpy.asarray(words).astype('u4')
+    w0 = words[:, 0]
+    w2 = words[:, 1]
+    c = SLCHitColumns()
+    c.trigger       = ((w0 & 0x7ffe0000) >> 18).astype('u2')
+    c.lc            = ((w0 & 0x30000) >> 16).astype('u1')
+    c.fadc_avail    = (w0 & 0x8000) != 0
+    c.atwd_avail    = (w0 & 0x4000) != 0
+    c.atwd_channels = ((w0 & 0x3000) >> 12).astype('u1')
+    c.atwd_chip     = ((w0 & 0x800) >> 11).astype('u1')
+    c.hit_size      = (w0 & 0x7ff).astype('u2')
+    # Samples are halved in the header when the range bit is set
+    shift = (w2 >> 31).astype('u2')
+    c.chargestamp_pos  = ((w2 >> 27) & 0xf).astype('u1')
+    c.chargestamp_pre  = ((w2 >> 18) & 0x1ff).astype('u2') << shift
+    c.chargestamp_max  = ((w2 >> 9) & 0x1ff).astype('u2') << shift
+    c.chargestamp_post = (w2 & 0x1ff).astype('u2') << shift
+    return c
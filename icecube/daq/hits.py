@@ -15,7 +15,7 @@ standard_library.install_aliases()
 from builtins import range
 from builtins import object
 import struct
-from io import StringIO
+from io import BytesIO
 from array import array
 
 def calc_atwd_fmt(fmt):
@@ -50,11 +50,11 @@ class domhit(object):
             
     def decode(self, buf):
         """Decode the domhit data structure from engineering record."""
-        io = StringIO(buf)
+        io = BytesIO(buf)
         decotup = struct.unpack(">2H6B6s", io.read(16))
 
         # Decode the time stamp - 6-bit integer a little tricky
-        self.domclk = struct.unpack(">q", "\x00\x00" + decotup[8])[0]
+        self.domclk = struct.unpack(">q", b"\x00\x00" + decotup[8])[0]
         self.atwd_chip = decotup[2] & 1
         self.evt_trig_flag = decotup[6]
         # Next decode the FADC samples, if any
@@ -64,8 +64,119 @@ class domhit(object):
         # Next decode the ATWD samples, if any.
         atwdfmt = calc_atwd_fmt(decotup[4:6])
         for ich in range(4):
-            if atwdfmt[ich] is not 0:
+            if atwdfmt[ich] != 0:
                 atwdlen = struct.calcsize(atwdfmt[ich])
                 self.atwd[ich] = array('H', 
                     list(struct.unpack(atwdfmt[ich], io.read(atwdlen)))
                 )
+
+_enghdr = struct.Struct(">2H6BHI")
+
+class lazyhit(object):
+    """
+    Compact DOM hit - the data members of domhit, but only the header
+    of the engineering record is decoded up front.  The record is kept
+    as it is (bytes or a memoryview, which must not change) and fadc
+    and atwd[i] are decoded from it on first access.
+    """
+    __slots__ = ('domid', 'mbid', 'domclk', 'atwd_chip', 'evt_trig_flag',
+                 'utclk', 'utc', 'gpsClock', 'gpsTime',
+                 '_raw', '_fmt', '_fadc', '_atwd')
+
+    def __init__(self, domid, buf=None):
+        self.domid = domid
+        self.mbid  = domid
+        self._raw  = None
+        self._fmt  = 0
+        self._fadc = None
+        self._atwd = None
+        if buf is not None:
+            self.decode(buf)
+
+    def decode(self, buf):
+        """Decode the header of an engineering record."""
+        hdr = _enghdr.unpack_from(buf, 0)
+        self.domclk = (hdr[8] << 32) | hdr[9]
+        self.atwd_chip = hdr[2] & 1
+        self.evt_trig_flag = hdr[6]
+        # FADC sample count and the two ATWD format bytes
+        self._fmt  = (hdr[3] << 16) | (hdr[4] << 8) | hdr[5]
+        self._raw  = buf
+        self._fadc = None
+        self._atwd = None
+
+    def _get_fadc(self):
+        if self._fadc is None:
+            if self._raw is None:
+                raise AttributeError("fadc")
+            fmt = ">%dH" % (self._fmt >> 16)
+            self._fadc = array('H', struct.unpack_from(fmt, self._raw, 16))
+        return self._fadc
+
+    def _set_fadc(self, fadc):
+        self._fadc = fadc
+
+    def _get_atwd(self):
+        return _atwdchannels(self)
+
+    def _set_atwd(self, atwd):
+        self._atwd = list(atwd)
+
+    fadc = property(_get_fadc, _set_fadc)
+    atwd = property(_get_atwd, _set_atwd)
+
+    def _channel(self, ich):
+        if self._atwd is None:
+            self._atwd = [ _UNDECODED ] * 4
+        w = self._atwd[ich]
+        if w is _UNDECODED:
+            w = None
+            if self._raw is not None:
+                fmts = calc_atwd_fmt(((self._fmt >> 8) & 0xff,
+                                      self._fmt & 0xff))
+                if fmts[ich] != 0:
+                    pos = 16 + 2 * (self._fmt >> 16)
+                    for k in range(ich):
+                        if fmts[k] != 0: pos += struct.calcsize(fmts[k])
+                    w = array('H', struct.unpack_from(fmts[ich],
+                                                      self._raw, pos))
+            self._atwd[ich] = w
+        return w
+
+    def _set_channel(self, ich, w):
+        if self._atwd is None:
+            self._atwd = [ _UNDECODED ] * 4
+        self._atwd[ich] = w
+
+_UNDECODED = object()
+
+class _atwdchannels(object):
+    """The atwd[i] list of a lazyhit, decoding channels when indexed."""
+    __slots__ = ('hit',)
+
+    def __init__(self, hit):
+        self.hit = hit
+
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [ self.hit._channel(k) for k in range(4)[i] ]
+        return self.hit._channel(range(4)[i])
+
+    def __setitem__(self, i, w):
+        self.hit._set_channel(range(4)[i], w)
+
+    def __iter__(self):
+        for k in range(4):
+            yield self.hit._channel(k)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
@@ -0,0 +1,128 @@
+"""
+Time-ordered merging of hit streams.
+
+HitMerger yields the hits of many streams - per-DOM TestDAQ .hit
+files, per-hub payload files or any iterables of hits - in global
+utclk order without reading them into memory: it keeps a heap of the
+buffered hits and reads on from the stream which is furthest behind.
+Streams may be out of order by up to a reorder window; with a window
+of 0 only one hit per stream is held at a time.
+"""
+
+from builtins import object
+import heapq
+from .payload import read_payloads
+from .hits import domhit, lazyhit
+from .slchit import DeltaCompressedHit
+from .stream import open_daq_stream
+from .util import nextHit
+
+def hit_file(path, lazy=False):
+    """
+    Generate the hits of a (possibly compressed) TestDAQ .hit file;
+    lazy is passed to nextHit().
+    """
+    f = open_daq_stream(path)
+    try:
+        while True:
+            h = nextHit(f, lazy)
+            if h is None: return
+            yield h
+    finally:
+        f.close()
+
+def payload_hits(path, lazy=False):
+    """
+    Generate the hits of a payload file - engineering and compressed
+    hit payloads, and the hits read out in type 13/19/20 events, each
+    event's hits in time order.  The payload time is the hit utclk.
+    Engineering hits are lazyhit objects if lazy is set.
+    """
+    hitclass = lazyhit if lazy else domhit
+    f = open_daq_stream(path)
+    try:
+        for p in read_payloads(f, types=(10, 13, 18, 19, 20)):
+            if p.type == 10:
+                h = hitclass('%12.12x' % p.mbid, p.data)
+                h.utc = p.utime
+            elif p.type == 18:
+                h = DeltaCompressedHit(p.data, '%12.12x' % p.mbid, p.utime)
+            else:
+                hits = p.getHits(lazy)
+                for h in hits:
+                    h.utclk = h.utc
+                hits.sort(key=lambda h: h.utclk)
+                for h in hits:
+                    yield h
+                continue
+            h.utclk = p.utime
+            yield h
+    finally:
+        f.close()
+
+class HitMerger(object):
+    """
+    Merge hit streams into one in utclk order:
+        - for hit in HitMerger([ hit_file(p) for p in paths ]): ...
+    If tcal is given - a rapcal.TimeCalibrator, or any function of a
+    hit - it sets each hit's utclk as the hit is read.  window is the
+    most by which a stream may go back in time, in utclk units; hits
+    later than that are still yielded at once but out of order, and
+    are counted in merger.late.  Hits with equal times come in stream
+    order.
+    """
+    def __init__(self, streams, tcal=None, window=0):
+        if tcal is not None and hasattr(tcal, 'translateDOMtoDOR'):
+            tcal = tcal.translateDOMtoDOR
+        self.streams = [ iter(s) for s in streams ]
+        self.tcal = tcal
+        self.window = window
+        self.late = 0
+        self.count = 0
+
+    def __iter__(self):
+        tcal = self.tcal
+        window = self.window
+        streams = self.streams
+        # (furthest time read, stream) of the streams not yet exhausted
+        fronts = [ (_NEVER, i) for i in range(len(streams)) ]
+        # (utclk, stream, sequence, hit) of the hits read but not yielded
+        pending = [ ]
+        seq = 0
+        last = None
+        while True:
+            # The hits before the slowest stream's front, less the
+            # window, are final
+            if len(fronts) > 0:
+                limit = fronts[0][0] - window
+            while len(pending) > 0 and \
+                  (len(fronts) == 0 or pending[0][0] < limit):
+                t, i, n, h = heapq.heappop(pending)
+                last = t
+                self.count += 1
+                yield h
+            if len(fronts) == 0: return
+            front, i = fronts[0]
+            try:
+                h = next(streams[i])
+            except StopIteration:
+                heapq.heappop(fronts)
+                continue
+            if tcal is not None:
+                tcal(h)
+            t = h.utclk
+            if last is not None and t < last:
+                self.late += 1
+                self.count += 1
+                yield h
+                continue
+            heapq.heappush(pending, (t, i, seq, h))
+            seq += 1
+            if t > front:
+                heapq.heapreplace(fronts, (t, i))
+
+_NEVER = float('-inf')
+
+def merge_hits(streams, tcal=None, window=0):
+    """Generate the hits of streams in utclk order - see HitMerger."""
+    return iter(HitMerger(streams, tcal, window))
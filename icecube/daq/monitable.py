@@ -0,0 +1,227 @@
+"""
+Columnar decoding of DOM hardware monitoring records.
+
+Rather than building one HardwareMonitorRecord per record and
+unpacking its buffer again on every getter, read_moni_table() decodes
+all hardware records of a stream into one NumPy structured array.  The
+stream is read in chunks; the record headers of a chunk are scanned
+for the hardware records, which are then decoded together through a
+big-endian record dtype, and the derived quantities - pressure,
+temperature and HV - are computed on whole columns.
+"""
+
+from builtins import range
+from builtins import object
+from struct import Struct
+import numpy
+
+# The 27 ADC and DAC readings of a hardware record, in record order
+HW_FIELDS = (
+    'voltage_sum', 'v5', 'pressure_adc', 'i5v', 'i3_3v', 'i2_5v', 'i1_8v',
+    'i_minus_5v', 'atwd0_trigger_bias', 'atwd0_ramp_top', 'atwd0_ramp_rate',
+    'atwd_analog_ref', 'atwd1_trigger_bias', 'atwd1_ramp_top',
+    'atwd1_ramp_rate', 'fe_bias', 'mpe_disc', 'spe_disc', 'led_brightness',
+    'fadc_ref', 'internal_pulser', 'fe_amp_lower_clamp', 'fl_ref',
+    'mux_bias', 'hv_set_dac', 'hv_adc', 'temperature_adc'
+    )
+
+HW_RECORD_DTYPE = numpy.dtype(
+    [ ('length',    '>i2'),
+      ('type',      '>i2'),
+      ('domclk',    'u1', (6,)),
+      ('version',   'u1'),
+      ('spare',     'u1') ] +
+    [ (name, '>i2') for name in HW_FIELDS ] +
+    [ ('spe_rate',  '>i4'),
+      ('mpe_rate',  '>i4') ])
+
+MONI_DTYPE = numpy.dtype(
+    [ ('dom',       'i4'),
+      ('utc',       'i8'),
+      ('domclk',    'i8'),
+      ('version',   'u1') ] +
+    [ (name, 'i2') for name in HW_FIELDS ] +
+    [ ('spe_rate',  'i4'),
+      ('mpe_rate',  'i4'),
+      ('pressure',  'f8'),
+      ('temperature', 'f8'),
+      ('hv',        'f8'),
+      ('hv_set',    'f8') ])
+
+CHUNK_SIZE = 1 << 22
+
+_length = Struct(">i")
+_dh_header = Struct(">iiq")
+_moni_type = Struct(">hh")
+_HW_SIZE = HW_RECORD_DTYPE.itemsize
+
+class MoniTable(object):
+    """
+    The hardware monitoring records of a stream - data members:
+        - data      : MONI_DTYPE array, one row per record; the dom
+                      column indexes doms
+        - doms      : the '%12.12x' mainboard IDs of the DOMs
+    The derived columns are pressure (kPa), temperature (deg C), hv
+    (the HV readback in volts) and hv_set (the HV set point in volts),
+    as the HardwareMonitorRecord getters compute them.  utc is -1 for
+    records from DOMHub streams, which carry no UT time.
+    """
+    def __init__(self, data, doms):
+        self.data = data
+        self.doms = doms
+        self.index = dict([ (mbid, i) for i, mbid in enumerate(doms) ])
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def getDOM(self, mbid):
+        """Return the rows of one DOM."""
+        return self.data[self.data['dom'] == self.index[mbid]]
+
+def _column(raw, offsets, dtype):
+    """Gather the big-endian numbers of dtype at offsets in raw."""
+    dt = numpy.dtype(dtype)
+    idx = offsets[:, None] + numpy.arange(dt.itemsize)
+    return raw[idx].view(dt).reshape(len(offsets)).astype('i8')
+
+def _record_offsets(mv, raw, pos, minlen):
+    """
+    Return the offsets of the complete records from pos in mv which
+    start with their 4-byte length, and the end of the last one.  Runs
+    of records of equal length are stepped over with array operations.
+    """
+    n = len(raw)
+    parts = [ ]
+    probe = 16
+    while pos + minlen <= n:
+        recl = _length.unpack_from(mv, pos)[0]
+        if recl < minlen:
+            raise ValueError("Bad record length %d" % recl)
+        k = min((n - pos) // recl, probe)
+        if k == 0: break
+        off = pos + recl * numpy.arange(k, dtype='i8')
+        same = _column(raw, off, '>i4') == recl
+        if same.all():
+            probe *= 2
+        else:
+            k = int(numpy.argmin(same))
+            probe = 16
+        parts.append(off[:k])
+        pos += k * recl
+    if len(parts) == 0:
+        return numpy.zeros(0, 'i8'), pos
+    return numpy.concatenate(parts), pos
+
+# The scanners return the offsets, mainboard IDs and UT times of the
+# monitoring records in the complete records of a chunk, and the end
+# of the last complete record
+
+def _scan_moni(mv, raw):
+    off, pos = _record_offsets(mv, raw, 0, 32)
+    off = off[_column(raw, off, '>i4') - 32 >= _HW_SIZE]
+    return off + 32, _column(raw, off + 8, '>i8'), \
+        _column(raw, off + 24, '>i8'), pos
+
+def _scan_payload(mv, raw):
+    off, pos = _record_offsets(mv, raw, 0, 16)
+    off = off[(_column(raw, off + 4, '>i4') == 5) &
+              (_column(raw, off, '>i4') - 24 >= _HW_SIZE)]
+    return off + 24, _column(raw, off + 16, '>i8'), \
+        _column(raw, off + 8, '>i8'), pos
+
+def _scan_dh(mv, raw):
+    offsets = [ ]
+    mbids = [ ]
+    n = len(mv)
+    pos = 0
+    while pos + 16 <= n:
+        recl, recid, mbid = _dh_header.unpack_from(mv, pos)
+        if recl < 16:
+            raise ValueError("Bad DOMHub record length %d" % recl)
+        if pos + recl > n: break
+        p = pos + 16
+        while p + 4 <= pos + recl:
+            blen = _moni_type.unpack_from(mv, p)[0]
+            if blen <= 0: break
+            if blen >= _HW_SIZE:
+                offsets.append(p)
+                mbids.append(mbid)
+            p += blen
+        pos += recl
+    return numpy.array(offsets, 'i8'), numpy.array(mbids, 'i8'), \
+        numpy.zeros(len(offsets), 'i8') - 1, pos
+
+_scanners = { 'moni': _scan_moni, 'dh': _scan_dh, 'payload': _scan_payload }
+
+def decode_hw_records(buf, offsets):
+    """
+    Decode the hardware monitoring records at offsets in buf into a
+    MONI_DTYPE array; the dom and utc columns are left 0.
+    """
+    n = len(offsets)
+    table = numpy.zeros(n, MONI_DTYPE)
+    if n == 0: return table
+    offsets = numpy.asarray(offsets, 'i8')
+    step = offsets[1] - offsets[0] if n > 1 else _HW_SIZE
+    if step >= _HW_SIZE and (numpy.diff(offsets) == step).all():
+        # Evenly spaced records are read in place
+        recs = numpy.ndarray(n, HW_RECORD_DTYPE, memoryview(buf),
+                             offsets[0], (step,))
+    else:
+        raw = numpy.frombuffer(memoryview(buf), 'u1')
+        idx = offsets[:, None] + numpy.arange(_HW_SIZE)
+        recs = raw[idx].view(HW_RECORD_DTYPE).reshape(n)
+    clk = numpy.zeros(n, 'i8')
+    for k in range(6):
+        clk = (clk << 8) | recs['domclk'][:, k]
+    table['domclk'] = clk
+    for name in ('version', 'spe_rate', 'mpe_rate') + HW_FIELDS:
+        table[name] = recs[name]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        table['pressure'] = (recs['pressure_adc'].astype('f8') / recs['v5']
+                             + 0.095) / 0.009
+    table['temperature'] = recs['temperature_adc'] / 256.0
+    table['hv'] = recs['hv_adc'] * 0.5
+    table['hv_set'] = recs['hv_set_dac'] * 0.5
+    return table
+
+def read_moni_table(f, format='moni', chunk_size=CHUNK_SIZE):
+    """
+    Read the hardware monitoring records of the stream f into a
+    MoniTable.  format is 'moni' for .moni files as read by
+    readMoniStream(), 'dh' for DOMHub output as read by
+    readMoniStreamDH(), or 'payload' for the type-5 payloads of DAQ
+    files.  Other record types are skipped.
+    """
+    scan = _scanners[format]
+    dom_index = { }
+    doms = [ ]
+    parts = [ ]
+    tail = b''
+    while True:
+        chunk = f.read(chunk_size)
+        if len(chunk) == 0: break
+        if len(tail) > 0:
+            chunk = tail + chunk
+        raw = numpy.frombuffer(chunk, 'u1')
+        offsets, mbids, utc, pos = scan(memoryview(chunk), raw)
+        tail = chunk[pos:]
+        # Keep the hardware records and number their DOMs
+        hw = (raw[offsets + 2] == 0) & (raw[offsets + 3] == 0xC8)
+        keys, inverse = numpy.unique(mbids[hw], return_inverse=True)
+        rows = numpy.zeros(len(keys), 'i4')
+        for k, mbid in enumerate(keys.tolist()):
+            if mbid not in dom_index:
+                dom_index[mbid] = len(doms)
+                doms.append('%12.12x' % mbid)
+            rows[k] = dom_index[mbid]
+        part = decode_hw_records(chunk, offsets[hw])
+        part['dom'] = rows[inverse]
+        part['utc'] = utc[hw]
+        parts.append(part)
+    if len(parts) == 0:
+        return MoniTable(numpy.zeros(0, MONI_DTYPE), doms)
+    return MoniTable(numpy.concatenate(parts), doms)
@@ -9,7 +9,7 @@ from struct import unpack
 def MonitorRecordFactory(buf, domid='????????????', timestamp=0):
     domClock = 0
     for i in range(6):
-        domClock = (domClock << 8) | unpack('B', buf[i+4])[0]
+        domClock = (domClock << 8) | unpack('B', buf[i+4:i+5])[0]
     (moniLen, moniType) = unpack('>hh', buf[0:4])
     if moniType == 0xC8:
         return HardwareMonitorRecord(domid, timestamp, buf, moniLen, moniType, domClock)
@@ -0,0 +1,190 @@
+"""
+Parallel decoding of DAQ payload files.
+
+read_payloads_parallel() decodes the files of a run in a pool of worker
+processes.  Each file is decoded in chunks of roughly chunk_size bytes
+and the decoded payloads are shipped back to the calling process in
+one batch per chunk.  Only a bounded number of chunks per file is ever
+in flight or buffered, so memory stays bounded however slowly the
+caller consumes the payloads.
+
+Shipping decoded payloads between processes costs about as much as
+decoding them, so the best throughput comes from passing a func which
+reduces each payload in the worker to the (small) result the caller
+actually needs.
+"""
+
+from future import standard_library
+standard_library.install_aliases()
+from builtins import range
+from builtins import object
+import heapq
+import multiprocessing
+from collections import deque
+from queue import Queue
+from .payload import read_payloads
+
+CHUNK_SIZE = 4 << 20
+
+def _decode_chunk(filename, offset, nbytes, types, func):
+    """
+    Worker task: decode the payloads of filename from byte offset on
+    until at least nbytes have been consumed.  Returns the tuple
+    (results, next_offset, eof) - results being a list of (utime, x)
+    where x is the payload or func(payload) - or the exception raised.
+    """
+    try:
+        f = open(filename, 'rb')
+        try:
+            f.seek(offset)
+            payloads = [ ]
+            eof = True
+            for p in read_payloads(f, types=types):
+                if func is None:
+                    payloads.append((p.utime, p))
+                else:
+                    x = func(p)
+                    if x is not None:
+                        payloads.append((p.utime, x))
+                if f.tell() - offset >= nbytes:
+                    eof = False
+                    break
+            return payloads, f.tell(), eof
+        finally:
+            f.close()
+    except Exception as e:
+        return e
+
+class _ChunkFeeder(object):
+    """
+    Keeps track of the chunk tasks of a set of files: at most one task
+    per file is in flight and at most maxbuf decoded chunks per file
+    are held back for the caller.
+    """
+    def __init__(self, pool, files, chunk_size, types, func, maxbuf=2):
+        self.pool = pool
+        self.files = files
+        self.chunk_size = chunk_size
+        self.types = types
+        self.func = func
+        self.maxbuf = maxbuf
+        self.done = Queue()
+        self.offset = [ 0 ] * len(files)
+        self.eof = [ False ] * len(files)
+        self.pending = [ False ] * len(files)
+        self.chunks = [ deque() for f in files ]
+        self.inflight = 0
+
+    def submit(self, i):
+        if self.pending[i] or self.eof[i] or \
+           len(self.chunks[i]) >= self.maxbuf:
+            return
+        self.pending[i] = True
+        self.inflight += 1
+        self.pool.apply_async(_decode_chunk,
+            (self.files[i], self.offset[i], self.chunk_size, self.types,
+             self.func),
+            callback=lambda r, i=i: self.done.put((i, r)),
+            error_callback=lambda e, i=i: self.done.put((i, e)))
+
+    def collect(self):
+        """Wait for the next finished chunk, returning its file index."""
+        i, r = self.done.get()
+        self.pending[i] = False
+        self.inflight -= 1
+        # Exceptions come from the task itself or, through the error
+        # callback, from the pool - e.g. when func cannot be pickled
+        if isinstance(r, BaseException):
+            raise r
+        payloads, self.offset[i], self.eof[i] = r
+        if len(payloads) > 0:
+            self.chunks[i].append(deque(payloads))
+        # Read ahead while the caller works on this chunk
+        self.submit(i)
+        return i
+
+    def next(self, i):
+        """
+        Return the next (utime, payload) of file i, waiting for it if
+        necessary, or None if the file is exhausted.
+        """
+        while len(self.chunks[i]) == 0:
+            if self.eof[i]:
+                return None
+            self.submit(i)
+            self.collect()
+        chunk = self.chunks[i][0]
+        p = chunk.popleft()
+        if len(chunk) == 0:
+            self.chunks[i].popleft()
+            self.submit(i)
+        return p
+
+def read_payloads_parallel(files, workers=None, merge=False, types=None,
+                           func=None, chunk_size=CHUNK_SIZE):
+    """
+    Generate the payloads of a list of files decoded by a pool of
+    workers processes (default: one per CPU).
+        - merge      : if True, merge the payloads into global utime
+                       order; each file must then be time-ordered.
+                       Otherwise the payloads are generated in the
+                       order their chunks finish decoding.
+        - types      : decode only these payload types - see
+                       read_payloads()
+        - func       : if given, a picklable function applied to each
+                       payload in the worker; its results are generated
+                       instead of the payloads, None results are dropped
+        - chunk_size : approximate number of bytes per batch
+    The payloads are decoded eagerly since lazy payloads refer to the
+    worker's buffers.
+    """
+    files = list(files)
+    if types is not None:
+        types = tuple(types)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(workers)
+    feeder = _ChunkFeeder(pool, files, chunk_size, types, func)
+    try:
+        if merge:
+            for p in _merged(feeder, len(files)):
+                yield p
+        else:
+            for p in _unordered(feeder, len(files), 2 * workers):
+                yield p
+    finally:
+        pool.terminate()
+        pool.join()
+
+def _unordered(feeder, nfile, limit):
+    waiting = deque(range(nfile))
+    while True:
+        while len(waiting) > 0 and feeder.inflight < limit:
+            feeder.submit(waiting.popleft())
+        if feeder.inflight == 0:
+            return
+        i = feeder.collect()
+        while len(feeder.chunks[i]) > 0:
+            for utime, p in feeder.chunks[i].popleft():
+                yield p
+
+def _merged(feeder, nfile):
+    for i in range(nfile):
+        feeder.submit(i)
+    heap = [ ]
+    seq = 0
+    for i in range(nfile):
+        x = feeder.next(i)
+        if x is not None:
+            heap.append((x[0], seq, i, x[1]))
+            seq += 1
+    heapq.heapify(heap)
+    while len(heap) > 0:
+        utime, s, i, p = heap[0]
+        x = feeder.next(i)
+        if x is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (x[0], seq, i, x[1]))
+            seq += 1
+        yield p
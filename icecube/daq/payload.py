@@ -3,10 +3,12 @@ from __future__ import absolute_import
 from builtins import str
 from builtins import range
 from builtins import object
-from struct import unpack
-from .hits import domhit
+import mmap
+from struct import unpack, unpack_from, Struct
+from .hits import domhit, lazyhit
 from .slchit import DeltaCompressedHit as DCH
 from .monitoring import MonitorRecordFactory
+from . import nicknames
 
 def indent(string, n):
     txt = ''
@@ -25,6 +27,12 @@ class PayloadException(Exception):
     pass
 
 class Payload(object):
+    """
+    Base of the payload classes.  The payload objects use __slots__ to
+    keep the memory per decoded event small; data holds the body of
+    payloads of unknown type and the hit data of the hit payloads.
+    """
+    __slots__ = ('length', 'type', 'utime', 'data')
 
     def __init__(self, length, type, utime):
         self.length, self.type, self.utime = length, type, utime
@@ -33,9 +41,19 @@ class Payload(object):
         return "Payload#%d[@%d, %d bytes]" % (self.type, self.utime, self.length)
 
 class EventPayload(Payload):
+    """
+    Event payload.  An event decoded in lazy mode only holds its header
+    fields and a reference to its raw bytes; the trigger_request,
+    readout_data and trigger_records are decoded on first access.
+    """
+    __slots__ = ('raw', 'record_type', 'uid', 'srcid', 'interval',
+                 'event_type', 'event_cfg_id', 'year', 'run_number',
+                 'subrun_number', '_trigger_request', '_readout_data',
+                 '_trigger_records')
 
     def __init__(self, length, type, utime):
         Payload.__init__(self, length, type, utime)
+        self.raw = None
         self.run_number = 0
         self.subrun_number = 0
         self.uid = 0
@@ -44,6 +62,45 @@ class EventPayload(Payload):
         self.readout_data = []
         self.trigger_records = None
 
+    def materialize(self):
+        """Decode the deferred part of a lazily decoded event."""
+        if self.raw is None: return
+        mv, pos, nhits = self.raw
+        self.raw = None
+        if self.type == 21:
+            self._trigger_records, pos = \
+                _decode_records21_from(mv, pos, self.utime, nhits)
+        else:
+            composites, pos = _decode_composite_from(mv, pos)
+            if len(composites) > 0:
+                self._trigger_request = composites.pop(0)
+            self._readout_data = composites
+
+    def _get_trigger_request(self):
+        self.materialize()
+        return self._trigger_request
+
+    def _set_trigger_request(self, tr):
+        self._trigger_request = tr
+
+    def _get_readout_data(self):
+        self.materialize()
+        return self._readout_data
+
+    def _set_readout_data(self, rd):
+        self._readout_data = rd
+
+    def _get_trigger_records(self):
+        self.materialize()
+        return self._trigger_records
+
+    def _set_trigger_records(self, trigrecs):
+        self._trigger_records = trigrecs
+
+    trigger_request = property(_get_trigger_request, _set_trigger_request)
+    readout_data    = property(_get_readout_data, _set_readout_data)
+    trigger_records = property(_get_trigger_records, _set_trigger_records)
+
     def __str__(self):
         txt = "[EventPayload]: Event #"
         if self.subrun_number == 0:
@@ -73,16 +130,18 @@ class EventPayload(Payload):
                 hits += getTrigHits(hit)
         return hits
 
-    def getHits(self):
+    def getHits(self, lazy=False):
         """
-        Return the hits as a flattened list
+        Return the hits as a flattened list; engineering hits are
+        lazyhit objects if lazy is set, else domhit objects.
         """
+        hitclass = lazyhit if lazy else domhit
         hits = list()
         for rd in self.readout_data:
             for d in rd.data:
                 if isinstance(d, EngHitDataPayload):
                     mbid = '%12.12x' % d.mbid
-                    h = domhit(mbid, d.data)
+                    h = hitclass(mbid, d.data)
                     h.utclk = d.utime
                     h.utc   = d.utime
                 elif isinstance(d, DeltaCompressedHitPayload):
@@ -92,6 +151,9 @@ class EventPayload(Payload):
         return hits
 
 class TriggerRequestPayload(Payload):
+    __slots__ = ('record_type', 'uid', 'trigger_type', 'trigger_cfg_id',
+                 'srcid', 'interval', 'readout_request', 'hits')
+
     def __str__(self):
         txt = "[TriggerRequestPayload]: source=%s trigtype=%d\n" % \
             (source_str(self.srcid), self.trigger_type)
@@ -103,32 +165,41 @@ class TriggerRequestPayload(Payload):
         return txt
 
 class ReadoutRequest(object):
-    pass
+    __slots__ = ('request_type', 'trigger_uid', 'srcid', 'elements')
 
 class ReadoutRequestElement(object):
+    __slots__ = ('readout_type', 'srcid', 'interval', 'mbid')
+
     def __str__(self):
         return "[ReadoutRequestElement]: source=%s type=%d ival=(%d, %d)" % \
             (source_str(self.srcid), self.readout_type,
             self.interval[0], self.interval[1])
 
 class ReadoutDataPayload(Payload):
-    pass
+    __slots__ = ('record_type', 'uid', 'index', 'is_last', 'srcid',
+                 'interval')
 
 class HitDataPayload(Payload):
+    __slots__ = ('trigger_type', 'trigger_cfg_id', 'srcid', 'mbid',
+                 'trigger_mode')
+
     def __str__(self):
         return "[HitDataPayload]: source=%s mbid=%12.12x utime=%d" % \
             (source_str(self.srcid), self.mbid, self.utime)
 
 class DeltaCompressedHitPayload(Payload):
-    pass
+    __slots__ = ('mbid', 'vers', 'pwd')
 
 class EngHitDataPayload(Payload):
-    pass
+    __slots__ = ('mbid', 'data_len', 'utc')
 
 class MonitorRecordPayload(Payload):
-    pass
+    __slots__ = ('mbid', 'rec')
 
 class DeltaSenderHit(object):
+    __slots__ = ('mbid', 'utime', 'pedestal', 'domclk', 'word0', 'word2',
+                 'data')
+
     def __init__(self, mbid, utime, version, pedestal, domclk, word0, word2,
                  data):
         self.mbid = mbid
@@ -143,17 +214,23 @@ class DeltaSenderHit(object):
         return "DeltaSenderHit@%d[dom %012x]" % (self.utime, self.mbid)
 
 class HitRecord(object):
+    __slots__ = ('chanid', 'utime', 'flags', 'data')
+
     def __init__(self, chanid, utime):
         self.chanid = chanid
         self.utime = utime
 
 class EngHitRecord(HitRecord):
+    __slots__ = ()
+
     def __init__(self, flags, chanid, utime, data):
         super(EngHitRecord, self).__init__(chanid, utime)
         self.flags = None
         self.data = data
 
 class DeltaHitRecord(HitRecord):
+    __slots__ = ()
+
     def __init__(self, flags, chanid, utime, data):
         super(DeltaHitRecord, self).__init__(chanid, utime)
         self.flags = flags
@@ -162,6 +239,8 @@ class DeltaHitRecord(HitRecord):
         return "DeltaHitRecord@%d[chanid %d]" % (self.utime, self.chanid)
 
 class TriggerRecord(object):
+    __slots__ = ('trigger_type', 'cfgid', 'srcid', 'interval', 'hits')
+
     def __init__(self, ttype, cfgid, srcid, starttime, endtime, hits):
         self.trigger_type = ttype
         self.cfgid = cfgid
@@ -177,13 +256,19 @@ class TriggerRecord(object):
         txt += '--'
         return txt
 
-def decode_payload(f):
+def decode_payload(f, lazy=False, envelope=None):
     """
-    Read a payload from the stream f
+    Read a payload from the stream f.  If lazy is True the payload
+    is read in one piece and the body of events is only decoded when
+    it is first accessed (see decode_payload_from()).  If the 16-byte
+    envelope has already been read from f it is passed in envelope.
     """
-    envelope = f.read(16)
+    if envelope is None:
+        envelope = f.read(16)
     if len(envelope) == 0: return None
     length, type, utime = unpack(">iiq", envelope)
+    if lazy:
+        return decode_payload_from(envelope + f.read(length - 16), 0, True)[0]
     if type == 1:
         payload = HitDataPayload(length, type, utime)
         buf = f.read(22)
@@ -361,61 +446,525 @@ def decode_composite(f):
         composites.append(decode_payload(f))
     return composites
 
-def tohitstack(events):
+# Precompiled layouts for the buffer decoder
+_envelope       = Struct(">iiq")
+_composite      = Struct(">ihh")
+_hitdata_hdr    = Struct(">3iqh")
+_delta_sender   = Struct(">8xQHHHQII")
+_mbid           = Struct(">q")
+_event_hdr      = Struct(">hiiqqiii")
+_event21_hdr    = Struct(">IHIIII")
+_hitrec_hdr     = Struct(">HBBHI")
+_count          = Struct(">I")
+_trigrec_hdr    = Struct(">ii4I")
+_trigreq_hdr    = Struct(">hiiiiqq")
+_rdoutreq_hdr   = Struct(">hiii")
+_rdoutreq_elt   = Struct(">2i3q")
+_testdaq_hdr    = Struct(">iiq8xq")
+_rdoutdata_hdr  = Struct(">hihhiqq")
+_delta_hdr      = Struct(">qhhh")
+# Hit index lists of type-21 trigger records, by length
+_hit_indices    = { }
+
+def decode_payload_from(buf, offset=0, lazy=False):
+    """
+    Decode a payload from buf - a bytes, memoryview or mmap object -
+    starting at byte offset.  Returns a tuple (payload, next_offset);
+    payload is None at the end of the buffer.  The payload objects
+    are the same as those from decode_payload() except that the hit
+    data are memoryview slices into buf rather than copies.
+    If lazy is True only the header of event payloads is decoded;
+    their composites and hit / trigger records are decoded from buf
+    when first accessed.
+    """
+    return _decode_from(memoryview(buf), offset, lazy)
+
+def _decode_from(mv, pos, lazy=False):
+    if pos >= len(mv): return None, pos
+    length, type, utime = _envelope.unpack_from(mv, pos)
+    start = pos
+    pos += 16
+    if type == 1:
+        payload = HitDataPayload(length, type, utime)
+        hdr = _hitdata_hdr.unpack_from(mv, pos)
+        pos += 22
+        payload.trigger_type    = hdr[0]
+        payload.trigger_cfg_id  = hdr[1]
+        payload.srcid           = hdr[2]
+        payload.mbid            = hdr[3]
+        payload.trigger_mode    = hdr[4]
+    elif type == 3:
+        mbid = utime
+        hdr = _delta_sender.unpack_from(mv, pos)
+        pos += 38
+
+        if hdr[1] != 1:
+            raise PayloadException(("Bad order-check %d for DeltaSenderHit" +
+                                    " (should be 1)") % hdr[1])
+
+        data = mv[pos:start + length]
+        pos = start + length
+        payload = DeltaSenderHit(utime, hdr[0], hdr[2], hdr[3], hdr[4], hdr[5],
+                                 hdr[6], data)
+    elif type == 5:
+        payload = MonitorRecordPayload(length, type, utime)
+        payload.mbid, = _mbid.unpack_from(mv, pos)
+        pos += 8
+        payload.rec   = MonitorRecordFactory(mv[pos:start + length].tobytes(),
+            '%12.12x' % payload.mbid, payload.utime)
+        pos = start + length
+    elif type in (13, 19, 20):
+        payload = EventPayload(length, type, utime)
+        hdr = _event_hdr.unpack_from(mv, pos)
+        pos += 38
+        payload.record_type     = hdr[0]
+        payload.uid             = hdr[1]
+        payload.srcid           = hdr[2]
+        payload.interval        = (hdr[3], hdr[4])
+        payload.event_type      = 0
+        payload.event_cfg_id    = 0
+        payload.year            = 0
+        payload.subrun_number   = 0
+        if type == 13 or type == 19:
+            payload.event_type      = hdr[5]
+        elif type == 20:
+            payload.year            = (hdr[5] >> 16) & 0xffff
+        if type == 13:
+            payload.event_cfg_id    = hdr[6]
+            payload.run_number      = hdr[7]
+        elif type == 19 or type == 20:
+            payload.run_number      = hdr[6]
+            payload.subrun_number   = hdr[7]
+        if lazy:
+            payload.raw = (mv, pos, 0)
+            pos = start + length
+        else:
+            composites, pos = _decode_composite_from(mv, pos)
+            if len(composites) > 0:
+                payload.trigger_request = composites.pop(0)
+            payload.readout_data = composites
+    elif type == 21:
+        payload = EventPayload(length, type, utime)
+        hdr = _event21_hdr.unpack_from(mv, pos)
+        pos += 22
+        payload.interval        = (utime, utime + hdr[0])
+        payload.year            = hdr[1]
+        payload.uid             = hdr[2]
+        payload.run_number      = hdr[3]
+        payload.event_cfg_id    = 0
+        payload.subrun_number   = hdr[4]
+        if lazy:
+            payload.raw = (mv, pos, hdr[5])
+            pos = start + length
+        else:
+            payload.trigger_records, pos = \
+                _decode_records21_from(mv, pos, utime, hdr[5])
+    elif type == 9:
+        payload = TriggerRequestPayload(length, type, utime)
+        hdr = _trigreq_hdr.unpack_from(mv, pos)
+        pos += 34
+        payload.record_type     = hdr[0]
+        payload.uid             = hdr[1]
+        payload.trigger_type    = hdr[2]
+        payload.trigger_cfg_id  = hdr[3]
+        payload.srcid           = hdr[4]
+        payload.interval        = (hdr[5], hdr[6])
+        payload.readout_request = ReadoutRequest()
+        hdr = _rdoutreq_hdr.unpack_from(mv, pos)
+        pos += 14
+        payload.readout_request.request_type    = hdr[0]
+        payload.readout_request.trigger_uid     = hdr[1]
+        payload.readout_request.srcid           = hdr[2]
+        payload.readout_request.elements        = [ ]
+        for elt in range(hdr[3]):
+            r2e = ReadoutRequestElement()
+            hdr = _rdoutreq_elt.unpack_from(mv, pos)
+            pos += 32
+            r2e.readout_type    = hdr[0]
+            r2e.srcid           = hdr[1]
+            r2e.interval        = (hdr[2], hdr[3])
+            r2e.mbid            = hdr[4]
+            payload.readout_request.elements.append(r2e)
+        payload.hits, pos       = _decode_composite_from(mv, pos)
+    elif type == 10:
+        payload = EngHitDataPayload(length, type, utime)
+        # Skip trigger config id and source ID as decode_payload() does
+        data_len, fmtid, mbid, utc = _testdaq_hdr.unpack_from(mv, pos + 8)
+        payload.mbid            = mbid
+        payload.data_len        = data_len
+        payload.utc             = utc
+        payload.data            = mv[pos + 40:start + length]
+        pos = start + length
+    elif type == 11:
+        payload = ReadoutDataPayload(length, type, utime)
+        hdr = _rdoutdata_hdr.unpack_from(mv, pos)
+        pos += 30
+        payload.record_type     = hdr[0]
+        payload.uid             = hdr[1]
+        payload.index           = hdr[2]
+        payload.is_last         = (hdr[3] != 0)
+        payload.srcid           = hdr[4]
+        payload.interval        = (hdr[5], hdr[6])
+        payload.data, pos       = _decode_composite_from(mv, pos)
+    elif type == 18:
+        payload = DeltaCompressedHitPayload(length, type, utime)
+        mbid, bochk, vers, pwd = _delta_hdr.unpack_from(mv, pos + 12)
+        payload.mbid = mbid
+        payload.vers = vers
+        payload.pwd  = pwd
+        payload.data = mv[pos + 26:start + length]
+        pos = start + length
+    else:
+        payload = Payload(length, type, utime)
+        payload.data = mv[pos:start + length].tobytes()
+        pos = start + length
+    return payload, pos
+
+def _decode_records21_from(mv, pos, utime, num_hitrecs):
+    hits = []
+    for i in range(num_hitrecs):
+        rlen, rtype, flags, chanID, dt = _hitrec_hdr.unpack_from(mv, pos)
+        data = mv[pos + 10:pos + rlen]
+        pos += rlen
+        if rtype == 0:
+            hits.append(EngHitRecord(flags, chanID, utime + dt, data))
+        elif rtype == 1:
+            hits.append(DeltaHitRecord(flags, chanID, utime + dt, data))
+
+    num_trigrecs, = _count.unpack_from(mv, pos)
+    pos += 4
+
+    trigrecs = []
+    for i in range(num_trigrecs):
+        ttype, cfgid, srcid, t0, t1, num_hits = \
+            _trigrec_hdr.unpack_from(mv, pos)
+        pos += 24
+        trighits = [ hits[j] for j in
+                     unpack_from(">%dI" % num_hits, mv, pos) ]
+        pos += 4 * num_hits
+        trigrecs.append(TriggerRecord(ttype, cfgid, srcid, utime + t0,
+                                      utime + t1, trighits))
+    return trigrecs, pos
+
+def _decode_composite_from(mv, pos):
+    length, type, n = _composite.unpack_from(mv, pos)
+    pos += 8
+    composites = [ ]
+    for icl in range(n):
+        p, pos = _decode_from(mv, pos)
+        composites.append(p)
+    return composites, pos
+
+def tohitstack(events, lazy=False):
     """
-    Return 'standard' hit stack hits[mbid] = <list-of-hits-to-mbid>
+    Return 'standard' hit stack hits[mbid] = <list-of-hits-to-mbid>;
+    the hits are lazyhit objects if lazy is set.
     """
+    hitclass = lazyhit if lazy else domhit
     hits = dict()
     for e in events:
         for rd in e.readout_data:
             for d in rd.data:
                 mbid = '%12.12x' % d.mbid
                 if mbid not in hits: hits[mbid] = list()
-                h = domhit(mbid, d.data)
+                h = hitclass(mbid, d.data)
                 h.utclk = d.utime
                 hits[mbid].append(h)
     return hits
 
-def read_payloads(stream):
+class PayloadStats(object):
+    """
+    Per-type payload counts collected by read_payloads().
+        - stats.count[type]   : # of payloads seen
+        - stats.bytes[type]   : total length of the payloads seen
+        - stats.decoded[type] : # of payloads decoded, i.e. not skipped
+    """
+    def __init__(self):
+        self.count   = dict()
+        self.bytes   = dict()
+        self.decoded = dict()
+
+    def add(self, type, length, decoded):
+        self.count[type] = self.count.get(type, 0) + 1
+        self.bytes[type] = self.bytes.get(type, 0) + length
+        if decoded:
+            self.decoded[type] = self.decoded.get(type, 0) + 1
+
+    def __str__(self):
+        txt = "  Type      Count         Bytes    Decoded\n"
+        for type in sorted(self.count):
+            txt += "%6d %10d %13d %10d\n" % (type, self.count[type],
+                self.bytes[type], self.decoded.get(type, 0))
+        return txt
+
+def read_payloads(stream, use_mmap=False, lazy=False, types=None,
+                  select=None, stats=None):
+    """
+    Generate the payloads in stream.  If use_mmap is True the stream,
+    which must then be a real file, is memory-mapped from its current
+    position and decoded with decode_payload_from().  The lazy flag
+    is passed on to the decoder.
+    Only payloads whose type is in types and for which the predicate
+    select(type, length, utime) is true are decoded; the others are
+    skipped using the length in the envelope.  If stats is given, a
+    PayloadStats object, it is updated for every payload seen.
+    """
+    if types is not None:
+        types = frozenset(types)
+    if use_mmap:
+        for p in _read_mapped_payloads(stream, lazy, types, select, stats):
+            yield p
+        return
+    if types is None and select is None and stats is None:
+        while True:
+            p = decode_payload(stream, lazy)
+            if p is None:
+                return
+            yield p
     while True:
-        p = decode_payload(stream)
-        if p is None:
+        envelope = stream.read(16)
+        if len(envelope) == 0:
             return
+        if len(envelope) < 16:
+            raise PayloadException("Truncated payload envelope")
+        length, type, utime = unpack(">iiq", envelope)
+        if length < 16:
+            raise PayloadException("Bad payload length %d" % length)
+        wanted = (types is None or type in types) and \
+                 (select is None or select(type, length, utime))
+        if stats is not None:
+            stats.add(type, length, wanted)
+        if wanted:
+            yield decode_payload(stream, lazy, envelope)
+        else:
+            _skip(stream, length - 16)
+
+def _skip(stream, n):
+    if n == 0: return
+    try:
+        # Seeking past the end does not fail - read the last byte
+        stream.seek(n - 1, 1)
+        short = len(stream.read(1)) != 1
+    except (AttributeError, IOError, OSError, ValueError):
+        # Not seekable - e.g. a decompressing stream
+        short = len(stream.read(n)) != n
+    if short:
+        raise PayloadException("Truncated payload: %d bytes to skip" % n)
+
+def _read_mapped_payloads(stream, lazy, types, select, stats):
+    pos = stream.tell()
+    try:
+        buf = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # Empty files cannot be mapped
+        return
+    mv = memoryview(buf)
+    n = len(mv)
+    filtered = types is not None or select is not None or stats is not None
+    while pos < n:
+        if pos + 16 > n:
+            raise PayloadException("Truncated payload envelope at offset %d"
+                                   % pos)
+        length, type, utime = _envelope.unpack_from(mv, pos)
+        if length < 16 or pos + length > n:
+            raise PayloadException("Bad payload length %d at offset %d"
+                                   % (length, pos))
+        if filtered:
+            wanted = (types is None or type in types) and \
+                     (select is None or select(type, length, utime))
+            if stats is not None:
+                stats.add(type, length, wanted)
+            if not wanted:
+                pos += length
+                continue
+        p, pos = _decode_from(mv, pos, lazy)
         yield p
 
-def make21trig(t, t0, hits):
-	buf = ""
-	hbuf = ""
-	for x in t.hits:
-		if isinstance(x, TriggerRequestPayload):
-			buf += make21trig(x, t0)
-		elif isinstance(x, HitDataPayload):
-			n += 1
-			idx = -1
-			for i in range(len(hits)):
-				hit = hits[i]
-				if ininstance(hit, SLCHit) and x.mbid == hit.mbid and x.utime == hit.utc:
-					idx = i
-					break
-			hbuf += pack(">i", idx)
-	buf += pack(">6i", t.trigger_type, t.trigger_cfg_id, t.srcid,
-				t.interval[0] - t0, t.interval[1] - t0, n) + hbuf
-	return buf
-
-def make21hits(hits, t0):
-	return ""
-
-def make21(evt):
-	trig_buf = ""
-	hits_buf = ""
-	ntrig = 0
-	t = evt.trigger_request
-	buf = pack(">iq2h6i", 21, evt.utime, 1, evt.year, evt.uid,
-			   evt.run_number, evt.subrun_number,
-			   evt.interval[0] - evt.utime, evt.interval[1] - evt.utime, ntrig) + \
-			   make21trig(t, evt.utime, hits) + \
-			   make21hits(evt.utime, hits)
-	buf = pack(">i", len(buf) + 4) + buf
+def nickname_chanid(mbid):
+    """
+    Channel ID of a DOM - 64*string + position - from its location in
+    the nicknames file (see icecube.daq.nicknames).
+    """
+    try:
+        dom = nicknames.lookup('%12.12x' % mbid)
+    except KeyError:
+        raise PayloadException("Unknown DOM %12.12x" % mbid)
+    if dom is None:
+        raise PayloadException("No nicknames file to find channel ID of " +
+                               "DOM %12.12x" % mbid)
+    loc = dom[3]
+    try:
+        return 64 * int(loc[0:2]) + int(loc[3:5])
+    except ValueError:
+        raise PayloadException("DOM %12.12x at %s is not deployed" %
+                               (mbid, loc))
+
+def _layout21(evt, chanid):
+    """
+    Collect the hit and trigger records of a type 13/19/20 event.
+    Returns (base, hitrecs, trigrecs, length) where the hit records are
+    (rtype, flags, chanid, utime, data) and the trigger records are
+    (ttype, cfgid, srcid, t0, t1, hit-indices).
+    """
+    hitrecs = [ ]
+    index = { }
+    for rd in evt.readout_data:
+        for d in rd.data:
+            if isinstance(d, DeltaCompressedHitPayload):
+                rtype = 1
+                # LC bits of the compressed hit header word0
+                if len(d.data) >= 12:
+                    flags = (unpack_from(">I", d.data, 8)[0] >> 16) & 0x3
+                else:
+                    flags = 0
+            elif isinstance(d, EngHitDataPayload):
+                rtype, flags = 0, 0
+            else:
+                continue
+            index[(d.mbid, d.utime)] = len(hitrecs)
+            hitrecs.append((rtype, flags, chanid(d.mbid), d.utime, d.data))
+
+    trigrecs = [ ]
+    def walk(t):
+        idx = [ ]
+        for x in t.hits:
+            if isinstance(x, TriggerRequestPayload):
+                walk(x)
+            elif isinstance(x, HitDataPayload):
+                # Trigger hits without a readout cannot be referenced
+                i = index.get((x.mbid, x.utime))
+                if i is not None: idx.append(i)
+        trigrecs.append((t.trigger_type, t.trigger_cfg_id, t.srcid,
+                         t.interval[0], t.interval[1], idx))
+    if evt.trigger_request is not None:
+        walk(evt.trigger_request)
+
+    # Record times are unsigned offsets from the event time
+    base = min([ evt.interval[0] ] + [ h[3] for h in hitrecs ] +
+               [ t[3] for t in trigrecs ])
+    length = 16 + 22 + 4 + \
+        sum([ 10 + len(h[4]) for h in hitrecs ]) + \
+        sum([ 24 + 4 * len(t[5]) for t in trigrecs ])
+    return base, hitrecs, trigrecs, length
+
+def _pack21_into(buf, pos, evt, year, base, hitrecs, trigrecs, length):
+    _envelope.pack_into(buf, pos, length, 21, base)
+    _event21_hdr.pack_into(buf, pos + 16, evt.interval[1] - base, year,
+                           evt.uid, evt.run_number, evt.subrun_number,
+                           len(hitrecs))
+    pos += 38
+    for rtype, flags, chan, utime, data in hitrecs:
+        n = 10 + len(data)
+        _hitrec_hdr.pack_into(buf, pos, n, rtype, flags, chan, utime - base)
+        buf[pos + 10:pos + n] = data
+        pos += n
+    _count.pack_into(buf, pos, len(trigrecs))
+    pos += 4
+    for ttype, cfgid, srcid, t0, t1, idx in trigrecs:
+        _trigrec_hdr.pack_into(buf, pos, ttype, cfgid, srcid,
+                               t0 - base, t1 - base, len(idx))
+        pos += 24
+        s = _hit_indices.get(len(idx))
+        if s is None:
+            s = _hit_indices[len(idx)] = Struct(">%dI" % len(idx))
+        s.pack_into(buf, pos, *idx)
+        pos += 4 * len(idx)
+    return pos
+
+def _year21(evt, year):
+    if getattr(evt, 'year', 0) != 0 or year is None:
+        return getattr(evt, 'year', 0)
+    return year
+
+def make21(evt, chanid=nickname_chanid, year=None):
+    """
+    Convert a decoded type 13, 19 or 20 event to a type-21 payload,
+    returned as a bytearray.
+        - chanid : function mapping a DOM mainboard ID to its channel ID
+        - year   : year of the event, if the event does not carry one
+    The hits of the readout data become the hit records and each
+    trigger request in the trigger request tree becomes a trigger
+    record.  The record times are unsigned offsets from the event
+    time, so the event time is the earliest of the start of the event
+    interval, the hit times and the trigger start times.
+    """
+    if evt.type not in (13, 19, 20):
+        raise PayloadException("Cannot convert payload type %d to type-21" %
+                               evt.type)
+    layout = _layout21(evt, chanid)
+    buf = bytearray(layout[3])
+    _pack21_into(buf, 0, evt, _year21(evt, year), *layout)
+    return buf
+
+class Event21Writer(object):
+    """
+    Write events to the stream f in the type-21 format.  The events are
+    packed into a preallocated buffer which is written out whenever it
+    fills up, so writing does not build a bytes object per event.
+        - w = Event21Writer(f)
+        - w.write(evt)  : convert a type 13/19/20 event and write it
+        - w.copy(buf)   : write an already encoded payload as it is
+        - w.close()     : flush the buffer (the stream is left open)
+    """
+    def __init__(self, f, chanid=nickname_chanid, year=None,
+                 bufsize=1 << 20):
+        self.f = f
+        self.chanid = chanid
+        self.year = year
+        self.buf = bytearray(bufsize)
+        self.pos = 0
+
+    def write(self, evt):
+        if evt.type not in (13, 19, 20):
+            raise PayloadException(
+                "Cannot convert payload type %d to type-21" % evt.type)
+        layout = _layout21(evt, self.chanid)
+        self.__reserve(layout[3])
+        self.pos = _pack21_into(self.buf, self.pos, evt,
+                                _year21(evt, self.year), *layout)
+
+    def copy(self, payload):
+        n = len(payload)
+        self.__reserve(n)
+        self.buf[self.pos:self.pos + n] = payload
+        self.pos += n
+
+    def flush(self):
+        if self.pos > 0:
+            self.f.write(memoryview(self.buf)[:self.pos])
+            self.pos = 0
+
+    def close(self):
+        self.flush()
+
+    def __reserve(self, n):
+        if self.pos + n > len(self.buf):
+            self.flush()
+            if n > len(self.buf):
+                self.buf = bytearray(n)
+
+def convert21(fin, fout, chanid=nickname_chanid, year=None):
+    """
+    Copy the payload stream fin to fout converting the type 13, 19 and
+    20 events to type-21; other payloads are copied unchanged.  Returns
+    the number of converted events.
+    """
+    w = Event21Writer(fout, chanid, year)
+    n = 0
+    while True:
+        hdr = fin.read(16)
+        if len(hdr) < 16: break
+        length, type, utime = _envelope.unpack(hdr)
+        buf = hdr + fin.read(length - 16)
+        if len(buf) < length:
+            raise PayloadException("Truncated payload at end of stream")
+        if type in (13, 19, 20):
+            w.write(decode_payload_from(buf)[0])
+            n += 1
+        else:
+            w.copy(buf)
+    w.close()
+    return n
 
 _srcDict = { 'domHub' : 1000,
              'stringProc' : 2000,
@@ -0,0 +1,228 @@
+"""
+Offset index for DAQ payload files.
+
+A PayloadIndex records the position and the header information of
+each top-level payload in a file so that single events, or the events
+in a time window, can be fetched by seek rather than by decoding the
+file from the start.  The index is kept in a binary sidecar file next
+to the data file (<filename>.idx) which is checked against the size
+and the modification time of the data file.  When the data file has
+only grown, the new payloads are appended to the existing index.
+"""
+
+from builtins import range
+from builtins import object
+import os
+import mmap
+from array import array
+from bisect import bisect_left, bisect_right
+from struct import Struct
+from .payload import decode_payload, decode_payload_from
+
+INDEX_SUFFIX = '.idx'
+
+_MAGIC   = b'PDIX'
+_VERSION = 2
+
+# magic, version, file size, file mtime, indexed bytes, # entries
+_header  = Struct('>4sHxxqdqI')
+# length, type, utime of the payload envelope
+_envelope = Struct('>iiq')
+# offset, length, type, utime, uid, run, subrun
+_entry   = Struct('>qiiqqqi')
+
+class PayloadIndex(object):
+    """
+    Index of the top-level payloads in a DAQ payload file.
+        - idx = PayloadIndex('physics_run_1234.dat')
+        - len(idx)              : number of indexed payloads
+        - idx.entry(n)          : (offset, length, type, utime, uid,
+                                   run, subrun) of the n-th payload
+        - idx.getPayload(n)     : decode the n-th payload
+        - idx.getPayloadsInWindow(t0, t1)
+                                : decode the payloads with
+                                  t0 <= utime <= t1
+    """
+    def __init__(self, filename, index_filename=None):
+        self.filename = filename
+        if index_filename is None:
+            index_filename = filename + INDEX_SUFFIX
+        self.index_filename = index_filename
+        self.f = None
+        self.size, self.mtime = None, None
+        self.__clear()
+        hdr = self.__load()
+        if hdr is not None:
+            self.size, self.mtime = hdr
+        self.update()
+
+    def __clear(self):
+        self.offset  = array('q')
+        self.length  = array('i')
+        self.type    = array('i')
+        self.utime   = array('q')
+        self.uid     = array('q')
+        self.run     = array('q')
+        self.subrun  = array('i')
+        self.end     = 0
+        self.ordered = True
+        # Number of entries in the sidecar on disk
+        self.saved   = 0
+
+    def __len__(self):
+        return len(self.offset)
+
+    def entry(self, n):
+        return (self.offset[n], self.length[n], self.type[n], self.utime[n],
+                self.uid[n], self.run[n], self.subrun[n])
+
+    def update(self):
+        """
+        Bring the index up to date with the data file, loading the
+        sidecar if it is still valid, extending it if the data file
+        has grown and rebuilding it otherwise.  The sidecar is
+        updated whenever the index changed.
+        """
+        st = os.stat(self.filename)
+        size, mtime = st.st_size, st.st_mtime
+        if (size, mtime) == (self.size, self.mtime):
+            return
+        if self.size is not None and (size <= self.size or size < self.end):
+            # Truncated or rewritten in place - start over
+            self.__clear()
+        self.__scan(size)
+        self.size, self.mtime = size, mtime
+        self.__save()
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def getPayload(self, n):
+        """Decode the n-th payload in the file."""
+        f = self.__stream()
+        f.seek(self.offset[n])
+        return decode_payload(f)
+
+    def find(self, t0, t1):
+        """
+        Returns the list of entry numbers of the payloads with
+        t0 <= utime <= t1.
+        """
+        if self.ordered:
+            return list(range(bisect_left(self.utime, t0),
+                              bisect_right(self.utime, t1)))
+        return [ n for n in range(len(self)) if t0 <= self.utime[n] <= t1 ]
+
+    def getPayloadsInWindow(self, t0, t1):
+        """Decode all payloads with t0 <= utime <= t1."""
+        return [ self.getPayload(n) for n in self.find(t0, t1) ]
+
+    def __stream(self):
+        if self.f is None:
+            self.f = open(self.filename, 'rb')
+        return self.f
+
+    def __scan(self, size):
+        if size - self.end < 16:
+            return
+        f = open(self.filename, 'rb')
+        try:
+            buf = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        try:
+            pos = self.end
+            while pos + 16 <= size:
+                length, type, utime = _envelope.unpack_from(buf, pos)
+                # Stop at a partially written payload
+                if length < 16 or pos + length > size: break
+                self.__append((pos, length, type, utime) +
+                              _event_ids(buf, pos))
+                pos += length
+            self.end = pos
+        finally:
+            buf.close()
+
+    def __append(self, ent):
+        if len(self.utime) > 0 and ent[3] < self.utime[-1]:
+            self.ordered = False
+        self.offset.append(ent[0])
+        self.length.append(ent[1])
+        self.type.append(ent[2])
+        self.utime.append(ent[3])
+        self.uid.append(ent[4])
+        self.run.append(ent[5])
+        self.subrun.append(ent[6])
+
+    def __load(self):
+        """
+        Read the sidecar, returning the (size, mtime) of the data file
+        it was made from, or None if there is no usable sidecar.
+        """
+        try:
+            f = open(self.index_filename, 'rb')
+        except (IOError, OSError):
+            return None
+        try:
+            buf = f.read()
+        finally:
+            f.close()
+        if len(buf) < _header.size:
+            return None
+        magic, version, size, mtime, end, n = _header.unpack_from(buf, 0)
+        if magic != _MAGIC or version != _VERSION or \
+           len(buf) != _header.size + n * _entry.size:
+            return None
+        for i in range(n):
+            self.__append(_entry.unpack_from(buf, _header.size + i*_entry.size))
+        self.end = end
+        self.saved = n
+        return size, mtime
+
+    def __save(self):
+        """
+        Write the sidecar.  If it already holds the first entries, only
+        the new entries are appended and the header rewritten; the
+        header goes last, so a sidecar left half-written fails the
+        length check in __load() and is rebuilt.
+        """
+        header = _header.pack(_MAGIC, _VERSION, self.size, self.mtime,
+                              self.end, len(self))
+        entries = b''.join([ _entry.pack(*self.entry(n))
+                             for n in range(self.saved, len(self)) ])
+        try:
+            if self.saved > 0:
+                f = open(self.index_filename, 'r+b')
+                try:
+                    f.seek(_header.size + self.saved * _entry.size)
+                    f.truncate()
+                    f.write(entries)
+                    f.flush()
+                    f.seek(0)
+                    f.write(header)
+                finally:
+                    f.close()
+            else:
+                tmp = self.index_filename + '.tmp'
+                f = open(tmp, 'wb')
+                try:
+                    f.write(header + entries)
+                finally:
+                    f.close()
+                os.rename(tmp, self.index_filename)
+            self.saved = len(self)
+        except (IOError, OSError):
+            # Read-only location - keep the index in memory only
+            self.saved = 0
+
+def _event_ids(buf, pos):
+    """
+    The (uid, run, subrun) of the payload at pos in buf - 0 for those
+    it does not have.  The lazily decoded payload, which refers into
+    buf, is dropped on return.
+    """
+    p, next = decode_payload_from(buf, pos, lazy=True)
+    return (getattr(p, 'uid', 0), getattr(p, 'run_number', 0),
+            getattr(p, 'subrun_number', 0))
@@ -0,0 +1,221 @@
+"""
+Per-file run summaries for the QA scripts.
+
+A RunSummary holds the aggregates the QA scripts report - run and
+subrun numbers, event count, time span, trigger histogram and per-DOM
+hit counts - computed in one pass over a payload file.  Summaries of
+several files are merged with RunSummary.merge().  A SummaryCache
+keeps the summaries in a file keyed by the path, size and modification
+time of the data files, so a repeat pass over unchanged files only
+costs a stat() per file.
+"""
+
+from builtins import object
+import os
+import pickle
+from .payload import read_payloads, HitDataPayload, TriggerRequestPayload, \
+     DeltaCompressedHitPayload, EngHitDataPayload, recurse_triggers
+from .stream import open_daq_stream
+
+EVENT_TYPES = (13, 19, 20, 21)
+
+def _trigger_hits(tr):
+    hits = [ ]
+    for x in tr.hits:
+        if isinstance(x, HitDataPayload):
+            hits.append(x.mbid)
+        elif isinstance(x, TriggerRequestPayload):
+            hits += _trigger_hits(x)
+    return hits
+
+class RunSummary(object):
+    """
+    Aggregates over the events of one or more payload files:
+        - files       : the summarized files
+        - nevents     : number of events
+        - first_utime : earliest event time (None if there are no events)
+        - last_utime  : latest event time
+        - subruns     : {(run, subrun): [nevents, first_utime, last_utime]}
+        - triggers    : {(srcid, trigger_type, cfgid): count} over all
+                        trigger requests / records of the events
+        - doms        : {dom: [nhits, nbeacons, first_utime, last_utime]}
+                        where dom is the '%12.12x' mainboard ID, or the
+                        channel ID for hits of type-21 events
+        - missing     : number of events with trigger hits which have
+                        no readout
+    """
+    def __init__(self, files=()):
+        self.files = list(files)
+        self.nevents = 0
+        self.first_utime = None
+        self.last_utime = None
+        self.subruns = { }
+        self.triggers = { }
+        self.doms = { }
+        self.missing = 0
+
+    def add(self, evt):
+        """Add a decoded event to the summary."""
+        t = evt.utime
+        self.nevents += 1
+        if self.first_utime is None or t < self.first_utime:
+            self.first_utime = t
+        if self.last_utime is None or t > self.last_utime:
+            self.last_utime = t
+        self.__span(self.subruns, (evt.run_number, evt.subrun_number), t, 1)
+
+        if evt.type == 21:
+            for tr in evt.trigger_records:
+                self.__count((tr.srcid, tr.trigger_type, tr.cfgid))
+            seen = set()
+            for tr in evt.trigger_records:
+                for h in tr.hits:
+                    if id(h) in seen: continue
+                    seen.add(id(h))
+                    self.__hit(h.chanid, h.utime, False)
+            return
+
+        if evt.trigger_request is not None:
+            for trig in recurse_triggers(evt.trigger_request):
+                self.__count(trig)
+        readout = set()
+        for rd in evt.readout_data:
+            for d in rd.data:
+                if isinstance(d, EngHitDataPayload):
+                    # evt_trig_flag of the engineering record header
+                    beacon = len(d.data) > 8 and d.data[8] == 1
+                elif isinstance(d, DeltaCompressedHitPayload):
+                    beacon = False
+                else:
+                    continue
+                readout.add(d.mbid)
+                self.__hit('%12.12x' % d.mbid, d.utime, beacon)
+        if evt.trigger_request is not None:
+            for mbid in _trigger_hits(evt.trigger_request):
+                if mbid not in readout:
+                    self.missing += 1
+                    break
+
+    def __count(self, trig):
+        self.triggers[trig] = self.triggers.get(trig, 0) + 1
+
+    def __hit(self, dom, utime, beacon):
+        self.__span(self.doms, dom, utime, 1, int(beacon))
+
+    def __span(self, table, key, utime, n, nbeacon=None):
+        ent = table.get(key)
+        if ent is None:
+            if nbeacon is None:
+                table[key] = [ n, utime, utime ]
+            else:
+                table[key] = [ n, nbeacon, utime, utime ]
+            return
+        ent[0] += n
+        if nbeacon is not None:
+            ent[1] += nbeacon
+        ent[-2] = min(ent[-2], utime)
+        ent[-1] = max(ent[-1], utime)
+
+    def merge(self, other):
+        """Add the aggregates of the summary other to this one."""
+        self.files += other.files
+        self.nevents += other.nevents
+        for t in (other.first_utime, other.last_utime):
+            if t is None: continue
+            if self.first_utime is None or t < self.first_utime:
+                self.first_utime = t
+            if self.last_utime is None or t > self.last_utime:
+                self.last_utime = t
+        for key, ent in other.subruns.items():
+            self.__span(self.subruns, key, ent[1], ent[0])
+            self.__span(self.subruns, key, ent[2], 0)
+        for key, n in other.triggers.items():
+            self.triggers[key] = self.triggers.get(key, 0) + n
+        for key, ent in other.doms.items():
+            self.__span(self.doms, key, ent[2], ent[0], ent[1])
+            self.__span(self.doms, key, ent[3], 0, 0)
+        self.missing += other.missing
+
+    def timespan(self):
+        """Time between the first and the last event in seconds."""
+        if self.nevents == 0: return 0.0
+        return 1.0E-10 * (self.last_utime - self.first_utime)
+
+def summarize_file(path):
+    """Build the RunSummary of one (possibly compressed) payload file."""
+    summary = RunSummary([ path ])
+    f = open_daq_stream(path)
+    try:
+        for evt in read_payloads(f, types=EVENT_TYPES):
+            summary.add(evt)
+    finally:
+        f.close()
+    return summary
+
+def merge_summaries(summaries):
+    """Return a new RunSummary merging the list of summaries."""
+    total = RunSummary()
+    for s in summaries:
+        total.merge(s)
+    return total
+
+_CACHE_VERSION = 1
+
+class SummaryCache(object):
+    """
+    File-backed cache of per-file RunSummary objects.  The cache file
+    defaults to $DAQ_SUMMARY_CACHE or ~/.daq_summary_cache.
+        - cache = SummaryCache()
+        - cache.get(path)       : summary of path, built if necessary
+        - cache.summarize(paths): merged summary of a list of files
+        - cache.save()          : write back the cache if it changed
+    """
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = os.environ.get('DAQ_SUMMARY_CACHE',
+                os.path.join(os.path.expanduser('~'), '.daq_summary_cache'))
+        self.filename = filename
+        self.entries = { }
+        self.dirty = False
+        try:
+            f = open(filename, 'rb')
+            try:
+                version, entries = pickle.load(f)
+            finally:
+                f.close()
+            if version == _CACHE_VERSION:
+                self.entries = entries
+        except Exception:
+            # Missing or unreadable cache - start afresh
+            pass
+
+    def get(self, path):
+        key = os.path.abspath(path)
+        st = os.stat(key)
+        ent = self.entries.get(key)
+        if ent is not None and ent[0] == st.st_size and ent[1] == st.st_mtime:
+            return ent[2]
+        summary = summarize_file(path)
+        self.entries[key] = (st.st_size, st.st_mtime, summary)
+        self.dirty = True
+        return summary
+
+    def summarize(self, paths):
+        total = merge_summaries([ self.get(p) for p in paths ])
+        self.save()
+        return total
+
+    def save(self):
+        if not self.dirty: return
+        tmp = self.filename + '.tmp'
+        try:
+            f = open(tmp, 'wb')
+            try:
+                pickle.dump((_CACHE_VERSION, self.entries), f, 2)
+            finally:
+                f.close()
+            os.rename(tmp, self.filename)
+            self.dirty = False
+        except (IOError, OSError):
+            # Read-only location - keep the summaries in memory only
+            pass
@@ -8,7 +8,8 @@ from builtins import str
 from builtins import range
 from builtins import object
 from struct import unpack
-from io import StringIO
+from io import BytesIO
+from .deltacodec import delta_decoder
 
 class SLCHit(object):
     """
@@ -32,6 +33,7 @@ class SLCHit(object):
     def __init__(self, buf, mbid=None, utc=None, little_endian=False):
         self.buf  = buf[8:]
         self.mbid = mbid
+        self.domid = mbid
         self.utc  = utc
         if little_endian:
             self.domclk, = unpack('<q', buf[0:8])
@@ -78,7 +80,7 @@ class DeltaCompressedHit(SLCHit):
         
     def decode_waveforms(self):
         if self.decoded: return
-        codec = delta_codec(self.buf[8:])
+        codec = delta_decoder(self.buf[8:])
         if self.fadc_avail: self.fADC = codec.decode(256)
         if self.atwd_avail:
             for i in range(self.atwd_channels+1):
@@ -87,7 +89,7 @@ class DeltaCompressedHit(SLCHit):
         
 class delta_codec(object):
     def __init__(self, buf):
-        self.tape = StringIO(buf)
+        self.tape = BytesIO(buf)
         self.valid_bits = 0
         self.register = 0
         
@@ -0,0 +1,184 @@
+"""
+Compact archive of supernova scalers.
+
+An archive file holds the SN scaler records of all DOMs in time
+blocks.  Within a block the records are grouped per DOM, and each
+record's scalers are S2-packed (see supernova.S2Codec).  An index of
+the blocks at the end of the file gives random access by time, and
+the directory at the head of each block random access by DOM.  All
+numbers are big-endian:
+
+    file   : 'SNS2' version:i width:q  block ...  index  footer
+    block  : 'BLK ' t0:q t1:q ndom:i  (mbid:q nrec:i offset:i) * ndom
+             DOM records ...
+    record : utc:q domclk:6s nscalers:H  S2 bit vector
+    index  : 'IDX ' nblock:i  (t0:q t1:q offset:q length:i) * nblock
+    footer : index-offset:q 'SNIX'
+
+t0 and t1 are the earliest record start and latest record end time
+in a block; the offsets in a block directory count from the end of
+the directory.
+"""
+
+from builtins import object
+from bisect import bisect_left, bisect_right
+from struct import Struct, pack, unpack
+from .supernova import SNData, s2_encode, s2_decode
+
+VERSION = 1
+BLOCK_WIDTH = 600000000000      # 60 s in 0.1 ns
+
+_file_header = Struct(">4siq")
+_block_header = Struct(">4sqqi")
+_dir_entry = Struct(">qii")
+_record = Struct(">q6sH")
+_index_entry = Struct(">qqqi")
+_footer = Struct(">q4s")
+
+class SNArchiveWriter(object):
+    """
+    Write SNData records to an SN scaler archive:
+        - w = SNArchiveWriter(open('sn.s2', 'wb'))
+        - w.add(sn)     : add a record
+        - w.close()     : write the last block and the index
+    A block is written when a record starts width or more after the
+    start of the block's time slot, so the records should come about
+    in time order; records which are late go into the current block.
+    close() does not close the file.
+    """
+    def __init__(self, f, width=BLOCK_WIDTH):
+        self.f = f
+        self.width = width
+        self.index = [ ]
+        self.slot = None
+        self.records = { }
+        self.t0 = self.t1 = None
+        self.pos = _file_header.size
+        f.write(_file_header.pack(b'SNS2', VERSION, width))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, sn):
+        slot = sn.utc // self.width
+        if self.slot is None:
+            self.slot = slot
+        elif slot > self.slot:
+            self.flush()
+            self.slot = slot
+        recs = self.records.get(sn.mbid)
+        if recs is None:
+            recs = self.records[sn.mbid] = [ ]
+        recs.append(_record.pack(sn.utc, pack(">q", sn.domclk)[2:],
+                                 len(sn.scalers)) + s2_encode(sn.scalers))
+        if self.t0 is None or sn.utc < self.t0: self.t0 = sn.utc
+        if self.t1 is None or sn.utcend > self.t1: self.t1 = sn.utcend
+
+    def flush(self):
+        """Write the records added since the last block as a block."""
+        if len(self.records) == 0: return
+        doms = sorted(self.records)
+        directory = [ ]
+        parts = [ ]
+        offset = 0
+        for mbid in doms:
+            part = b''.join(self.records[mbid])
+            directory.append(_dir_entry.pack(int(mbid, 16),
+                                             len(self.records[mbid]), offset))
+            parts.append(part)
+            offset += len(part)
+        block = _block_header.pack(b'BLK ', self.t0, self.t1, len(doms)) + \
+            b''.join(directory) + b''.join(parts)
+        self.f.write(block)
+        self.index.append((self.t0, self.t1, self.pos, len(block)))
+        self.pos += len(block)
+        self.records = { }
+        self.t0 = self.t1 = None
+
+    def close(self):
+        self.flush()
+        self.index.sort()
+        self.f.write(pack(">4si", b'IDX ', len(self.index)))
+        for entry in self.index:
+            self.f.write(_index_entry.pack(*entry))
+        self.f.write(_footer.pack(self.pos, b'SNIX'))
+
+class SNArchive(object):
+    """
+    Read an SN scaler archive from the seekable file f:
+        - a = SNArchive(open('sn.s2', 'rb'))
+        - a.records(t0, t1)         : the SNData records overlapping the
+                                      times [t0, t1)
+        - a.records(t0, t1, mbids)  : those of some DOMs only
+        - a.blocks(t0, t1)          : the index entries of the blocks
+                                      which may hold them
+    Only the index is read on opening; a query reads just the blocks
+    it needs, and of those the parts of the DOMs asked for.
+    """
+    def __init__(self, f):
+        self.f = f
+        magic, version, self.width = _file_header.unpack(
+            f.read(_file_header.size))
+        if magic != b'SNS2' or version != VERSION:
+            raise ValueError("Not an SN scaler archive")
+        f.seek(-_footer.size, 2)
+        pos, magic = _footer.unpack(f.read(_footer.size))
+        if magic != b'SNIX':
+            raise ValueError("SN scaler archive without index")
+        f.seek(pos)
+        magic, n = unpack(">4si", f.read(8))
+        buf = f.read(n * _index_entry.size)
+        self.index = [ _index_entry.unpack_from(buf, i * _index_entry.size)
+                       for i in range(n) ]
+        self.starts = [ e[0] for e in self.index ]
+        # Latest end time of the blocks up to each one
+        self.ends = [ ]
+        t1 = None
+        for e in self.index:
+            if t1 is None or e[1] > t1: t1 = e[1]
+            self.ends.append(t1)
+
+    def __len__(self):
+        return len(self.index)
+
+    def blocks(self, t0=None, t1=None):
+        lo = 0 if t0 is None else bisect_right(self.ends, t0)
+        hi = len(self.index) if t1 is None else bisect_left(self.starts, t1)
+        return [ e for e in self.index[lo:hi] if t0 is None or e[1] > t0 ]
+
+    def records(self, t0=None, t1=None, mbids=None):
+        """Generate the SNData records in [t0, t1), block by block."""
+        if mbids is not None:
+            mbids = set([ int(m, 16) if isinstance(m, str) else m
+                          for m in mbids ])
+        for bt0, bt1, pos, length in self.blocks(t0, t1):
+            self.f.seek(pos)
+            head = self.f.read(_block_header.size)
+            magic, bt0, bt1, ndom = _block_header.unpack(head)
+            directory = self.f.read(ndom * _dir_entry.size)
+            base = pos + len(head) + len(directory)
+            entries = [ _dir_entry.unpack_from(directory, i * _dir_entry.size)
+                        for i in range(ndom) ]
+            entries.append((None, 0, length - (base - pos)))
+            for i in range(ndom):
+                mbid, nrec, offset = entries[i]
+                if mbids is not None and mbid not in mbids: continue
+                self.f.seek(base + offset)
+                buf = self.f.read(entries[i + 1][2] - offset)
+                for sn in _decode_records(buf, mbid, nrec):
+                    if (t1 is None or sn.utc < t1) and \
+                       (t0 is None or sn.utcend > t0):
+                        yield sn
+
+def _decode_records(buf, mbid, nrec):
+    pos = 0
+    for i in range(nrec):
+        utc, domclk, n = _record.unpack_from(buf, pos)
+        scalers, pos = s2_decode(buf, pos + _record.size)
+        if len(scalers) != n:
+            raise ValueError("Corrupt S2 vector for DOM %12.12x" % mbid)
+        yield SNData(pack(">hh", 10 + n, 0) + domclk +
+                     bytes(bytearray(scalers)), mbid, utc)
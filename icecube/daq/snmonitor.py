@@ -0,0 +1,233 @@
+"""
+Streaming supernova significance monitor.
+
+SNMonitor follows the SN scaler stream one SNData record at a time.
+The scalers of each DOM are rebinned into 0.5 s base bins kept in a
+ring buffer; a base bin is closed once the stream has run delay past
+its end, so DOMs whose records arrive somewhat late still count.  On
+closing a bin the monitor updates per-DOM running sums over sliding
+windows - by default 0.5 s, 4 s and 10 s - and computes for each the
+significance of a detector-wide rate excess:
+
+    dmu   = sum(w_i * (r_i - mu_i)) / sum(w_i),   w_i = eps_i / var_i
+    sigma = 1 / sqrt(sum(w_i)),                   xi  = dmu / sigma
+
+where eps_i is the occupancy of DOM i - the fraction of the window it
+reported - r_i its counts in the window divided by eps_i, and mu_i,
+var_i the running background mean and variance of r_i.  DOMs which
+reported less than min_occupancy of a window are left out.  The work
+per closed bin is O(DOMs), so O(1) per record.
+"""
+
+from builtins import object
+from math import sqrt
+import numpy
+from .supernova import SNPayloadReader
+from .snseries import DOM_BIN
+
+BASE_BIN = 5000000000           # 0.5 s in 0.1 ns
+WINDOWS = (5000000000, 40000000000, 100000000000)
+
+class SNSignificance(object):
+    """
+    The significance of a window ending at t (0.1 ns units):
+        - window    : the window width
+        - dmu       : the rate deviation, counts per DOM per window
+        - sigma     : the error of dmu
+        - xi        : dmu / sigma
+        - ndom      : the number of DOMs used
+        - occupancy : the summed occupancy of those DOMs
+    """
+    def __init__(self, t, window, dmu, sigma, ndom, occupancy):
+        self.t = t
+        self.window = window
+        self.dmu = dmu
+        self.sigma = sigma
+        self.xi = dmu / sigma
+        self.ndom = ndom
+        self.occupancy = occupancy
+
+    def __repr__(self):
+        return "SNSignificance(t=%d, window=%d, xi=%.2f, ndom=%d)" % \
+            (self.t, self.window, self.xi, self.ndom)
+
+class SNMonitor(object):
+    """
+    Sliding window SN significances of a stream of SNData records:
+        - mon = SNMonitor()
+        - mon.add(sn)       : add a record; returns the SNSignificance
+                              of each window closed by it
+        - mon.flush()       : close all bins at the end of the stream
+        - mon.doms          : the DOMs seen, in order of first record
+        - mon.late          : records which were partly or wholly too
+                              late - their parts in closed bins are lost
+    The windows must be multiples of base.  The background of each DOM
+    is an exponentially weighted mean and variance with time constant
+    tau, updated after each significance is computed; a DOM is used
+    once it has warmup background entries.  All times are in 0.1 ns.
+    """
+    def __init__(self, windows=WINDOWS, base=BASE_BIN, delay=50000000000,
+                 tau=3000000000000, warmup=60, min_occupancy=0.5,
+                 dom_bin=DOM_BIN, capacity=64):
+        for w in windows:
+            if w <= 0 or w % base != 0:
+                raise ValueError("Window %d is not a multiple of %d"
+                                 % (w, base))
+        self.windows = list(windows)
+        self.nwin = [ w // base for w in windows ]
+        self.base = base
+        self.delay = delay
+        self.alpha = float(base) / tau
+        self.warmup = warmup
+        self.min_occupancy = min_occupancy
+        self.dom_bin = dom_bin
+        self.nring = max(self.nwin) + (delay + base - 1) // base + 2
+        self.start = None
+        self.tmax = 0
+        self.last = -1
+        self.closed = -1
+        self.late = 0
+        self.doms = [ ]
+        self.index = { }
+        # Base bin ring, window sums and backgrounds; one column per DOM
+        nw = len(self.windows)
+        self._counts = numpy.zeros((self.nring, capacity))
+        self._live = numpy.zeros((self.nring, capacity))
+        self._wcounts = numpy.zeros((nw, capacity))
+        self._wlive = numpy.zeros((nw, capacity))
+        self._mean = numpy.zeros((nw, capacity))
+        self._var = numpy.zeros((nw, capacity))
+        self._nbg = numpy.zeros((nw, capacity), 'i8')
+
+    def add(self, sn):
+        n = len(sn.scalers)
+        if n == 0: return [ ]
+        base = self.base
+        if self.start is None:
+            self.start = sn.utc // base * base
+        t0 = sn.utc - self.start
+        t1 = t0 + n * self.dom_bin
+        results = [ ]
+        if t1 > self.tmax:
+            self.tmax = t1
+            results = self.__closeUntil((t1 - self.delay) // base - 1)
+        row = self.__row(sn.mbid)
+
+        # Rebin the parts of the record in open bins, interpolating its
+        # cumulative counts at the bin edges
+        lo = (self.closed + 1) * base
+        if t0 < lo:
+            self.late += 1
+            if t1 <= lo: return results
+        k0 = max(t0, lo) // base
+        k1 = (t1 - 1) // base
+        edges = numpy.arange(k0, k1 + 2, dtype='i8') * base
+        edges[0] = max(t0, lo)
+        edges[-1] = t1
+        cum = numpy.zeros(n + 1)
+        numpy.cumsum(sn.scalers, out=cum[1:])
+        cum = numpy.interp((edges - t0) / float(self.dom_bin),
+                           numpy.arange(n + 1), cum)
+        slots = numpy.arange(k0, k1 + 1) % self.nring
+        self._counts[slots, row] += numpy.diff(cum)
+        self._live[slots, row] += numpy.diff(edges) / float(base)
+        self.last = max(self.last, k1)
+        return results
+
+    def flush(self):
+        """Close the bins still open; returns their significances."""
+        if self.start is None: return [ ]
+        return self.__closeUntil((self.tmax - 1) // self.base)
+
+    def __row(self, mbid):
+        i = self.index.get(mbid)
+        if i is None:
+            i = self.index[mbid] = len(self.doms)
+            self.doms.append(mbid)
+            if i >= self._counts.shape[1]:
+                for name in ('_counts', '_live', '_wcounts', '_wlive',
+                             '_mean', '_var', '_nbg'):
+                    a = getattr(self, name)
+                    b = numpy.zeros((a.shape[0], 2 * a.shape[1]), a.dtype)
+                    b[:, :a.shape[1]] = a
+                    setattr(self, name, b)
+        return i
+
+    def __closeUntil(self, k):
+        results = [ ]
+        # After the largest window has passed the last data, all sums
+        # are empty - skip the rest of a long break in one step
+        skip = self.last + max(self.nwin)
+        if k > skip:
+            for i in range(self.closed + 1, skip + 1):
+                results += self.__close(i)
+            for a in (self._counts, self._live, self._wcounts, self._wlive):
+                a[:] = 0
+            self.closed = k
+        for i in range(self.closed + 1, k + 1):
+            results += self.__close(i)
+        return results
+
+    def __close(self, k):
+        nd = len(self.doms)
+        nring = self.nring
+        c = self._counts[k % nring, :nd]
+        l = self._live[k % nring, :nd]
+        t = self.start + (k + 1) * self.base
+        results = [ ]
+        for i, n in enumerate(self.nwin):
+            wc = self._wcounts[i, :nd]
+            wl = self._wlive[i, :nd]
+            wc += c
+            wl += l
+            if k >= n:
+                wc -= self._counts[(k - n) % nring, :nd]
+                wl -= self._live[(k - n) % nring, :nd]
+            if k + 1 >= n:
+                r = self.__evaluate(i, t, wc, wl / n)
+                if r is not None: results.append(r)
+        # The bin leaving the largest window is free for reuse
+        old = (k - max(self.nwin)) % nring
+        self._counts[old] = 0
+        self._live[old] = 0
+        self.closed = k
+        return results
+
+    def __evaluate(self, i, t, wc, eps):
+        nd = len(self.doms)
+        mean = self._mean[i, :nd]
+        var = self._var[i, :nd]
+        nbg = self._nbg[i, :nd]
+        ok = eps >= self.min_occupancy
+        r = wc[ok] / eps[ok]
+        result = None
+        use = (nbg[ok] >= self.warmup) & (var[ok] > 0)
+        if use.any():
+            w = eps[ok][use] / var[ok][use]
+            sw = w.sum()
+            dmu = numpy.dot(w, r[use] - mean[ok][use]) / sw
+            result = SNSignificance(t, self.windows[i], float(dmu),
+                                    1.0 / sqrt(sw), int(use.sum()),
+                                    float(eps[ok][use].sum()))
+        # Update the background of the DOMs in the window
+        nbg[ok] += 1
+        a = numpy.maximum(self.alpha, 1.0 / nbg[ok])
+        d = r - mean[ok]
+        mean[ok] += a * d
+        var[ok] = (1 - a) * (var[ok] + a * d * d)
+        return result
+
+def sn_monitor(f, threshold=None, **kwargs):
+    """
+    Generate the SNSignificance of each window of the supernova
+    payloads of the stream f, or only those with xi >= threshold.
+    Keyword arguments are passed to SNMonitor.
+    """
+    mon = SNMonitor(**kwargs)
+    for sn in SNPayloadReader(f):
+        for r in mon.add(sn):
+            if threshold is None or r.xi >= threshold:
+                yield r
+    for r in mon.flush():
+        if threshold is None or r.xi >= threshold:
+            yield r
@@ -0,0 +1,205 @@
+"""
+Global detector time series of supernova scalers.
+
+Each DOM reports its supernova scalers in 1.6384 ms bins starting at
+its own DOM clock time.  SNTimeSeries redistributes batches of SNData
+records into common global bins: the counts of a record are summed
+with numpy.cumsum and the cumulative counts are interpolated linearly
+at the global bin edges, so each global bin gets the counts of the
+fractional DOM bins it overlaps.  Along with the counts the series
+keeps the occupancy of each bin - the DOM live time in it in units of
+the bin width, i.e. the effective number of DOMs reporting.
+"""
+
+from builtins import object
+import numpy
+from .supernova import SNPayloadReader
+
+DOM_BIN = 16384000              # 1.6384 ms in 0.1 ns
+
+class SNTimeSeries(object):
+    """
+    Counts and occupancy in global bins of bin_width (0.1 ns units):
+        - ts = SNTimeSeries(5000000000)
+        - ts.addBatch(records)  : add a list of SNData
+        - ts.counts[i]          : counts in bin i
+        - ts.occupancy[i]       : DOMs reporting in bin i
+        - ts.deadtime[i]        : DOMs known to be missing in bin i
+        - ts.binTimes()         : left edges of the bins
+        - ts.dom_seconds        : DOM live time added
+    start is the left edge of bin 0; by default the first batch sets
+    it to its earliest record time rounded down to a whole bin.  The
+    parts of records before start are dropped.  The arrays grow as
+    needed; only the first nbins elements are valid.
+    """
+    def __init__(self, bin_width=5000000000, start=None, capacity=1024,
+                 dom_bin=DOM_BIN):
+        self.bin_width = bin_width
+        self.start = start
+        self.dom_bin = dom_bin
+        self.nbins = 0
+        self.dom_seconds = 0.0
+        self._counts = numpy.zeros(capacity)
+        self._occupancy = numpy.zeros(capacity)
+        self._deadtime = numpy.zeros(capacity)
+
+    def _get_counts(self):
+        return self._counts[:self.nbins]
+
+    def _get_occupancy(self):
+        return self._occupancy[:self.nbins]
+
+    def _get_deadtime(self):
+        return self._deadtime[:self.nbins]
+
+    counts = property(_get_counts)
+    occupancy = property(_get_occupancy)
+    deadtime = property(_get_deadtime)
+
+    def binTimes(self):
+        return self.start + self.bin_width * numpy.arange(self.nbins,
+                                                          dtype='i8')
+
+    def globalArray(self):
+        """
+        [ (counts, occupancy), ... ] as ScalerComposition returns: the
+        occupancy is in DOM bins rather than in global bin widths.
+        """
+        scale = float(self.bin_width) / self.dom_bin
+        return list(zip(self.counts.tolist(),
+                        (self.occupancy * scale).tolist()))
+
+    def add(self, sn):
+        self.addBatch([ sn ])
+
+    def addBatch(self, records):
+        """Add a list of SNData records."""
+        records = [ r for r in records if len(r.scalers) > 0 ]
+        if len(records) == 0: return
+        utc = numpy.array([ r.utc for r in records ], 'i8')
+        lengths = numpy.array([ len(r.scalers) for r in records ], 'i8')
+        scalers = numpy.frombuffer(b''.join([ bytes(bytearray(r.scalers))
+                                              for r in records ]), 'u1')
+        self.addScalers(utc, lengths, scalers)
+
+    def addScalers(self, utc, lengths, scalers):
+        """
+        Add records given as arrays: the start times utc, the numbers
+        of scalers lengths and the scalers of all records end to end.
+        """
+        utc = numpy.asarray(utc, 'i8')
+        lengths = numpy.asarray(lengths, 'i8')
+        b = numpy.asarray(scalers, 'f8')
+        bw = self.bin_width
+        db = self.dom_bin
+        if self.start is None:
+            self.start = int(utc.min()) // bw * bw
+        # Record offsets into b and cumulative counts before each scaler
+        off = numpy.zeros(len(lengths), 'i8')
+        numpy.cumsum(lengths[:-1], out=off[1:])
+        cum = numpy.zeros(len(b) + 1)
+        numpy.cumsum(b, out=cum[1:])
+
+        rel = utc - self.start
+        end = rel + lengths * db
+        keep = end > 0
+        if not keep.all():
+            rel, end, lengths, off = rel[keep], end[keep], lengths[keep], \
+                off[keep]
+            if len(rel) == 0: return
+        self.dom_seconds += 1.0E-10 * float(numpy.sum(end - rel))
+        r, j, left, right = self.__segments(rel, end)
+        counts = self.__cumulative(right - rel[r], lengths[r], off[r], b, cum) \
+            - self.__cumulative(left - rel[r], lengths[r], off[r], b, cum)
+        jmin = int(j.min())
+        n = int(j.max()) + 1 - jmin
+        self._counts[jmin:jmin + n] += numpy.bincount(j - jmin, counts, n)
+        self._occupancy[jmin:jmin + n] += numpy.bincount(
+            j - jmin, (right - left) / float(bw), n)
+
+    def addDeadTime(self, t0, t1):
+        """
+        Add DOM dead time - e.g. the gaps found by a SNGapTracker - in
+        the intervals [t0, t1) given as arrays of times.
+        """
+        t0 = numpy.asarray(t0, 'i8')
+        t1 = numpy.asarray(t1, 'i8')
+        if self.start is None:
+            if len(t0) == 0: return
+            self.start = int(t0.min()) // self.bin_width * self.bin_width
+        rel = t0 - self.start
+        end = t1 - self.start
+        keep = end > numpy.maximum(rel, 0)
+        if not keep.any(): return
+        r, j, left, right = self.__segments(rel[keep], end[keep])
+        jmin = int(j.min())
+        n = int(j.max()) + 1 - jmin
+        self._deadtime[jmin:jmin + n] += numpy.bincount(
+            j - jmin, (right - left) / float(self.bin_width), n)
+
+    def __segments(self, rel, end):
+        """
+        Split the intervals [rel, end) into one segment per global bin
+        they overlap: returns the interval and bin of each segment and
+        its edges.
+        """
+        bw = self.bin_width
+        j0 = numpy.maximum(rel, 0) // bw
+        j1 = (end - 1) // bw
+        self.__reserve(int(j1.max()) + 1)
+        nseg = j1 - j0 + 1
+        r = numpy.repeat(numpy.arange(len(rel)), nseg)
+        first = numpy.zeros(len(nseg), 'i8')
+        numpy.cumsum(nseg[:-1], out=first[1:])
+        j = j0[r] + numpy.arange(len(r)) - first[r]
+        left = numpy.maximum(j * bw, rel[r])
+        right = numpy.minimum((j + 1) * bw, end[r])
+        return r, j, left, right
+
+    def __cumulative(self, dt, n, off, b, cum):
+        """Counts of records from their start to dt (0.1 ns) into them."""
+        x = dt / float(self.dom_bin)
+        k = numpy.minimum(numpy.floor(x).astype('i8'), n - 1)
+        return cum[off + k] + (x - k) * b[off + k]
+
+    def __reserve(self, nbins):
+        if nbins > len(self._counts):
+            size = max(nbins, 2 * len(self._counts))
+            for name in ('_counts', '_occupancy', '_deadtime'):
+                a = numpy.zeros(size)
+                a[:self.nbins] = getattr(self, name)[:self.nbins]
+                setattr(self, name, a)
+        self.nbins = max(self.nbins, nbins)
+
+def sn_series(f, bin_width=5000000000, batch=5000, start=None, tracker=None):
+    """
+    Build the SNTimeSeries of the supernova payloads of the stream f,
+    added in batches of batch records.  If a SNGapTracker is given,
+    the records go through it and the gaps in which it found lost
+    scaler bins are added to the series as dead time - including those
+    of the DOMs which stopped before the end of the stream.
+    """
+    ts = SNTimeSeries(bin_width, start)
+    records = [ ]
+    dead = [ ]
+    tend = None
+    for sn in SNPayloadReader(f):
+        records.append(sn)
+        if tracker is not None:
+            if tend is None or sn.utcend > tend: tend = sn.utcend
+            g = tracker.add(sn)
+            if g is not None and g.lost > 0:
+                dead.append((g.t0, g.t1))
+        if len(records) >= batch:
+            _flush_batch(ts, records, dead)
+            records = [ ]
+            dead = [ ]
+    if tend is not None:
+        dead += [ (g.t0, g.t1) for g in tracker.close(tend) if g.lost > 0 ]
+    _flush_batch(ts, records, dead)
+    return ts
+
+def _flush_batch(ts, records, dead):
+    ts.addBatch(records)
+    if len(dead) > 0:
+        ts.addDeadTime([ d[0] for d in dead ], [ d[1] for d in dead ])
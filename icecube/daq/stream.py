@@ -0,0 +1,162 @@
+"""
+Transparent reading of compressed DAQ payload files.
+
+open_daq_stream() recognizes gzip, bzip2, xz and ZIP files by their
+magic bytes.  Compressed input is decompressed on a background thread
+into a bounded queue of large chunks, so that decompression (which
+releases the interpreter lock) overlaps with payload decoding in the
+calling thread.  Plain files are simply opened.
+"""
+
+from future import standard_library
+standard_library.install_aliases()
+from builtins import object
+import bz2
+import gzip
+import lzma
+import threading
+from queue import Queue, Empty, Full
+from zipfile import ZipFile
+
+CHUNK_SIZE = 1 << 20
+
+_MAGIC = [ (b'\x1f\x8b',                'gzip'),
+           (b'BZh',                     'bz2'),
+           (b'\xfd7zXZ\x00',            'xz'),
+           (b'PK\x03\x04',              'zip') ]
+
+def detect_format(path):
+    """Return 'gzip', 'bz2', 'xz', 'zip' or 'plain' for the file path."""
+    f = open(path, 'rb')
+    try:
+        magic = f.read(6)
+    finally:
+        f.close()
+    for m, fmt in _MAGIC:
+        if magic.startswith(m): return fmt
+    return 'plain'
+
+def open_daq_stream(path, member=None, chunk_size=CHUNK_SIZE, depth=8):
+    """
+    Open a (possibly compressed) payload file for reading, e.g.
+        - for p in read_payloads(open_daq_stream('run1234.dat.gz')): ...
+    Compressed files are returned as a DaqStream decompressing up to
+    depth chunks of chunk_size bytes ahead of the reader.  member
+    selects the entry of a ZIP archive (default: the first one).
+    """
+    fmt = detect_format(path)
+    if fmt == 'plain':
+        return open(path, 'rb')
+    if fmt == 'gzip':
+        raw = gzip.GzipFile(path, 'rb')
+    elif fmt == 'bz2':
+        raw = bz2.BZ2File(path, 'rb')
+    elif fmt == 'xz':
+        raw = lzma.LZMAFile(path, 'rb')
+    else:
+        zf = ZipFile(path, 'r')
+        if member is None:
+            member = zf.namelist()[0]
+        raw = zf.open(member, 'r')
+        zf.close()
+    return DaqStream(raw, chunk_size, depth)
+
+class DaqStream(object):
+    """
+    Read-only stream over the file-like raw which is read in chunks
+    by a background thread.  Supports read(), readinto() and tell();
+    read(n) costs O(n) however small the reads are.
+    """
+    def __init__(self, raw, chunk_size=CHUNK_SIZE, depth=8):
+        self.raw = raw
+        self.chunk_size = chunk_size
+        self.queue = Queue(depth)
+        self.chunk = b''
+        self.pos = 0
+        self.offset = 0
+        self.eof = False
+        self.closed = False
+        self.thread = threading.Thread(target=self.__produce)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __produce(self):
+        try:
+            while not self.closed:
+                buf = self.raw.read(self.chunk_size)
+                if len(buf) == 0: break
+                self.__put(buf)
+        except Exception as e:
+            self.__put(e)
+        self.__put(None)
+
+    def __put(self, x):
+        while not self.closed:
+            try:
+                self.queue.put(x, timeout=0.1)
+                return
+            except Full:
+                pass
+
+    def __next(self):
+        """Move on to the next chunk; False at the end of the stream."""
+        if self.eof: return False
+        x = self.queue.get()
+        if x is None:
+            self.eof = True
+            return False
+        if isinstance(x, Exception):
+            self.eof = True
+            raise x
+        self.chunk, self.pos = x, 0
+        return True
+
+    def read(self, n=-1):
+        parts = [ ]
+        while n != 0:
+            if self.pos >= len(self.chunk) and not self.__next(): break
+            avail = len(self.chunk) - self.pos
+            k = avail if n < 0 or n > avail else n
+            if k == len(self.chunk):
+                parts.append(self.chunk)
+            else:
+                parts.append(self.chunk[self.pos:self.pos + k])
+            self.pos += k
+            self.offset += k
+            if n > 0: n -= k
+        if len(parts) == 1:
+            return parts[0]
+        return b''.join(parts)
+
+    def readinto(self, b):
+        mv = memoryview(b).cast('B')
+        n = 0
+        while n < len(mv):
+            if self.pos >= len(self.chunk) and not self.__next(): break
+            k = min(len(mv) - n, len(self.chunk) - self.pos)
+            mv[n:n + k] = self.chunk[self.pos:self.pos + k]
+            self.pos += k
+            n += k
+        self.offset += n
+        return n
+
+    def tell(self):
+        """Number of decompressed bytes read so far."""
+        return self.offset
+
+    def close(self):
+        if self.closed: return
+        self.closed = True
+        # Unblock the reader thread if it waits for room in the queue
+        try:
+            while True: self.queue.get_nowait()
+        except Empty:
+            pass
+        self.thread.join()
+        self.raw.close()
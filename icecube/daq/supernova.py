@@ -6,7 +6,6 @@ A module to handle IceCube supernova data
 from builtins import zip
 from builtins import range
 from builtins import object
-from future.utils import raise_
 from struct import unpack, pack
 
 class SNData(object):
@@ -55,8 +54,9 @@ def procsn(f, holdoff=10000):
         if len(hdr) != 24: break
         bytes, fmtid, utc, mbid = unpack('>iiqq', hdr)
         buf = f.read(bytes-24)
-        mbid = "%12.12x" % mbid
-        s = SNData(hdr + buf)
+        if fmtid != 16: continue
+        s = SNData(buf, mbid, utc)
+        mbid = s.mbid
         mtim[mbid] = s.utcend
         if ta is None: ta = s.utc // 10000000000 * 10000000000
         rebin(a, ta, da, s.scalers, s.utc, db)
@@ -109,111 +109,153 @@ def gaps(snvec):
         y = snvec[i]
         if (y.domclk - x.domclk) >> 16 != len(x.scalers): g.append(i-1)
     return g
+
+class SNGap(object):
+    """
+    A break in the SN scalers of a DOM: lost scaler bins, going by the
+    DOM clock, between the UT times t0 and t1.  lost is negative if
+    the records overlap or the DOM clock went back.
+    """
+    def __init__(self, mbid, t0, t1, lost):
+        self.mbid = mbid
+        self.t0 = t0
+        self.t1 = t1
+        self.lost = lost
+
+    def __repr__(self):
+        return "SNGap(%s, %d, %d, %d)" % (self.mbid, self.t0, self.t1,
+                                           self.lost)
+
+class SNGapTracker(object):
+    """
+    Follow the DOM clock continuity of each DOM in a stream of SNData
+    records, keeping only the end of the last record of each DOM:
+        - g = tracker.add(sn)   : the SNGap before sn, or None
+        - tracker.close(t)      : the SNGaps of the DOMs whose last
+                                  record ends before t
+        - tracker.lost          : {mbid: lost bins}
+        - tracker.ngaps         : the number of gaps found
+    add() finds the same gaps as gaps() does for the records of a DOM.
+    """
+    def __init__(self):
+        self.last = { }
+        self.lost = { }
+        self.ngaps = 0
+
+    def add(self, sn):
+        prev = self.last.get(sn.mbid)
+        self.last[sn.mbid] = (sn.domclk + (len(sn.scalers) << 16), sn.utcend)
+        if prev is None:
+            self.lost[sn.mbid] = 0
+            return None
+        domclk, utcend = prev
+        lost = (sn.domclk - domclk) >> 16
+        if lost == 0: return None
+        self.lost[sn.mbid] += lost
+        self.ngaps += 1
+        return SNGap(sn.mbid, utcend, sn.utc, lost)
+
+    def close(self, t):
+        """
+        Return the gaps from the end of each DOM's last record to t,
+        e.g. the end of a run, for the DOMs which stopped early.
+        """
+        g = [ ]
+        for mbid, (domclk, utcend) in self.last.items():
+            if utcend < t:
+                g.append(SNGap(mbid, utcend, t, (t - utcend) // 16384000))
+        return g
    
+# S2 codes of the scalers 0 - 15 as bit strings in stream order
+_S2_CODES = ('0', '10', '110', '1110') + \
+    tuple([ '1111' + ('{0:04b}'.format(n))[::-1] for n in range(4, 16) ])
+_S2_STOP = '11110000'
+_s2_table = None
+
+def _s2_decode_table():
+    """
+    Build the decoding table: entry state * 256 + byte gives the
+    scalers completed by the byte and the state after it, -1 after
+    STOP.  States 0 - 3 count the leading 1s of a code, and 4 + 2^k
+    - 1 + v are a nybble with its first k bits of value v read.
+    """
+    global _s2_table
+    if _s2_table is not None: return _s2_table
+    table = [ ]
+    for state in range(19):
+        for byte in range(256):
+            s = state
+            out = [ ]
+            for i in range(8):
+                bit = (byte >> i) & 1
+                if s < 4:
+                    if bit == 0:
+                        out.append(s)
+                        s = 0
+                    else:
+                        s += 1
+                else:
+                    k = 0
+                    while s - 4 >= (2 << k) - 1: k += 1
+                    v = (s - 4 - (1 << k) + 1) | (bit << k)
+                    if k < 3:
+                        s = 4 + (2 << k) - 1 + v
+                    elif v == 0:
+                        s = -1
+                        break
+                    else:
+                        out.append(v)
+                        s = 0
+            table.append((tuple(out), s))
+    _s2_table = table
+    return table
+
+def s2_encode(scalers):
+    """Pack scalers into an S2 bit vector, ending with STOP."""
+    if len(scalers) > 0 and (max(scalers) > 15 or min(scalers) < 0):
+        raise ValueError([ s for s in scalers if not 0 <= s < 16 ][0])
+    bits = ''.join(map(_S2_CODES.__getitem__, scalers)) + _S2_STOP
+    n = (len(bits) + 7) // 8
+    return int(bits[::-1], 2).to_bytes(n, 'little')
+
+def s2_decode(buf, offset=0):
+    """
+    Unpack the S2 bit vector starting at offset in buf; returns the
+    scalers and the offset of the byte after the vector.
+    """
+    table = _s2_decode_table()
+    scalers = [ ]
+    state = 0
+    for pos in range(offset, len(buf)):
+        syms, state = table[state * 256 + buf[pos]]
+        scalers += syms
+        if state < 0: return scalers, pos + 1
+    raise ValueError("S2 bit vector without STOP")
+
 class S2Codec(object):
     """
     A simple encoder/decoder which translates SN vectors into
     a bit-packed representation of symbols where
-    0        : 0
-    10       : 1
-    110      : 2
-    1110     : 3
-    11110100 : 4
-    11110101 : 5
-    &c.
-    11110000 : STOP
-    11110001 - 11110011 : UNDEF
+    0         : 0
+    10        : 1
+    110       : 2
+    1110      : 3
+    1111 nnnn : n = 4 ... 15
+    1111 0000 : STOP
+    1111 0001 - 1111 0011 : UNDEF
+    Bits are given in stream order and packed into bytes least
+    significant bit first; the nybbles n are also written least
+    significant bit first.  The last byte is padded with 0 bits.
     """
     def encode(self, scalers):
         """
         Transform scalers into packed bits.
         """
-        self.bitvector = ""
-        self.register = 0
-        self.bpos = 0
-        for s in scalers:
-            if s == 0:
-                self.__push(0)
-            elif s == 1:
-                self.__push(1)
-                self.__push(0)
-            elif s == 2:
-                self.__push(1)
-                self.__push(1)
-                self.__push(0)
-            elif s == 3:
-                self.__pushn(14)
-            elif s < 16:
-                self.__pushn(15)
-                self.__pushn(s)
-            else:
-                raise_(ValueError, s)
-                
-        # Push the STOP
-        self.__pushn(15)
-        self.__pushn(0)
-        
-        # Flush out anything remaining in the register
-        if self.bpos > 0:
-            self.bitvector += pack('B', self.register)
-            self.bpos = 0
-        
+        self.bitvector = s2_encode(scalers)
+        return self.bitvector
+
     def decode(self):
-        scalers = [ ]
-        state = 0
-        self.bpos = 8
-        while True:
-            b = self.__pop()
-            if state < 4:
-                if b == 0:
-                    scalers.append(state)
-                    state = 0
-                else:
-                    state += 1
-            else:
-                n = self.__popn()
-                # Check STOP signal
-                if n == 0: return scalers
-                scalers.append(n)
-                state = 0
-                
-    def __push(self, bit):
-        """
-        Internal method to append bit to bitvector.
-        """
-        if bit: self.register |= (1 << self.bpos)
-        self.bpos += 1
-        if self.bpos == 8:
-            self.bitvector += pack('B', self.register)
-            self.bpos = 0
-            self.register = 0
-            
-    def __pop(self):
-        if self.bpos == 8:
-            self.register = unpack('B', self.bitvector[0])[0]
-            self.bitvector = self.bitvector[1:]
-            self.bpos = 0
-        bit = self.register & 1
-        self.register >>= 1
-        self.bpos += 1
-        return bit
-        
-    def __pushn(self, nybble):
-        self.register |= (nybble << self.bpos)
-        self.bpos += 4
-        if self.bpos > 7:
-            self.bitvector += pack('B', self.register & 0xff)
-            self.register >>= 8
-            self.bpos -= 8
-        
-    def __popn(self):
-        if self.bpos > 4:
-            self.register |= (unpack('B', self.bitvector[0])[0] << (8-self.bpos))
-            self.bpos -= 8
-        nybble = self.register & 0x0f
-        self.register >>= 4
-        self.bpos += 4
-        return nybble
+        return s2_decode(self.bitvector)[0]
 
 class ScalerComposition(object):
     """
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+#
+# icecube.daq.chargemap unit tests
+
+from builtins import range
+import os
+import shutil
+import tempfile
+import unittest
+from io import BytesIO
+from struct import pack
+from icecube.daq.payload import read_payloads, decode_payload
+from icecube.daq.slchit import DeltaCompressedHit
+from icecube.daq.chargemap import ChargeMap, chargemap_file, chargemap_files
+import MockPayload as mp
+
+def stamp(pos, pre, peak, post, rng=0):
+    return (rng << 31) | (pos << 27) | (pre << 18) | (peak << 9) | post
+
+def compressedEvent(utime, uid, hits):
+    """Type-19 event of (mbid, word2) compressed hits."""
+    data = [ mp.deltaHit(utime + i, mbid,
+                         pack(">qII", 1000 + i, 0x8000 | 24, w2) + b"\x00" * 16)
+             for i, (mbid, w2) in enumerate(hits) ]
+    trig = mp.triggerRequest(utime, uid, (utime, utime + 100), [ ])
+    rdout = mp.readoutData(utime, uid, (utime, utime + 100), data)
+    return mp.event(19, utime, uid, (utime, utime + 100), 1000, 0,
+                    [ trig, rdout ])
+
+class testChargeMap(unittest.TestCase):
+    """Unit tests for ChargeMap"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        # Charges 30, 300 and (range bit) 2 * 450
+        self.hits = [ (0x1234567890ab, stamp(3, 5, 20, 5)),
+                      (0x1234567890ab, stamp(4, 50, 200, 50)),
+                      (0x0000000000cd, stamp(15, 100, 250, 100, 1)) ]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testAddEvent(self):
+        cmap = ChargeMap(nbins=10, max_charge=1000)
+        cmap.addEvent(decode_payload(BytesIO(compressedEvent(1000, 1,
+                                                             self.hits))))
+        self.assertEqual(cmap.doms, [ '1234567890ab', '0000000000cd' ])
+        self.assertEqual(list(cmap.getCharge('1234567890ab')),
+                         [ 1, 0, 0, 1, 0, 0, 0, 0, 0, 0 ])
+        self.assertEqual(list(cmap.getCharge('0000000000cd')),
+                         [ 0, 0, 0, 0, 0, 0, 0, 0, 0, 1 ])
+        peak = cmap.getPeak('1234567890ab')
+        self.assertEqual((peak[3], peak[4], peak.sum()), (1, 1, 2))
+        self.assertEqual(cmap.getPeak('0000000000cd')[15], 1)
+
+    def testAddHits(self):
+        evt = decode_payload(BytesIO(compressedEvent(1000, 1, self.hits)))
+        a = ChargeMap()
+        a.addEvent(evt)
+        b = ChargeMap()
+        b.addHits(evt.getHits())
+        self.assertEqual(a.doms, b.doms)
+        for dom in a.doms:
+            self.assertEqual(list(a.getCharge(dom)), list(b.getCharge(dom)))
+            self.assertEqual(list(a.getPeak(dom)), list(b.getPeak(dom)))
+
+    def testNoWaveformDecoding(self):
+        def fail(self):
+            raise AssertionError("decode_waveforms called")
+        saved = DeltaCompressedHit.decode_waveforms
+        DeltaCompressedHit.decode_waveforms = fail
+        try:
+            evt = decode_payload(BytesIO(compressedEvent(1000, 1, self.hits)))
+            cmap = ChargeMap()
+            cmap.addEvent(evt)
+            cmap.addHits(evt.getHits())
+            cmap.flush()
+        finally:
+            DeltaCompressedHit.decode_waveforms = saved
+        self.assertEqual(cmap.charge.sum(), 6)
+
+    def testEvent21(self):
+        data = pack(">qII", 1000, 0x8000 | 24, stamp(2, 1, 2, 3)) + b"\x00" * 8
+        hits = [ (1, 0, 5, 0, data), (1, 0, 6, 10, data) ]
+        trigs = [ (0, 1000, 4000, 0, 100, [ 0, 1 ]),
+                  (2, 1010, 4000, 5, 50, [ 0 ]) ]
+        evt = decode_payload(BytesIO(mp.event21(1000, 1, 1000, 0,
+                                                hits, trigs)))
+        cmap = ChargeMap(nbins=4, max_charge=8)
+        cmap.addEvent(evt)
+        self.assertEqual(cmap.doms, [ 5, 6 ])
+        self.assertEqual(list(cmap.getCharge(5)), [ 0, 0, 0, 1 ])
+        self.assertEqual(cmap.getPeak(6)[2], 1)
+
+    def testBatches(self):
+        evts = [ decode_payload(BytesIO(compressedEvent(1000 * i, i,
+                                                        self.hits)))
+                 for i in range(1, 8) ]
+        a = ChargeMap(batch=2)
+        b = ChargeMap()
+        for evt in evts:
+            a.addEvent(evt)
+            b.addEvent(evt)
+        a.flush()
+        b.flush()
+        self.assertEqual(a.charge.tolist(), b.charge.tolist())
+        self.assertEqual(a.peak.sum(), 21)
+
+    def testMerge(self):
+        e1 = decode_payload(BytesIO(compressedEvent(1000, 1, self.hits[:2])))
+        e2 = decode_payload(BytesIO(compressedEvent(2000, 2, self.hits[1:])))
+        a = ChargeMap()
+        a.addEvent(e1)
+        b = ChargeMap()
+        b.addEvent(e2)
+        total = ChargeMap()
+        total.addEvent(e1)
+        total.addEvent(e2)
+        a.merge(b)
+        self.assertEqual(a.doms, total.doms)
+        for dom in a.doms:
+            self.assertEqual(list(a.getCharge(dom)),
+                             list(total.getCharge(dom)))
+            self.assertEqual(list(a.getPeak(dom)), list(total.getPeak(dom)))
+        self.assertRaises(ValueError, a.merge, ChargeMap(nbins=7))
+
+    def testFiles(self):
+        files = [ ]
+        for k in range(3):
+            filename = os.path.join(self.dir, '%d.dat' % k)
+            f = open(filename, 'wb')
+            for i in range(5):
+                f.write(compressedEvent(1000 * (i + 1), i, self.hits[k:]))
+            f.close()
+            files.append(filename)
+        serial = chargemap_files(files, workers=1)
+        parallel = chargemap_files(files, workers=2)
+        self.assertEqual(sorted(serial.doms), sorted(parallel.doms))
+        for dom in serial.doms:
+            self.assertEqual(list(serial.getCharge(dom)),
+                             list(parallel.getCharge(dom)))
+        self.assertEqual(serial.charge.sum(), 5 * (3 + 2 + 1))
+        self.assertEqual(chargemap_file(files[2]).doms, [ '0000000000cd' ])
+
+def suite():
+    return unittest.makeSuite(testChargeMap)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+#
+# icecube.daq.deltacodec unit tests
+
+from builtins import range
+import random
+import unittest
+from io import BytesIO
+from struct import pack
+from icecube.daq.deltacodec import delta_decoder, delta_encoder, \
+     delta_encode, encode_hit
+from icecube.daq.slchit import delta_codec, DeltaCompressedHit
+from icecube.daq.hitarrays import decode_delta_waveforms
+from icecube.daq.util import nextHit, compress_hits
+import MockPayload as mp
+
+def randomStream(rnd, n):
+    # Mostly narrow codes, now and then anything
+    return bytes([ rnd.choice([ 0, 0, 0x49, 0x92, 0x24, 0xff,
+                                rnd.randrange(256) ]) for i in range(n) ])
+
+def randomWaveform(rnd, n):
+    """Baseline noise, sometimes a pulse, sometimes arbitrary jumps."""
+    kind = rnd.randrange(3)
+    base = rnd.randrange(1024)
+    w = [ ]
+    for i in range(n):
+        if kind == 0:
+            x = base + rnd.randint(-1, 1)
+        elif kind == 1:
+            x = base + rnd.randint(-3, 3) + max(0, 600 - 40 * abs(i - 20))
+        else:
+            x = rnd.randrange(1024)
+        w.append(min(max(x, 0), 1023))
+    return w
+
+def decodeAll(codec, lengths):
+    out = [ ]
+    for n in lengths:
+        try:
+            out.append(codec.decode(n))
+        except Exception:
+            out.append(None)
+            break
+    return out
+
+class testDeltaDecoder(unittest.TestCase):
+    """Unit tests for the table-driven delta decoder"""
+
+    def testKnownStream(self):
+        # 3-bit 1, 2-bit -1, 2-bit 0
+        self.assertEqual(delta_decoder(b"\x19").decode(3), [ 1, 0, 0 ])
+
+    def testMatchesReference(self):
+        rnd = random.Random(1234)
+        nsample = 0
+        for trial in range(1000):
+            buf = randomStream(rnd, rnd.randint(0, 400))
+            lengths = [ 256, 128, 128, 7, 128 ]
+            ref = decodeAll(delta_codec(buf), lengths)
+            self.assertEqual(decodeAll(delta_decoder(buf), lengths), ref)
+            nsample += sum([ len(x) for x in ref if x is not None ])
+        self.assertTrue(nsample > 100000)
+
+    def testExhausted(self):
+        # 3 + 2 + 27 * 1 bits
+        codec = delta_decoder(b"\x00" * 4)
+        self.assertEqual(codec.decode(29), [ 0 ] * 29)
+        self.assertRaises(ValueError, codec.decode, 1)
+
+    def testBadShiftUp(self):
+        # Escapes from 3 to 6 to 11 bits, then the 11-bit escape code
+        stream = (4 | (32 << 3) | (1024 << 9)) .to_bytes(3, 'little')
+        self.assertRaises(ValueError, delta_decoder(stream).decode, 1)
+        self.assertRaises(ValueError, delta_codec(stream).decode, 1)
+
+    def testBatch(self):
+        rnd = random.Random(99)
+        hits = [ ]
+        while len(hits) < 20:
+            word0 = rnd.choice([ 0xc000, 0x8000, 0x4000, 0xf000, 0x5000 ])
+            buf = pack(">qii", 1000, word0, 0) + randomStream(rnd, 600)
+            hit = DeltaCompressedHit(buf)
+            try:
+                hit.decode_waveforms()
+            except Exception:
+                continue
+            hits.append(hit)
+        fadc, atwd = decode_delta_waveforms(hits)
+        for i, h in enumerate(hits):
+            ref = delta_codec(h.buf[8:])
+            if h.fadc_avail:
+                self.assertEqual(list(fadc[i]), ref.decode(256))
+                self.assertEqual(list(fadc[i]), h.fADC)
+            else:
+                self.assertFalse(fadc[i].any())
+            for ich in range(4):
+                if h.atwd_avail and ich <= h.atwd_channels:
+                    self.assertEqual(list(atwd[i, ich]), ref.decode(128))
+                    self.assertEqual(list(atwd[i, ich]), h.atwd[ich])
+                else:
+                    self.assertFalse(atwd[i, ich].any())
+
+class testDeltaEncoder(unittest.TestCase):
+    """Unit tests for the delta encoder"""
+
+    def testRoundTrip(self):
+        rnd = random.Random(4321)
+        for trial in range(300):
+            lengths = [ rnd.choice([ 0, 1, 16, 128, 256 ])
+                        for i in range(rnd.randint(1, 5)) ]
+            waveforms = [ randomWaveform(rnd, n) for n in lengths ]
+            buf = delta_encode(waveforms)
+            self.assertEqual(decodeAll(delta_decoder(buf), lengths), waveforms)
+            self.assertEqual(decodeAll(delta_codec(buf), lengths), waveforms)
+
+    def testSignedSamples(self):
+        w = [ -5, 1000, -1023 + 1000, 0, 7 ]
+        self.assertEqual(delta_decoder(delta_encode([ w ])).decode(5), w)
+
+    def testCompact(self):
+        # 3 + 2 + 254 * 1 bits
+        self.assertEqual(len(delta_encode([ [ 0 ] * 256 ])), 33)
+
+    def testIncremental(self):
+        enc = delta_encoder()
+        enc.encode([ 1, 2, 3 ])
+        enc.encode([ 100 ] * 40)
+        self.assertEqual(enc.getvalue(),
+                         delta_encode([ [ 1, 2, 3 ], [ 100 ] * 40 ]))
+
+    def testTooLarge(self):
+        self.assertRaises(ValueError, delta_encode, [ [ 0, 1024 ] ])
+        self.assertRaises(ValueError, delta_encode, [ [ 1024 ] ])
+
+    def testEncodeHit(self):
+        fadc = [ 10 ] * 5 + [ 300, 800, 400 ] + [ 12 ] * 100
+        atwd = [ [ 5 ] * 128, None, [ 7 ] * 64, None ]
+        word0, word2, data = encode_hit(fadc, atwd, atwd_chip=1, trigger=2,
+                                        lc=3)
+        h = DeltaCompressedHit(pack(">qII", 1234, word0, word2) + data)
+        self.assertEqual((h.trigger, h.lc, h.atwd_chip), (2, 3, 1))
+        self.assertTrue(h.fadc_avail and h.atwd_avail)
+        self.assertEqual(h.atwd_channels, 2)
+        self.assertEqual(h.hit_size, 8 + len(data))
+        self.assertEqual(h.chargestamp, (6, 300, 800, 400))
+        h.decode_waveforms()
+        self.assertEqual(h.fADC, fadc + [ 12 ] * 148)
+        self.assertEqual(h.atwd[:3], [ [ 5 ] * 128, [ 0 ] * 128, [ 7 ] * 128 ])
+
+    def testCompressHits(self):
+        rnd = random.Random(7)
+        recs = [ ]
+        for i in range(10):
+            rec = mp.engRecord(1000 + i, randomWaveform(rnd, 255),
+                [ (3, randomWaveform(rnd, 32)), (7, randomWaveform(rnd, 64)),
+                  (0, None), (0, None) ], chip=i % 2, trigger=1)
+            recs.append(pack(">iiq8xq", 32 + len(rec), 2, 0x123456789a,
+                             5000 + i) + rec)
+        out = BytesIO()
+        self.assertEqual(compress_hits(BytesIO(b"".join(recs)), out), 10)
+        self.assertTrue(len(out.getvalue()) < len(b"".join(recs)))
+        fin, fout = BytesIO(b"".join(recs)), BytesIO(out.getvalue())
+        for i in range(10):
+            eng, slc = nextHit(fin), nextHit(fout)
+            self.assertEqual((slc.mbid, slc.utc, slc.domclk),
+                             (eng.mbid, eng.utclk, eng.domclk))
+            self.assertEqual(slc.atwd_chip, eng.atwd_chip)
+            slc.decode_waveforms()
+            self.assertEqual(slc.fADC, list(eng.fadc) + [ eng.fadc[-1] ])
+            for ich, n in ((0, 32), (1, 64)):
+                self.assertEqual(slc.atwd[ich], list(eng.atwd[ich]) +
+                                 [ eng.atwd[ich][-1] ] * (128 - n))
+            self.assertEqual(slc.atwd[2], [ ])
+        self.assertTrue(nextHit(fout) is None)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testDeltaDecoder))
+    suite.addTest(unittest.makeSuite(testDeltaEncoder))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+#
+# icecube.daq.demux unit tests
+
+from builtins import range
+import os
+import shutil
+import tempfile
+import unittest
+from io import BytesIO
+from struct import pack
+from icecube.daq.demux import HitDemux, demux_file, demux_files
+from icecube.daq.util import getHits
+import MockPayload as mp
+
+MBIDS = [ 0x0123456789ab + 7 * i for i in range(5) ]
+
+def hitRecord(mbid, utc, nbody=20):
+    body = pack(">q", utc) + b"\x5a" * nbody
+    return pack(">iiq8xq", 32 + len(body), 2, mbid, utc) + body
+
+def hitStream(first, n):
+    """n records, round-robin over MBIDS, with utc first, first+1 ..."""
+    return [ (MBIDS[i % len(MBIDS)], hitRecord(MBIDS[i % len(MBIDS)], i,
+                                               10 + i % 13))
+             for i in range(first, first + n) ]
+
+class testDemux(unittest.TestCase):
+    """Unit tests for the .hit stream demultiplexer"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def expected(self, records):
+        out = { }
+        for mbid, rec in records:
+            out[mbid] = out.get(mbid, b'') + rec
+        return out
+
+    def check(self, records, counts):
+        expect = self.expected(records)
+        self.assertEqual(sorted(counts), sorted(expect))
+        for mbid, data in expect.items():
+            f = open(os.path.join(self.dir, '%12.12x.hit' % mbid), 'rb')
+            self.assertEqual(f.read(), data)
+            f.close()
+            self.assertEqual(counts[mbid],
+                             len([ r for r in records if r[0] == mbid ]))
+
+    def testSmallChunks(self):
+        records = hitStream(0, 200)
+        dmx = HitDemux(self.dir, max_open=2, bufsize=100)
+        n = dmx.demux(BytesIO(b''.join([ r for m, r in records ])),
+                      chunk_size=57)
+        dmx.close()
+        self.assertEqual(n, 200)
+        self.assertEqual(dmx.truncated, 0)
+        self.check(records, dmx.counts)
+
+    def testTruncated(self):
+        records = hitStream(0, 10)
+        data = b''.join([ r for m, r in records ])
+        with HitDemux(self.dir) as dmx:
+            self.assertEqual(dmx.demux(BytesIO(data[:-5])), 9)
+        self.assertEqual(dmx.truncated, 1)
+        self.check(records[:9], dmx.counts)
+
+    def testBadLength(self):
+        dmx = HitDemux(self.dir)
+        self.assertRaises(ValueError, dmx.demux,
+                          BytesIO(pack(">iiq8xq", 8, 2, 1, 0)))
+
+    def writeInputs(self):
+        paths, records = [ ], [ ]
+        for k in range(4):
+            recs = hitStream(100 * k, 60 + k)
+            path = os.path.join(self.dir, 'in%d.dat' % k)
+            f = open(path, 'wb')
+            f.write(b''.join([ r for m, r in recs ]))
+            f.close()
+            paths.append(path)
+            records += recs
+        return paths, records
+
+    def testFile(self):
+        paths, records = self.writeInputs()
+        counts = demux_file(paths[0], self.dir, max_open=1)
+        self.check(records[:60], counts)
+
+    def testSerialFiles(self):
+        paths, records = self.writeInputs()
+        self.check(records, demux_files(paths, self.dir, max_open=3,
+                                        workers=1))
+
+    def testParallelFiles(self):
+        paths, records = self.writeInputs()
+        self.check(records, demux_files(paths, self.dir, max_open=3,
+                                        workers=2))
+        self.assertEqual(sorted([ x for x in os.listdir(self.dir)
+                                  if not x.endswith('.hit') ]),
+                         [ 'in%d.dat' % k for k in range(4) ])
+
+    def testGetHitsDefault(self):
+        # The hits of one call must not leak into the next
+        def engHit(mbid, utc):
+            rec = mp.engRecord(utc, [ 1, 2 ], [ (0, None) ] * 4)
+            return pack(">iiq8xq", 32 + len(rec), 2, mbid, utc) + rec
+        a = getHits(BytesIO(engHit(MBIDS[0], 1)))
+        b = getHits(BytesIO(engHit(MBIDS[1], 2)))
+        self.assertEqual(list(a), [ '%12.12x' % MBIDS[0] ])
+        self.assertEqual(list(b), [ '%12.12x' % MBIDS[1] ])
+        self.assertTrue(getHits(BytesIO(engHit(MBIDS[2], 3)), 10, b) is b)
+        self.assertEqual(len(b), 2)
+
+def suite():
+    return unittest.makeSuite(testDemux)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#
+# icecube.daq.eventtable unit tests
+
+from builtins import range
+import unittest
+from icecube.daq.payload import read_payloads, PayloadException
+from icecube.daq.eventtable import read_event21_table, scan_event21
+from io import BytesIO
+import MockPayload as mp
+
+class testEvent21Table(unittest.TestCase):
+    """Unit tests for the columnar type-21 decoder"""
+
+    def setUp(self):
+        bufs = [ ]
+        for i in range(8):
+            bufs.append(mp.sampleEvent21(10000 * (i + 1), i, 1234, 0,
+                                         nhits=i % 4))
+            if i % 3 == 0:
+                bufs.append(mp.sampleEvent19(10000 * (i + 1) + 5, 100 + i))
+        self.data = b"".join(bufs)
+        self.events = [ p for p in read_payloads(BytesIO(self.data))
+                        if p.type == 21 ]
+
+    def testEvents(self):
+        tab = read_event21_table(self.data)
+        self.assertEqual(len(tab.events), len(self.events))
+        self.assertEqual(list(tab.events['uid']),
+                         [ e.uid for e in self.events ])
+        self.assertEqual(list(tab.events['utime']),
+                         [ e.utime for e in self.events ])
+
+    def testHits(self):
+        tab = read_event21_table(self.data)
+        n = 0
+        for iev, evt in enumerate(self.events):
+            hits = [ ]
+            for tr in evt.trigger_records:
+                for h in tr.hits:
+                    if h not in hits: hits.append(h)
+            ev = tab.events[iev]
+            self.assertEqual(ev['hit_stop'] - ev['hit_start'], len(hits))
+            for h in hits:
+                row = tab.hits[n]
+                self.assertEqual(row['event'], iev)
+                self.assertEqual((row['chanid'], row['utime'], row['flags']),
+                                 (h.chanid, h.utime, h.flags))
+                self.assertEqual(bytes(tab.getHitData(n)), bytes(h.data))
+                n += 1
+        self.assertEqual(n, len(tab.hits))
+
+    def testTriggers(self):
+        tab = read_event21_table(self.data)
+        t = 0
+        for iev, evt in enumerate(self.events):
+            for tr in evt.trigger_records:
+                row = tab.triggers[t]
+                self.assertEqual((row['event'], row['type'], row['cfgid'],
+                                  row['srcid'], row['start'], row['end']),
+                                 (iev, tr.trigger_type, tr.cfgid, tr.srcid) +
+                                 tr.interval)
+                hits = [ tab.hits[i]['utime'] for i in tab.getTriggerHits(t) ]
+                self.assertEqual(hits, [ h.utime for h in tr.hits ])
+                t += 1
+        self.assertEqual(t, len(tab.triggers))
+
+    def testOffsets(self):
+        offsets = scan_event21(self.data, max_events=3)
+        tab = read_event21_table(self.data, offsets)
+        self.assertEqual(list(tab.events['uid']), [ 0, 1, 2 ])
+
+    def testBadLength(self):
+        for bad in (self.data[:-5], self.data + b"\0" * 16,
+                    self.data + b"\0" * 8):
+            self.assertRaises(PayloadException, scan_event21, bad)
+            self.assertRaises(PayloadException, read_event21_table, bad)
+        # A bad length after the events asked for is not reached
+        self.assertEqual(len(scan_event21(self.data + b"\0" * 16,
+                                          max_events=8)), 8)
+
+    def testEmpty(self):
+        tab = read_event21_table(b"")
+        self.assertEqual(len(tab.events), 0)
+        self.assertEqual(len(tab.hits), 0)
+        self.assertEqual(len(tab.trigger_hits), 0)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testEvent21Table))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+#
+# icecube.daq.hitarrays unit tests
+
+from builtins import range
+import random
+import unittest
+from struct import pack
+from icecube.daq.hits import domhit
+from icecube.daq.slchit import SLCHit
+from icecube.daq.hitarrays import decode_eng_hits, scan_eng_records, \
+     slc_words, slc_words_from, slc_header_columns
+import MockPayload as mp
+
+def samples(n, seed):
+    return [ (seed * 37 + 11 * i) % 1024 for i in range(n) ]
+
+class testEngHitBatch(unittest.TestCase):
+    """Unit tests for the batch engineering-hit decoder"""
+
+    def records(self):
+        recs = [ ]
+        for i in range(6):
+            recs.append(mp.engRecord(0x123456789a + i, samples(8, i),
+                [ (3, samples(32, i + 1)), (7, samples(64, i + 2)),
+                  (11, samples(16, i + 3)), (0, None) ],
+                chip=i % 2, trigger=i % 3))
+        # Other layouts: byte samples, no FADC, trailing padding
+        recs.append(mp.engRecord(42, [], [ (1, [ -5, 7 ] * 16), (0, None),
+                                           (0, None), (15, samples(128, 9)) ]))
+        recs.append(mp.engRecord(43, samples(16, 4),
+                                 [ (3, samples(32, 5)), (0, None),
+                                   (0, None), (0, None) ], pad=6))
+        return recs
+
+    def testMatchesDomhit(self):
+        recs = self.records()[:6] + self.records()[7:]
+        b = decode_eng_hits(b"".join(recs))
+        self.assertEqual(len(b), len(recs))
+        for i, rec in enumerate(recs):
+            h = domhit('0123456789ab', rec)
+            self.assertEqual(b.domclk[i], h.domclk)
+            self.assertEqual(b.atwd_chip[i], h.atwd_chip)
+            self.assertEqual(b.evt_trig_flag[i], h.evt_trig_flag)
+            self.assertEqual(list(b.fadc[i, :b.nfadc[i]]), list(h.fadc))
+            for ich in range(4):
+                n = b.natwd[i, ich]
+                if h.atwd[ich] is None:
+                    self.assertEqual(n, 0)
+                else:
+                    self.assertEqual(list(b.atwd[ich][i, :n]),
+                                     list(h.atwd[ich]))
+
+    def testMixedLayouts(self):
+        recs = self.records()
+        b = decode_eng_hits(b"".join(recs))
+        self.assertEqual(b.fadc.shape, (8, 16))
+        self.assertEqual([ x.shape[1] for x in b.atwd ], [ 32, 64, 16, 128 ])
+        self.assertEqual(list(b.natwd[6]), [ 32, 0, 0, 128 ])
+        self.assertEqual(list(b.atwd[0][6, :4]), [ -5, 7, -5, 7 ])
+        self.assertEqual(b.nfadc[6], 0)
+        self.assertEqual(list(b.fadc[6]), [ 0 ] * 16)
+        self.assertEqual(list(b.fadc[7]), samples(16, 4))
+        self.assertEqual(b.length[7], len(recs[7]))
+        self.assertEqual(b.domclk[7], 43)
+
+    def testOffsets(self):
+        recs = self.records()
+        buf = b"".join(recs)
+        offsets = scan_eng_records(buf)
+        self.assertEqual(len(offsets), len(recs))
+        b = decode_eng_hits(buf, offsets[2:4])
+        self.assertEqual(list(b.domclk), [ 0x123456789c, 0x123456789d ])
+        self.assertEqual(list(b.fadc[1]), samples(8, 3))
+
+    def testEmpty(self):
+        b = decode_eng_hits(b"")
+        self.assertEqual(len(b), 0)
+        self.assertEqual(b.fadc.shape, (0, 0))
+
+    def testBadLength(self):
+        rec = self.records()[0]
+        self.assertRaises(ValueError, decode_eng_hits, rec[:-1])
+
+class testSLCHitColumns(unittest.TestCase):
+    """Unit tests for the columnar SLC header decoder"""
+
+    def testMatchesSLCHit(self):
+        rnd = random.Random(5)
+        hits = [ SLCHit(pack(">qII", 0, rnd.getrandbits(32),
+                             rnd.getrandbits(32))) for i in range(500) ]
+        c = slc_header_columns(slc_words(hits))
+        self.assertEqual(len(c), 500)
+        for i, h in enumerate(hits):
+            for name in ('trigger', 'lc', 'fadc_avail', 'atwd_avail',
+                         'atwd_channels', 'atwd_chip', 'hit_size'):
+                self.assertEqual(getattr(c, name)[i], getattr(h, name), name)
+            self.assertEqual((c.chargestamp_pos[i], c.chargestamp_pre[i],
+                              c.chargestamp_max[i], c.chargestamp_post[i]),
+                             h.chargestamp)
+
+    def testWordsFromBuffer(self):
+        bufs = [ pack(">qII", i, 0x8000 | i, 0x1000 + i) + b"\x00" * i
+                 for i in range(5) ]
+        offsets = [ sum(map(len, bufs[:i])) for i in range(5) ]
+        words = slc_words_from(b"".join(bufs), offsets)
+        self.assertEqual(words.tolist(), [ [ 0x8000 | i, 0x1000 + i ]
+                                           for i in range(5) ])
+        le = b"".join([ pack("<qII", 7, 1, 2), pack("<qII", 8, 3, 4) ])
+        self.assertEqual(slc_words_from(le, [ 0, 16 ], True).tolist(),
+                         [ [ 1, 2 ], [ 3, 4 ] ])
+
+    def testRangeBit(self):
+        w2 = (1 << 31) | (3 << 27) | (511 << 18) | (256 << 9) | 1
+        c = slc_header_columns([ (0, w2), (0, w2 & 0x7fffffff) ])
+        self.assertEqual(list(c.chargestamp_pos), [ 3, 3 ])
+        self.assertEqual(list(c.chargestamp_pre), [ 1022, 511 ])
+        self.assertEqual(list(c.chargestamp_max), [ 512, 256 ])
+        self.assertEqual(list(c.chargestamp_post), [ 2, 1 ])
+
+    def testEmpty(self):
+        self.assertEqual(len(slc_header_columns(slc_words([]))), 0)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testEngHitBatch))
+    suite.addTest(unittest.makeSuite(testSLCHitColumns))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
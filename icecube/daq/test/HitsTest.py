@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+#
+# icecube.daq.hits unit tests
+
+from builtins import range
+import unittest
+from io import BytesIO
+from struct import pack
+from icecube.daq.hits import domhit, lazyhit, _UNDECODED
+from icecube.daq.payload import decode_payload
+from icecube.daq.util import nextHit
+import MockPayload as mp
+
+def samples(n, seed):
+    return [ (seed * 37 + 11 * i) % 1024 for i in range(n) ]
+
+class testLazyHit(unittest.TestCase):
+    """Unit tests for the lazily decoded domhit"""
+
+    def records(self):
+        return [ mp.engRecord(0x123456789a, samples(8, 1),
+                     [ (3, samples(32, 2)), (7, samples(64, 3)),
+                       (11, samples(16, 4)), (15, samples(128, 5)) ],
+                     chip=1, trigger=2),
+                 mp.engRecord(42, [], [ (1, [ 5, 7 ] * 16), (0, None),
+                                        (0, None), (15, samples(128, 9)) ]),
+                 mp.engRecord(43, samples(16, 4),
+                     [ (0, None), (0, None), (3, samples(32, 5)),
+                       (0, None) ], pad=6) ]
+
+    def testMatchesDomhit(self):
+        for rec in self.records():
+            h = domhit('0123456789ab', rec)
+            x = lazyhit('0123456789ab', rec)
+            self.assertEqual((x.domid, x.mbid), (h.domid, h.mbid))
+            self.assertEqual(x.domclk, h.domclk)
+            self.assertEqual(x.atwd_chip, h.atwd_chip)
+            self.assertEqual(x.evt_trig_flag, h.evt_trig_flag)
+            self.assertEqual(x.fadc, h.fadc)
+            # Channels in reverse order, so offsets are not carried over
+            for ich in (3, 2, 1, 0):
+                self.assertEqual(x.atwd[ich], h.atwd[ich])
+            self.assertEqual(x.atwd, h.atwd)
+            self.assertEqual(len(x.atwd), 4)
+
+    def testLazy(self):
+        x = lazyhit('0123456789ab', self.records()[0])
+        self.assertTrue(x._fadc is None and x._atwd is None)
+        x.atwd[2]
+        self.assertTrue(x._fadc is None)
+        self.assertEqual([ w is _UNDECODED for w in x._atwd ],
+                         [ True, True, False, True ])
+        self.assertFalse(hasattr(x, '__dict__'))
+
+    def testAssign(self):
+        x = lazyhit('0123456789ab', self.records()[1])
+        x.atwd[1] = [ 1, 2, 3 ]
+        x.fadc = [ 4 ]
+        x.utclk = 1234
+        self.assertEqual(x.atwd[1], [ 1, 2, 3 ])
+        self.assertEqual(x.fadc, [ 4 ])
+        self.assertEqual(x.atwd[0], domhit('x', self.records()[1]).atwd[0])
+
+    def testBlank(self):
+        x = lazyhit('0123456789ab')
+        self.assertEqual(x.atwd, [ None, None, None, None ])
+        self.assertRaises(AttributeError, getattr, x, 'fadc')
+        x.decode(memoryview(self.records()[2]))
+        self.assertEqual(x.domclk, 43)
+        self.assertEqual(list(x.atwd[2]), samples(32, 5))
+
+    def testAnalysisAccess(self):
+        # Waveform access as in examples/syncoil.py and examples/ot.py
+        for rec in self.records():
+            h = domhit('0123456789ab', rec)
+            x = lazyhit('0123456789ab', rec)
+            x.utclk = h.utclk = 99
+            for ch in range(4):
+                if h.atwd[ch] is None or len(h.atwd[ch]) == 0: continue
+                pad = lambda w: [ w[0] ] * (128 - len(w)) + list(w)
+                self.assertEqual(pad(x.atwd[ch]), pad(h.atwd[ch]))
+            self.assertEqual((x.domid, x.domclk, x.utclk),
+                             (h.domid, h.domclk, h.utclk))
+
+    def testFactories(self):
+        rec = self.records()[0]
+        hdr = pack('>iiq8xq', 32 + len(rec), 2, 0x0123456789ab, 555)
+        h = nextHit(BytesIO(hdr + rec))
+        self.assertTrue(isinstance(h, domhit))
+        h = nextHit(BytesIO(hdr + rec), lazy=True)
+        self.assertTrue(isinstance(h, lazyhit))
+        self.assertEqual((h.domid, h.utclk), ('0123456789ab', 555))
+        rdout = mp.readoutData(1000, 1, (900, 1100),
+                               [ mp.engHit(1000, 0x0123456789ab, rec) ])
+        trig = mp.triggerRequest(1000, 1, (900, 1100), [ ])
+        evt = decode_payload(BytesIO(mp.event(19, 1000, 1, (900, 1100),
+                                              1000, 0, [ trig, rdout ])))
+        hits = evt.getHits()
+        self.assertTrue(isinstance(hits[0], domhit))
+        hits = evt.getHits(lazy=True)
+        self.assertEqual(len(hits), 1)
+        self.assertTrue(isinstance(hits[0], lazyhit))
+        self.assertEqual(hits[0].atwd, domhit('x', rec).atwd)
+
+def suite():
+    return unittest.makeSuite(testLazyHit)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+#
+# icecube.daq.merge unit tests
+
+from builtins import range
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from struct import pack
+from icecube.daq.merge import HitMerger, merge_hits, hit_file, payload_hits
+from icecube.daq.util import compress_hits
+import MockPayload as mp
+
+class Hit(object):
+    def __init__(self, utclk, tag):
+        self.utclk = utclk
+        self.tag = tag
+        self.domclk = utclk
+
+def engRecord(domclk):
+    return mp.engRecord(domclk, [ 1, 2, 3, 4 ], [ (3, list(range(32))),
+                        (0, None), (0, None), (0, None) ])
+
+class testMerge(unittest.TestCase):
+    """Unit tests for the time-ordered hit merger"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def streams(self, k=5, n=200, seed=1):
+        rng = random.Random(seed)
+        out = [ ]
+        for s in range(k):
+            t = sorted(rng.sample(range(100000), n))
+            out.append([ Hit(x, (s, i)) for i, x in enumerate(t) ])
+        return out
+
+    def testOrder(self):
+        streams = self.streams()
+        merged = list(merge_hits(streams))
+        self.assertEqual(len(merged), 1000)
+        ref = sorted([ h for s in streams for h in s ],
+                     key=lambda h: (h.utclk, h.tag))
+        self.assertEqual([ h.tag for h in merged ], [ h.tag for h in ref ])
+
+    def testBoundedMemory(self):
+        held = [ 0 ]
+        def gen(hits):
+            for h in hits:
+                held[0] += 1
+                yield h
+        streams = self.streams(4, 100)
+        out = 0
+        for h in merge_hits([ gen(s) for s in streams ]):
+            out += 1
+            # One hit per stream, and the one just read, are held
+            self.assertTrue(held[0] - out <= 4 + 1)
+        self.assertEqual(out, 400)
+
+    def testWindow(self):
+        streams = self.streams(3, 300, 2)
+        rng = random.Random(3)
+        for s in streams:
+            # Jitter the order within 50 ticks
+            s.sort(key=lambda h: h.utclk + rng.randrange(50))
+        m = HitMerger(streams, window=50)
+        times = [ h.utclk for h in m ]
+        self.assertEqual(times, sorted(times))
+        self.assertEqual((m.late, m.count), (0, 900))
+        # Without the window some hits come late
+        m = HitMerger(streams)
+        self.assertEqual(len(list(m)), 900)
+        self.assertTrue(m.late > 0)
+
+    def testTcal(self):
+        streams = [ [ Hit(10 * i, (0, i)) for i in range(10) ],
+                    [ Hit(10 * i, (1, i)) for i in range(10) ] ]
+        def tcal(h):
+            # Stream 1 is 5 ticks ahead
+            h.utclk = h.domclk + 5 * h.tag[0]
+        merged = [ h.tag for h in merge_hits(streams, tcal) ]
+        self.assertEqual(merged[:4], [ (0, 0), (1, 0), (0, 1), (1, 1) ])
+
+    def testHitFiles(self):
+        paths = [ ]
+        for k in range(3):
+            path = os.path.join(self.dir, '%d.hit' % k)
+            f = open(path, 'wb')
+            for i in range(20):
+                rec = engRecord(i)
+                f.write(pack('>iiq8xq', 32 + len(rec), 2, 0x1000 + k,
+                             1000 * i + 7 * k) + rec)
+            f.close()
+            paths.append(path)
+        merged = list(merge_hits([ hit_file(p) for p in paths ]))
+        self.assertEqual(len(merged), 60)
+        self.assertEqual([ h.utclk for h in merged ],
+                         sorted([ 1000 * i + 7 * k for i in range(20)
+                                  for k in range(3) ]))
+        self.assertEqual(merged[1].domid, '%12.12x' % 0x1001)
+
+    def testCompressedHitFiles(self):
+        paths = [ ]
+        for k in range(2):
+            path = os.path.join(self.dir, '%d.hit' % k)
+            f = open(path, 'wb')
+            for i in range(10):
+                rec = engRecord(100 * i)
+                f.write(pack('>iiq8xq', 32 + len(rec), 2, 0x1000 + k,
+                             1000 * i + 7 * k) + rec)
+            f.close()
+            fin = open(path, 'rb')
+            fout = open(path + '.dc', 'wb')
+            self.assertEqual(compress_hits(fin, fout), 10)
+            fin.close()
+            fout.close()
+            paths.append(path + '.dc')
+        merged = list(merge_hits([ hit_file(p) for p in paths ]))
+        self.assertEqual([ h.utclk for h in merged ],
+                         sorted([ 1000 * i + 7 * k for i in range(10)
+                                  for k in range(2) ]))
+        self.assertEqual(merged[1].domid, '%12.12x' % 0x1001)
+
+        class Calibrator(object):
+            # The second DOM's clock runs 50 ticks ahead
+            def translateDOMtoDOR(self, hit):
+                hit.utclk = hit.domclk - 50 * (hit.domid ==
+                                               '%12.12x' % 0x1001)
+        merged = list(merge_hits([ hit_file(p) for p in paths ],
+                                 Calibrator()))
+        self.assertEqual([ (h.domid[-1], h.utclk) for h in merged[:4] ],
+                         [ ('1', -50), ('0', 0), ('1', 50), ('0', 100) ])
+
+    def testPayloadFiles(self):
+        path = os.path.join(self.dir, 'hub.dat')
+        f = open(path, 'wb')
+        for i in range(5):
+            f.write(mp.engHit(100 * i, 0x2000, engRecord(i)))
+            f.write(mp.deltaHit(100 * i + 50, 0x2001,
+                                pack(">qII", i, 0x8000 | 8, 0)))
+        f.close()
+        path2 = os.path.join(self.dir, 'events.dat')
+        f = open(path2, 'wb')
+        for i in range(3):
+            f.write(mp.sampleEvent19(100 * i + 20, i))
+        f.close()
+        merged = list(merge_hits([ payload_hits(path),
+                                   payload_hits(path2) ]))
+        self.assertEqual(len(merged), 19)
+        times = [ h.utclk for h in merged ]
+        self.assertEqual(times, sorted(times))
+        self.assertEqual(set([ h.domid for h in merged ]),
+                         set([ h.mbid for h in merged ]))
+
+def suite():
+    return unittest.makeSuite(testMerge)
+
+if __name__ == '__main__':
+    unittest.main()
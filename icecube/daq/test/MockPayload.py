@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+#
+# Builders for synthetic DAQ payloads used by the icecube.daq unit tests
+
+from builtins import range
+from builtins import object
+from struct import pack
+
+def envelope(length, type, utime):
+    return pack(">iiq", length, type, utime)
+
+def wrap(type, utime, body):
+    return envelope(16 + len(body), type, utime) + body
+
+def composite(payloads):
+    body = b"".join(payloads)
+    return pack(">ihh", 8 + len(body), 1, len(payloads)) + body
+
+def hitData(utime, mbid, srcid=12001, trigType=2, cfgId=0, mode=1):
+    return wrap(1, utime, pack(">3iqh", trigType, cfgId, srcid, mbid, mode))
+
+def deltaSender(utime, mbid, data, domclk=1234, pedestal=0,
+                word0=0x1234, word2=0x5678):
+    body = pack(">8xQHHHQII", utime, 1, 2, pedestal, domclk, word0, word2)
+    return envelope(54 + len(data), 3, mbid) + body + data
+
+def hwMoniRecord(domclk=0x010203040506, values=None, spe=1000, mpe=50):
+    if values is None:
+        values = list(range(27))
+    body = pack(">Bx27hii", 1, *(list(values) + [spe, mpe]))
+    clk = pack(">q", domclk)[2:]
+    return pack(">hh", 10 + len(body), 0xC8) + clk + body
+
+def moni(utime, mbid, rec):
+    return wrap(5, utime, pack(">q", mbid) + rec)
+
+def triggerRequest(utime, uid, ival, hits, trigType=0, cfgId=0,
+                   srcid=4000, elements=()):
+    body = pack(">hiiiiqq", 5, uid, trigType, cfgId, srcid, ival[0], ival[1])
+    body += pack(">hiii", 1, uid, srcid, len(elements))
+    for elt in elements:
+        body += pack(">2i3q", *elt)
+    return wrap(9, utime, body + composite(hits))
+
+def engHit(utime, mbid, data, fmtid=2):
+    body = pack(">ii", 0, 12001)
+    body += pack(">iiq8xq", 32 + len(data), fmtid, mbid, utime)
+    return wrap(10, utime, body + data)
+
+def engRecord(domclk, fadc, atwd, chip=0, trigger=1, pad=0):
+    """
+    Build an engineering-format hit record: atwd holds 4 tuples
+    (format-nibble, samples) - samples are unused if the nibble
+    leaves the channel off.
+    """
+    body = pack(">%dH" % len(fadc), *fadc)
+    for nibble, samples in atwd:
+        if nibble & 1:
+            fmt = ">%d%s" % (len(samples), "h" if nibble & 2 else "b")
+            body += pack(fmt, *samples)
+    fmt0 = atwd[0][0] | (atwd[1][0] << 4)
+    fmt1 = atwd[2][0] | (atwd[3][0] << 4)
+    hdr = pack(">HHBBBBBB", 16 + len(body) + pad, 1, chip, len(fadc),
+               fmt0, fmt1, trigger, 0) + pack(">q", domclk)[2:]
+    return hdr + body + b"\x00" * pad
+
+def deltaHit(utime, mbid, data, vers=1, pwd=0):
+    body = b"\x00" * 12 + pack(">qhhh", mbid, 1, vers, pwd)
+    return wrap(18, utime, body + data)
+
+def snData(utc, mbid, domclk, scalers, fmtid=300):
+    body = pack(">qhh", mbid, 10 + len(scalers), fmtid)
+    body += pack(">q", domclk)[2:] + bytes(bytearray(scalers))
+    return wrap(16, utc, body)
+
+def readoutData(utime, uid, ival, hits, index=0, last=1, srcid=12001):
+    body = pack(">hihhiqq", 6, uid, index, last, srcid, ival[0], ival[1])
+    return wrap(11, utime, body + composite(hits))
+
+def event(type, utime, uid, ival, run, subrun, composites, eventType=1,
+          cfgId=0, year=2008, srcid=7000):
+    if type == 13:
+        words = (eventType, cfgId, run)
+    elif type == 19:
+        words = (eventType, run, subrun)
+    else:
+        words = (year << 16, run, subrun)
+    body = pack(">hiiqqiii", 7, uid, srcid, ival[0], ival[1], *words)
+    return wrap(type, utime, body + composite(composites))
+
+def event21(utime, uid, run, subrun, hits, trigs, year=2008, span=1000):
+    """
+    Build a type-21 event: hits is a list of tuples
+    (rtype, flags, chanid, dt, data) and trigs a list of tuples
+    (ttype, cfgid, srcid, t0, t1, [hit-indices]).
+    """
+    body = pack(">IHIIII", span, year, uid, run, subrun, len(hits))
+    for rtype, flags, chanid, dt, data in hits:
+        body += pack(">HBBHI", 10 + len(data), rtype, flags, chanid, dt)
+        body += data
+    body += pack(">I", len(trigs))
+    for ttype, cfgid, srcid, t0, t1, idx in trigs:
+        body += pack(">ii4I", ttype, cfgid, srcid, t0, t1, len(idx))
+        body += pack(">%dI" % len(idx), *idx)
+    return wrap(21, utime, body)
+
+def sampleEvent19(utime, uid, run=1000, subrun=0, nhits=3):
+    """A plausible type-19 event /w/ delta-compressed readouts."""
+    mbids = [ 0x1234567890ab + 17*i for i in range(nhits) ]
+    trig  = triggerRequest(utime, uid, (utime, utime + 100),
+                [ hitData(utime + i, mbid) for i, mbid in enumerate(mbids) ],
+                elements=[ (0, -1, utime - 50, utime + 150, -1) ])
+    data  = [ deltaHit(utime + i, mbid, pack(">q", 1000 + i) + b"\x00" * 24)
+              for i, mbid in enumerate(mbids) ]
+    rdout = readoutData(utime, uid, (utime - 50, utime + 150), data)
+    return event(19, utime, uid, (utime - 50, utime + 150), run, subrun,
+                 [ trig, rdout ])
+
+def sampleEvent21(utime, uid, run=1000, subrun=0, nhits=3):
+    """A plausible type-21 event /w/ delta hit records."""
+    hits = [ (1, 0x10, 5 + i, 10*i, pack(">q", 1000 + i) + b"\x01" * 20)
+             for i in range(nhits) ]
+    trigs = [ (0, 1000, 4000, 0, 100, list(range(nhits))),
+              (2, 1010, 4000, 5, 50, [ 0 ][:nhits]) ]
+    return event21(utime, uid, run, subrun, hits, trigs)
+
+def flatten(obj):
+    """
+    Reduce a decoded payload to plain Python values so that the
+    results of different decoders can be compared with ==.
+    """
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return bytes(obj)
+    if isinstance(obj, (list, tuple)):
+        return [ flatten(x) for x in obj ]
+    if isinstance(obj, dict):
+        return dict((k, flatten(v)) for k, v in obj.items())
+    if hasattr(obj, '__dict__') or hasattr(obj, '__slots__'):
+        attrs = dict()
+        for cls in type(obj).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if hasattr(obj, name): attrs[name] = getattr(obj, name)
+        attrs.update(getattr(obj, '__dict__', {}))
+        return (type(obj).__name__, flatten(attrs))
+    return obj
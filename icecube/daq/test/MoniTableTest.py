@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+#
+# icecube.daq.monitable unit tests
+
+from builtins import range
+import random
+import unittest
+from io import BytesIO
+from struct import pack, unpack
+from icecube.daq.monitoring import readMoniStream, readMoniStreamDH
+from icecube.daq.monitable import read_moni_table, HW_FIELDS
+import MockPayload as mp
+
+def asciiMoniRecord(text, domclk=0):
+    return pack(">hh", 10 + len(text), 0xCB) + pack(">q", domclk)[2:] + text
+
+class testMoniTable(unittest.TestCase):
+    """Unit tests for the columnar hardware monitoring reader"""
+
+    def records(self):
+        rnd = random.Random(4)
+        recs = [ ]
+        for i in range(60):
+            mbid = 0xabc000 + rnd.randrange(5)
+            values = [ rnd.randrange(-2000, 4000) for k in range(27) ]
+            values[1] = rnd.randrange(1000, 3000)
+            if i % 7 == 3:
+                rec = asciiMoniRecord(b"hello %d" % i, i)
+            else:
+                rec = mp.hwMoniRecord(0x10000 * i + 7, values,
+                                      rnd.randrange(2000), rnd.randrange(50))
+            recs.append((mbid, 10**12 + 10**9 * i, rec))
+        return recs
+
+    def check(self, table, objects, utc=True):
+        hw = [ ]
+        for mbid in objects:
+            hw += [ m for m in objects[mbid] if m.moniType == 0xC8 ]
+        self.assertEqual(len(table), len(hw))
+        self.assertEqual(sorted(table.doms), sorted(objects))
+        for mbid in objects:
+            rows = table.getDOM(mbid)
+            mine = [ m for m in objects[mbid] if m.moniType == 0xC8 ]
+            self.assertEqual(len(rows), len(mine))
+            for row, m in zip(rows, mine):
+                if utc:
+                    self.assertEqual(row['utc'], m.timestamp)
+                self.assertEqual(row['domclk'], m.getDOMClock())
+                self.assertEqual(row['spe_rate'], m.getSPERate())
+                self.assertEqual(row['mpe_rate'], m.getMPERate())
+                self.assertEqual(row['i1_8v'], m.i1_8v)
+                self.assertEqual(row['voltage_sum'], m.getVoltageSumADC())
+                self.assertAlmostEqual(row['pressure'], m.getPressure(), 9)
+                self.assertEqual(row['temperature'], m.getTemperature())
+                self.assertEqual(row['hv'], m.getHVMonitor())
+                self.assertEqual(row['hv_set'], m.getHVSet())
+                self.assertEqual([ row[name] for name in HW_FIELDS ],
+                                 list(unpack('>27h', m.buf[12:66])))
+
+    def testMoniFile(self):
+        data = b''.join([ pack(">iiq8xq", 32 + len(rec), 2, mbid, utc) + rec
+                          for mbid, utc, rec in self.records() ])
+        objects = readMoniStream(BytesIO(data))
+        for chunk in (100, 1 << 20):
+            self.check(read_moni_table(BytesIO(data), chunk_size=chunk),
+                       objects)
+
+    def testDOMHub(self):
+        recs = self.records()
+        data = b''
+        for i in range(0, len(recs), 3):
+            mbid = recs[i][0]
+            body = b''.join([ r[2] for r in recs[i:i + 3] ])
+            data += pack(">iiq", 16 + len(body), 2, mbid) + body
+        objects = readMoniStreamDH(BytesIO(data))
+        table = read_moni_table(BytesIO(data), 'dh', 150)
+        self.check(table, objects, False)
+        self.assertEqual(set(table['utc']), set([ -1 ]))
+
+    def testPayloads(self):
+        recs = self.records()
+        data = b''.join([ mp.moni(utc, mbid, rec) for mbid, utc, rec in recs ])
+        data += mp.hitData(10**13, 0x1234)
+        objects = readMoniStream(BytesIO(b''.join([
+            pack(">iiq8xq", 32 + len(rec), 2, mbid, utc) + rec
+            for mbid, utc, rec in recs ])))
+        self.check(read_moni_table(BytesIO(data), 'payload', 64), objects)
+
+    def testEmpty(self):
+        table = read_moni_table(BytesIO(b''))
+        self.assertEqual(len(table), 0)
+        self.assertEqual(table.doms, [ ])
+
+    def testBadLength(self):
+        self.assertRaises(ValueError, read_moni_table,
+                          BytesIO(pack(">iiq8xq", 8, 2, 1, 0)))
+
+def suite():
+    return unittest.makeSuite(testMoniTable)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#
+# icecube.daq.parallel unit tests
+
+from builtins import range
+import os
+import shutil
+import tempfile
+import unittest
+from icecube.daq.payload import read_payloads
+from icecube.daq.parallel import read_payloads_parallel
+import MockPayload as mp
+
+class testReadPayloadsParallel(unittest.TestCase):
+    """Unit tests for read_payloads_parallel()"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.files = [ ]
+        for k in range(5):
+            filename = os.path.join(self.dir, 'physics_%d.dat' % k)
+            f = open(filename, 'wb')
+            for i in range(40):
+                # Interleave the times of the files
+                t = 1000 * (5 * i + k) + 7
+                if i % 2:
+                    f.write(mp.sampleEvent21(t, 100 * k + i))
+                else:
+                    f.write(mp.sampleEvent19(t, 100 * k + i))
+                if i % 10 == 0:
+                    f.write(mp.moni(t, 0x1234, mp.hwMoniRecord()))
+            f.close()
+            self.files.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def serial(self):
+        payloads = [ ]
+        for filename in self.files:
+            f = open(filename, 'rb')
+            payloads += [ mp.flatten(p) for p in read_payloads(f) ]
+            f.close()
+        return payloads
+
+    def testUnordered(self):
+        got = [ mp.flatten(p) for p in
+                read_payloads_parallel(self.files, 3, chunk_size=500) ]
+        self.assertEqual(sorted(got, key=repr), sorted(self.serial(), key=repr))
+
+    def testMerged(self):
+        got = list(read_payloads_parallel(self.files, 2, merge=True,
+                                          chunk_size=500))
+        times = [ p.utime for p in got ]
+        self.assertEqual(times, sorted(times))
+        self.assertEqual(len(got), len(self.serial()))
+
+    def testTypes(self):
+        got = list(read_payloads_parallel(self.files, 2, merge=True,
+                                          types=[ 5 ]))
+        self.assertEqual(len(got), 20)
+        self.assertEqual(set(p.type for p in got), set([ 5 ]))
+
+    def testEarlyClose(self):
+        gen = read_payloads_parallel(self.files, 2, merge=True,
+                                     chunk_size=200)
+        first = [ next(gen) for i in range(3) ]
+        gen.close()
+        self.assertEqual([ p.utime for p in first ], [ 7, 7, 1007 ])
+
+    def testFunc(self):
+        got = list(read_payloads_parallel(self.files, 2, merge=True,
+                                          func=uidOfEvent))
+        self.assertEqual(len(got), 200)
+        self.assertEqual(got[:6], [ 0, 100, 200, 300, 400, 1 ])
+
+    def testUnpicklableFunc(self):
+        # The task cannot be sent to the workers; this used to hang
+        gen = read_payloads_parallel(self.files, 2, merge=True,
+                                     func=lambda p: p.uid)
+        self.assertRaises(Exception, list, gen)
+
+def uidOfEvent(p):
+    if p.type in (19, 21): return p.uid
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testReadPayloadsParallel))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+#
+# icecube.daq.payloadindex unit tests
+
+from builtins import range
+import os
+import shutil
+import tempfile
+import unittest
+from icecube.daq.payloadindex import PayloadIndex, INDEX_SUFFIX
+import MockPayload as mp
+
+class testPayloadIndex(unittest.TestCase):
+    """Unit tests for PayloadIndex class"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'physics.dat')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def writeEvents(self, first, n, mode='wb'):
+        f = open(self.filename, mode)
+        for i in range(first, first + n):
+            if i % 2:
+                f.write(mp.sampleEvent21(1000 * (i + 1), i, 1234, i // 4))
+            else:
+                f.write(mp.sampleEvent19(1000 * (i + 1), i, 1234, i // 4))
+        f.close()
+
+    def testBuild(self):
+        self.writeEvents(0, 10)
+        idx = PayloadIndex(self.filename)
+        self.assertEqual(len(idx), 10)
+        self.assertTrue(os.path.exists(self.filename + INDEX_SUFFIX))
+        offset, length, type, utime, uid, run, subrun = idx.entry(5)
+        self.assertEqual((type, utime, uid, run, subrun),
+                         (21, 6000, 5, 1234, 1))
+        self.assertEqual(idx.offset[6], offset + length)
+        self.assertEqual(idx.end, os.path.getsize(self.filename))
+        evt = idx.getPayload(4)
+        self.assertEqual((evt.type, evt.uid), (19, 4))
+        idx.close()
+
+    def testSidecarReload(self):
+        self.writeEvents(0, 6)
+        idx = PayloadIndex(self.filename)
+        reloaded = PayloadIndex(self.filename)
+        self.assertEqual([ reloaded.entry(n) for n in range(len(reloaded)) ],
+                         [ idx.entry(n) for n in range(len(idx)) ])
+
+    def testIncremental(self):
+        self.writeEvents(0, 4)
+        idx = PayloadIndex(self.filename)
+        first = [ idx.entry(n) for n in range(len(idx)) ]
+        self.writeEvents(4, 3, 'ab')
+        # Make sure the mtime changes even on coarse filesystems
+        st = os.stat(self.filename)
+        os.utime(self.filename, (st.st_atime, st.st_mtime + 10))
+        sidecar = self.filename + INDEX_SUFFIX
+        inode = os.stat(sidecar).st_ino
+        grown = PayloadIndex(self.filename)
+        self.assertEqual(len(grown), 7)
+        self.assertEqual([ grown.entry(n) for n in range(4) ], first)
+        self.assertEqual(grown.getPayload(6).uid, 6)
+        grown.close()
+        # The new entries were appended to the sidecar in place
+        self.assertEqual(os.stat(sidecar).st_ino, inode)
+        reloaded = PayloadIndex(self.filename)
+        self.assertEqual([ reloaded.entry(n) for n in range(7) ],
+                         [ grown.entry(n) for n in range(7) ])
+
+    def testLargeIds(self):
+        # Type 21 uids and run numbers are unsigned
+        f = open(self.filename, 'wb')
+        f.write(mp.sampleEvent21(1000, 2**31 + 5, 2**32 - 1, 3))
+        f.close()
+        idx = PayloadIndex(self.filename)
+        self.assertEqual(idx.entry(0)[4:], (2**31 + 5, 2**32 - 1, 3))
+        reloaded = PayloadIndex(self.filename)
+        self.assertEqual(reloaded.entry(0), idx.entry(0))
+
+    def testPartialPayload(self):
+        self.writeEvents(0, 3)
+        f = open(self.filename, 'ab')
+        f.write(mp.sampleEvent19(9000, 9)[:40])
+        f.close()
+        idx = PayloadIndex(self.filename)
+        self.assertEqual(len(idx), 3)
+
+    def testWindow(self):
+        self.writeEvents(0, 10)
+        idx = PayloadIndex(self.filename)
+        self.assertEqual(idx.find(2500, 5000), [ 2, 3, 4 ])
+        self.assertEqual([ e.uid for e in idx.getPayloadsInWindow(7000, 1e9) ],
+                         [ 6, 7, 8, 9 ])
+        self.assertEqual(idx.find(0, 999), [])
+        idx.close()
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testPayloadIndex))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+#
+# icecube.daq.payload unit tests
+
+from builtins import range
+import os
+import tempfile
+import unittest
+from io import BytesIO
+from struct import pack
+from icecube.daq.payload import decode_payload, decode_payload_from, \
+     read_payloads, PayloadStats, PayloadException, make21, convert21, \
+     Event21Writer
+import MockPayload as mp
+
+def allTypes():
+    """One payload of each type the decoders understand."""
+    t = 100000000
+    mbid = 0x0123456789ab
+    return [
+        mp.hitData(t, mbid),
+        mp.deltaSender(t + 1, mbid, b"\x07" * 30),
+        mp.moni(t + 2, mbid, mp.hwMoniRecord()),
+        mp.triggerRequest(t + 3, 7, (t, t + 10), [ mp.hitData(t, mbid) ]),
+        mp.engHit(t + 4, mbid, b"\x01\x02" * 20),
+        mp.readoutData(t + 5, 7, (t, t + 10),
+                       [ mp.deltaHit(t, mbid, b"\x00" * 40) ]),
+        mp.event(13, t + 6, 8, (t, t + 10), 1000, 0,
+                 [ mp.triggerRequest(t, 8, (t, t + 10), []),
+                   mp.readoutData(t, 8, (t, t + 10),
+                                  [ mp.engHit(t, mbid, b"\x05" * 16) ]) ]),
+        mp.deltaHit(t + 7, mbid, b"\x00" * 40),
+        mp.sampleEvent19(t + 8, 9),
+        mp.event(20, t + 9, 10, (t, t + 10), 1000, 3,
+                 [ mp.triggerRequest(t, 10, (t, t + 10), []) ]),
+        mp.sampleEvent21(t + 10, 11),
+        mp.wrap(99, t + 11, b"opaque"),
+        ]
+
+class testDecodePayloadFrom(unittest.TestCase):
+    """Unit tests for the buffer-based payload decoder"""
+
+    def testMatchesStreamDecoder(self):
+        for buf in allTypes():
+            expected = decode_payload(BytesIO(buf))
+            payload, pos = decode_payload_from(buf)
+            self.assertEqual(pos, len(buf))
+            self.assertEqual(mp.flatten(payload), mp.flatten(expected))
+
+    def testOffsets(self):
+        bufs = allTypes()
+        data = b"".join(bufs)
+        pos = 0
+        for buf in bufs:
+            payload, next = decode_payload_from(data, pos)
+            self.assertEqual(next - pos, len(buf))
+            pos = next
+        payload, next = decode_payload_from(data, pos)
+        self.assertEqual(payload, None)
+        self.assertEqual(next, len(data))
+
+    def testHitDataNotCopied(self):
+        buf = bytearray(mp.sampleEvent21(1000, 1))
+        evt, pos = decode_payload_from(buf)
+        hit = evt.trigger_records[0].hits[0]
+        self.assertTrue(isinstance(hit.data, memoryview))
+        self.assertEqual(hit.data.obj, buf)
+
+    def testReadPayloadsMapped(self):
+        bufs = allTypes()
+        f = tempfile.TemporaryFile()
+        try:
+            f.write(b"".join(bufs))
+            f.seek(0)
+            expected = [ mp.flatten(p) for p in read_payloads(f) ]
+            f.seek(0)
+            mapped = [ mp.flatten(p) for p in read_payloads(f, use_mmap=True) ]
+            self.assertEqual(len(mapped), len(bufs))
+            self.assertEqual(mapped, expected)
+        finally:
+            f.close()
+
+    def testReadPayloadsMappedEmpty(self):
+        f = tempfile.TemporaryFile()
+        try:
+            self.assertEqual(list(read_payloads(f, use_mmap=True)), [])
+        finally:
+            f.close()
+
+    def testReadPayloadsMappedBadLength(self):
+        data = b"".join(allTypes())
+        for bad in (data[:-5], data + b"\0" * 16, data + b"\0" * 8):
+            f = tempfile.TemporaryFile()
+            try:
+                f.write(bad)
+                f.seek(0)
+                for types in (None, (19,)):
+                    f.seek(0)
+                    self.assertRaises(PayloadException, list,
+                                      read_payloads(f, use_mmap=True,
+                                                    types=types))
+            finally:
+                f.close()
+
+    def testNoInstanceDict(self):
+        def check(obj):
+            if isinstance(obj, (list, tuple)):
+                for x in obj: check(x)
+            elif hasattr(obj, '__slots__'):
+                self.assertFalse(hasattr(obj, '__dict__'), type(obj).__name__)
+                for cls in type(obj).__mro__:
+                    for name in getattr(cls, '__slots__', ()):
+                        check(getattr(obj, name, None))
+        for buf in allTypes():
+            check(decode_payload_from(buf)[0])
+            check(decode_payload(BytesIO(buf)))
+
+class testLazyDecoding(unittest.TestCase):
+    """Unit tests for lazily decoded event payloads"""
+
+    def testHeaderOnly(self):
+        for buf in (mp.sampleEvent19(5000, 3, 1234, 2),
+                    mp.sampleEvent21(5000, 3, 1234, 2)):
+            evt, pos = decode_payload_from(buf, 0, lazy=True)
+            self.assertEqual(pos, len(buf))
+            self.assertTrue(evt.raw is not None)
+            self.assertEqual((evt.uid, evt.run_number, evt.subrun_number),
+                             (3, 1234, 2))
+            # Reading the header fields decoded nothing of the body
+            self.assertEqual((evt._trigger_request, evt._readout_data,
+                              evt._trigger_records), (None, [ ], None))
+
+    def testMaterialize(self):
+        for buf in allTypes():
+            expected = decode_payload(BytesIO(buf))
+            lazy, pos = decode_payload_from(buf, 0, lazy=True)
+            self.assertEqual(pos, len(buf))
+            if hasattr(lazy, 'materialize'):
+                lazy.trigger_records
+                self.assertEqual(lazy.raw, None)
+            self.assertEqual(mp.flatten(lazy), mp.flatten(expected))
+
+    def testLazyStream(self):
+        data = b"".join(allTypes())
+        expected = [ mp.flatten(p) for p in read_payloads(BytesIO(data)) ]
+        lazy = list(read_payloads(BytesIO(data), lazy=True))
+        self.assertEqual(len(lazy), len(expected))
+        for p in lazy:
+            if hasattr(p, 'materialize'): p.materialize()
+        self.assertEqual([ mp.flatten(p) for p in lazy ], expected)
+
+    def testGetHits(self):
+        evt = decode_payload(BytesIO(mp.sampleEvent19(5000, 3)), lazy=True)
+        self.assertEqual(len(evt.readout_data[0].data), 3)
+        self.assertEqual(len(evt.getTriggers()), 1)
+
+class UnseekableStream(object):
+    def __init__(self, data):
+        self.f = BytesIO(data)
+
+    def read(self, n):
+        return self.f.read(n)
+
+class testFilteredReading(unittest.TestCase):
+    """Unit tests for type-filtered read_payloads()"""
+
+    def setUp(self):
+        self.bufs = allTypes() + allTypes()
+        self.data = b"".join(self.bufs)
+        self.file = tempfile.TemporaryFile()
+        self.file.write(self.data)
+
+    def tearDown(self):
+        self.file.close()
+
+    def streams(self):
+        yield BytesIO(self.data), False
+        yield UnseekableStream(self.data), False
+        self.file.seek(0)
+        yield self.file, True
+
+    def testTypes(self):
+        for f, mapped in self.streams():
+            evts = list(read_payloads(f, mapped, types=(19, 21)))
+            self.assertEqual([ e.type for e in evts ], [ 19, 21, 19, 21 ])
+            self.assertEqual([ e.uid for e in evts ], [ 9, 11, 9, 11 ])
+
+    def testSelect(self):
+        t0 = 100000004
+        for f, mapped in self.streams():
+            sel = list(read_payloads(f, mapped,
+                                     select=lambda t, l, u: u > t0 + 5))
+            # the type-3 envelope carries the mbid in place of utime
+            self.assertEqual(len(sel), 6)
+            self.assertEqual(sel[-1].data, b"opaque")
+
+    def testBadLength(self):
+        evt = mp.sampleEvent19(1000, 1)
+        for bad in (evt + b"\0" * 16, evt + b"\0" * 8, evt[:-5],
+                    self.data[:-5]):
+            for f in (BytesIO(bad), UnseekableStream(bad)):
+                self.assertRaises(PayloadException, list,
+                                  read_payloads(f, types=(21,)))
+
+    def testStats(self):
+        for f, mapped in self.streams():
+            stats = PayloadStats()
+            evts = list(read_payloads(f, mapped, types=[ 5 ], stats=stats))
+            self.assertEqual(len(evts), 2)
+            self.assertEqual(stats.count[21], 2)
+            self.assertEqual(stats.bytes[21], 2 * len(self.bufs[10]))
+            self.assertEqual(stats.decoded, { 5 : 2 })
+            self.assertEqual(sum(stats.bytes.values()), len(self.data))
+            self.assertTrue(len(str(stats).split('\n')) > 10)
+
+class testType21Conversion(unittest.TestCase):
+    """Unit tests for the type-21 event writer"""
+
+    def setUp(self):
+        mbids = [ 0x0123456789ab ] + \
+                [ 0x1234567890ab + 17*i for i in range(3) ]
+        self.chanids = dict((m, 70 + i) for i, m in enumerate(mbids))
+        self.chanid = self.chanids.__getitem__
+
+    def testRoundTrip(self):
+        t = 200000000
+        evt = decode_payload_from(mp.sampleEvent19(t, 12, 1001, 2))[0]
+        buf = make21(evt, self.chanid)
+        e21, n = decode_payload_from(buf)
+        self.assertEqual(n, len(buf))
+        self.assertEqual(e21.type, 21)
+        self.assertEqual(e21.utime, t - 50)
+        self.assertEqual(e21.interval, evt.interval)
+        self.assertEqual((e21.uid, e21.run_number, e21.subrun_number),
+                         (12, 1001, 2))
+        self.assertEqual(len(e21.trigger_records), 1)
+        tr = e21.trigger_records[0]
+        self.assertEqual(tr.interval, (t, t + 100))
+        self.assertEqual(tr.srcid, 4000)
+        self.assertEqual(len(tr.hits), 3)
+        hits = evt.readout_data[0].data
+        for h, rec in zip(hits, tr.hits):
+            self.assertEqual(rec.chanid, self.chanids[h.mbid])
+            self.assertEqual(rec.utime, h.utime)
+            self.assertEqual(bytes(rec.data), bytes(h.data))
+
+    def testYear(self):
+        t = 200000000
+        trig = mp.triggerRequest(t, 1, (t, t + 10), [])
+        evt = decode_payload_from(mp.event(20, t, 1, (t, t + 10), 1, 0,
+                                           [ trig ], year=2009))[0]
+        self.assertEqual(decode_payload_from(make21(evt, year=2011))[0].year,
+                         2009)
+        evt = decode_payload_from(mp.event(19, t, 1, (t, t + 10), 1, 0,
+                                           [ trig ]))[0]
+        self.assertEqual(decode_payload_from(make21(evt))[0].year, 0)
+        self.assertEqual(decode_payload_from(make21(evt, year=2011))[0].year,
+                         2011)
+
+    def testTriggerWithoutReadout(self):
+        t = 200000000
+        mbid = 0x0123456789ab
+        trig = mp.triggerRequest(t, 1, (t, t + 10),
+                                 [ mp.hitData(t, mbid), mp.hitData(t + 3, mbid) ])
+        rdout = mp.readoutData(t, 1, (t, t + 10),
+                               [ mp.engHit(t + 3, mbid, b"\x05" * 16) ])
+        evt = decode_payload_from(mp.event(19, t, 1, (t, t + 10), 1, 0,
+                                           [ trig, rdout ]))[0]
+        e21 = decode_payload_from(make21(evt, self.chanid))[0]
+        hits = e21.trigger_records[0].hits
+        self.assertEqual([ h.utime for h in hits ], [ t + 3 ])
+        self.assertEqual(bytes(hits[0].data), b"\x05" * 16)
+
+    def testUnknownDom(self):
+        evt = decode_payload_from(mp.sampleEvent19(200000000, 1))[0]
+        self.assertRaises(PayloadException, make21, evt)
+        self.assertRaises(PayloadException, make21,
+                          decode_payload_from(mp.sampleEvent21(0, 1))[0],
+                          self.chanid)
+
+    def testWriterBuffer(self):
+        evts = [ decode_payload_from(mp.sampleEvent19(200000000 + i, i))[0]
+                 for i in range(10) ]
+        out = BytesIO()
+        w = Event21Writer(out, self.chanid, bufsize=100)
+        for e in evts: w.write(e)
+        w.close()
+        self.assertEqual(out.getvalue(),
+                         b"".join([ bytes(make21(e, self.chanid))
+                                    for e in evts ]))
+
+    def testConvertStream(self):
+        bufs = allTypes()
+        out = BytesIO()
+        n = convert21(BytesIO(b"".join(bufs)), out, self.chanid)
+        self.assertEqual(n, 3)
+        out.seek(0)
+        conv = list(read_payloads(out))
+        orig = [ decode_payload_from(b)[0] for b in bufs ]
+        self.assertEqual(len(conv), len(orig))
+        for b, p, q in zip(bufs, orig, conv):
+            if getattr(p, 'type', None) in (13, 19, 20):
+                self.assertEqual(q.type, 21)
+                self.assertEqual(q.uid, p.uid)
+            else:
+                self.assertEqual(mp.flatten(q), mp.flatten(p))
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testDecodePayloadFrom))
+    suite.addTest(unittest.makeSuite(testLazyDecoding))
+    suite.addTest(unittest.makeSuite(testFilteredReading))
+    suite.addTest(unittest.makeSuite(testType21Conversion))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
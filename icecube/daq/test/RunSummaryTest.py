@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+#
+# icecube.daq.runsummary unit tests
+
+from builtins import range
+import os
+import shutil
+import tempfile
+import unittest
+from icecube.daq.runsummary import RunSummary, SummaryCache, \
+     summarize_file, merge_summaries
+import MockPayload as mp
+
+class testRunSummary(unittest.TestCase):
+    """Unit tests for RunSummary and SummaryCache"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cachefile = os.path.join(self.dir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def writeFile(self, name, first, n, subrun=0):
+        filename = os.path.join(self.dir, name)
+        f = open(filename, 'wb')
+        for i in range(first, first + n):
+            f.write(mp.sampleEvent19(1000 * (i + 1), i, 1234, subrun))
+        f.close()
+        return filename
+
+    def testSummarize(self):
+        filename = self.writeFile('a.dat', 0, 10)
+        s = summarize_file(filename)
+        self.assertEqual(s.files, [ filename ])
+        self.assertEqual(s.nevents, 10)
+        self.assertEqual((s.first_utime, s.last_utime), (1000, 10000))
+        self.assertEqual(s.subruns, { (1234, 0) : [ 10, 1000, 10000 ] })
+        self.assertEqual(s.triggers, { (4000, 0, 0) : 10 })
+        self.assertEqual(len(s.doms), 3)
+        self.assertEqual(s.doms['%12.12x' % 0x1234567890ab],
+                         [ 10, 0, 1000, 10000 ])
+        self.assertEqual(s.missing, 0)
+        self.assertAlmostEqual(s.timespan(), 9.0E-7)
+
+    def testType21(self):
+        filename = os.path.join(self.dir, 'b.dat')
+        f = open(filename, 'wb')
+        f.write(mp.sampleEvent21(5000, 1, 1234, 2))
+        f.close()
+        s = summarize_file(filename)
+        self.assertEqual(s.triggers, { (4000, 0, 1000) : 1,
+                                       (4000, 2, 1010) : 1 })
+        self.assertEqual(sorted(s.doms), [ 5, 6, 7 ])
+        self.assertEqual(s.doms[6], [ 1, 0, 5010, 5010 ])
+
+    def testMissing(self):
+        t = 1000
+        mbid = 0x0123456789ab
+        trig = mp.triggerRequest(t, 1, (t, t + 10), [ mp.hitData(t, mbid) ])
+        filename = os.path.join(self.dir, 'c.dat')
+        f = open(filename, 'wb')
+        f.write(mp.event(19, t, 1, (t, t + 10), 1, 0, [ trig ]))
+        f.write(mp.sampleEvent19(t + 100, 2))
+        f.close()
+        self.assertEqual(summarize_file(filename).missing, 1)
+
+    def testMerge(self):
+        a = summarize_file(self.writeFile('a.dat', 0, 10))
+        b = summarize_file(self.writeFile('b.dat', 10, 5, subrun=1))
+        s = merge_summaries([ a, b ])
+        self.assertEqual(s.nevents, 15)
+        self.assertEqual(len(s.files), 2)
+        self.assertEqual((s.first_utime, s.last_utime), (1000, 15000))
+        self.assertEqual(s.subruns, { (1234, 0) : [ 10, 1000, 10000 ],
+                                      (1234, 1) : [ 5, 11000, 15000 ] })
+        self.assertEqual(s.triggers, { (4000, 0, 0) : 15 })
+        self.assertEqual(s.doms['%12.12x' % 0x1234567890ab],
+                         [ 15, 0, 1000, 15000 ])
+        # Merging must not alter the merged summaries
+        self.assertEqual(a.nevents, 10)
+        self.assertEqual(merge_summaries([]).nevents, 0)
+
+    def testCache(self):
+        filename = self.writeFile('a.dat', 0, 10)
+        cache = SummaryCache(self.cachefile)
+        self.assertEqual(cache.get(filename).nevents, 10)
+        cache.save()
+        st = os.stat(filename)
+
+        # Same size and mtime - the stale summary is kept
+        self.writeFile('a.dat', 20, 10)
+        os.utime(filename, (st.st_atime, st.st_mtime))
+        cache = SummaryCache(self.cachefile)
+        self.assertEqual(cache.get(filename).first_utime, 1000)
+        self.assertFalse(cache.dirty)
+
+        os.utime(filename, (st.st_atime, st.st_mtime + 10))
+        self.assertEqual(cache.get(filename).first_utime, 21000)
+        self.assertTrue(cache.dirty)
+
+    def testSummarizeFiles(self):
+        files = [ self.writeFile('a.dat', 0, 10),
+                  self.writeFile('b.dat', 10, 5) ]
+        s = SummaryCache(self.cachefile).summarize(files)
+        self.assertEqual(s.nevents, 15)
+        self.assertTrue(os.path.exists(self.cachefile))
+        cache = SummaryCache(self.cachefile)
+        self.assertEqual(cache.summarize(files).nevents, 15)
+        self.assertFalse(cache.dirty)
+
+    def testBadCache(self):
+        f = open(self.cachefile, 'wb')
+        f.write(b'garbage')
+        f.close()
+        filename = self.writeFile('a.dat', 0, 3)
+        self.assertEqual(SummaryCache(self.cachefile).get(filename).nevents, 3)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testRunSummary))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
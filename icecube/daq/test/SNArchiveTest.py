@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+#
+# S2 codec and icecube.daq.snarchive unit tests
+
+from builtins import range
+import random
+import unittest
+from io import BytesIO
+from icecube.daq.supernova import S2Codec, SNData, s2_encode, s2_decode
+from icecube.daq.snseries import DOM_BIN
+from icecube.daq.snarchive import SNArchive, SNArchiveWriter
+import MockPayload as mp
+
+def bitwise_encode(scalers):
+    """The bit at a time S2 encoder, for reference."""
+    out = bytearray()
+    reg = [ 0, 0 ]
+    def push(value, nbits):
+        for i in range(nbits):
+            reg[0] |= ((value >> i) & 1) << reg[1]
+            reg[1] += 1
+            if reg[1] == 8:
+                out.append(reg[0])
+                reg[0] = reg[1] = 0
+    for s in scalers:
+        if s < 4:
+            push((1 << s) - 1, s + 1)
+        else:
+            push(15, 4)
+            push(s, 4)
+    push(15, 4)
+    push(0, 4)
+    if reg[1] > 0: out.append(reg[0])
+    return bytes(out)
+
+def snRecord(utc, mbid, scalers, domclk=0):
+    return SNData(mp.snData(utc, mbid, domclk, scalers)[24:], mbid, utc)
+
+class testS2Codec(unittest.TestCase):
+    """Unit tests for the table driven S2 codec"""
+
+    def testBitstream(self):
+        rnd = random.Random(7)
+        for i in range(200):
+            v = [ rnd.choice([ 0, 0, 1, 2, 3, rnd.randrange(16) ])
+                  for k in range(rnd.randrange(40)) ]
+            self.assertEqual(s2_encode(v), bitwise_encode(v))
+
+    def testCodes(self):
+        self.assertEqual(s2_encode([ ]), b'\x0f')
+        # 0, 1, 2 = 0 10 110 then STOP, least significant bit first
+        self.assertEqual(s2_encode([ 0, 1, 2 ]), bytes(bytearray([ 0xda,
+                                                                   0x03 ])))
+        self.assertEqual(s2_encode([ 3 ]), bytes(bytearray([ 0xf7, 0x00 ])))
+        self.assertEqual(s2_encode([ 9 ]), bytes(bytearray([ 0x9f, 0x0f ])))
+
+    def testRoundTrip(self):
+        rnd = random.Random(8)
+        v = [ rnd.choice([ 0, 0, 0, 1, 1, 2, 3, 15 ]) for i in range(5000) ]
+        codec = S2Codec()
+        codec.encode(v)
+        self.assertEqual(codec.decode(), v)
+        buf = b'ab' + s2_encode(v) + s2_encode([ 4, 5 ])
+        scalers, pos = s2_decode(buf, 2)
+        self.assertEqual(scalers, v)
+        self.assertEqual(s2_decode(buf, pos), ([ 4, 5 ], len(buf)))
+
+    def testErrors(self):
+        self.assertRaises(ValueError, s2_encode, [ 1, 16 ])
+        self.assertRaises(ValueError, s2_decode, s2_encode([ 1, 2 ])[:-1])
+
+class testSNArchive(unittest.TestCase):
+    """Unit tests for the SN scaler archive"""
+
+    def records(self, ndom=6, nrec=40):
+        rnd = random.Random(9)
+        t = [ 10**13 + rnd.randrange(10**9) for d in range(ndom) ]
+        recs = [ ]
+        for i in range(nrec):
+            for d in range(ndom):
+                n = rnd.randrange(300, 700)
+                recs.append(snRecord(t[d], 0x5000 + d,
+                                     [ rnd.choice([ 0, 0, 1, 2, 7 ])
+                                       for k in range(n) ], t[d] // 250))
+                t[d] += n * DOM_BIN
+        return recs
+
+    def write(self, recs, width=30000000000):
+        f = BytesIO()
+        w = SNArchiveWriter(f, width)
+        for sn in recs:
+            w.add(sn)
+        w.close()
+        return SNArchive(BytesIO(f.getvalue())), len(f.getvalue())
+
+    def key(self, sn):
+        return (sn.mbid, sn.utc, sn.domclk, tuple(sn.scalers))
+
+    def testRoundTrip(self):
+        recs = self.records()
+        a, size = self.write(recs)
+        self.assertTrue(len(a) > 3)
+        self.assertTrue(size < sum([ len(sn.scalers) for sn in recs ]) // 2)
+        self.assertEqual(sorted(map(self.key, a.records())),
+                         sorted(map(self.key, recs)))
+
+    def testTimeQuery(self):
+        recs = self.records()
+        a, size = self.write(recs)
+        t0 = 10**13 + 10**11
+        t1 = t0 + 5 * 10**10
+        want = [ self.key(sn) for sn in recs if sn.utc < t1 and sn.utcend > t0 ]
+        got = [ self.key(sn) for sn in a.records(t0, t1) ]
+        self.assertEqual(sorted(got), sorted(want))
+        self.assertTrue(len(a.blocks(t0, t1)) < len(a))
+        self.assertEqual(list(a.records(10**12, 10**12 + 1)), [ ])
+        mbid = '%12.12x' % 0x5002
+        got = [ self.key(sn) for sn in a.records(t0, t1, [ mbid ]) ]
+        self.assertEqual(sorted(got), sorted([ k for k in want
+                                               if k[0] == mbid ]))
+
+    def testBadFile(self):
+        self.assertRaises(ValueError, SNArchive, BytesIO(b'x' * 64))
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testS2Codec))
+    suite.addTest(unittest.makeSuite(testSNArchive))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
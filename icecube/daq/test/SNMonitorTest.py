@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+#
+# icecube.daq.snmonitor unit tests
+
+from builtins import range
+import unittest
+from io import BytesIO
+from struct import pack
+import numpy
+from icecube.daq.supernova import SNData
+from icecube.daq.snseries import DOM_BIN
+from icecube.daq.snmonitor import SNMonitor, sn_monitor
+import MockPayload as mp
+
+SECOND = 10000000000
+NSCALER = SECOND // DOM_BIN
+
+def snRecord(utc, mbid, scalers):
+    data = pack(">hh", 10 + len(scalers), 300) + b"\0" * 6 + scalers
+    return SNData(data, mbid, utc)
+
+def stream(ndom, seconds, seed=3, rate=0.5, burst=None, missing=None):
+    """
+    Records of about 1 s per DOM, in time order; burst is a tuple
+    (t0, t1, extra rate) and missing (t0, t1, DOMs) silences the DOMs
+    in [t0, t1).
+    """
+    rng = numpy.random.RandomState(seed)
+    t = [ 10**13 + rng.randint(DOM_BIN) for d in range(ndom) ]
+    recs = [ ]
+    for s in range(seconds):
+        for d in range(ndom):
+            times = t[d] + DOM_BIN * numpy.arange(NSCALER)
+            mu = numpy.zeros(NSCALER) + rate
+            if burst is not None:
+                mu[(times >= 10**13 + burst[0] * SECOND) &
+                   (times < 10**13 + burst[1] * SECOND)] += burst[2]
+            if missing is None or d not in missing[2] or \
+               not missing[0] <= s < missing[1]:
+                recs.append(snRecord(t[d], 0x100 + d,
+                                     numpy.minimum(rng.poisson(mu), 15)
+                                     .astype('u1').tobytes()))
+            t[d] += NSCALER * DOM_BIN
+    return recs
+
+class testSNMonitor(unittest.TestCase):
+    """Unit tests for the streaming SN significance monitor"""
+
+    def run_monitor(self, recs, **kwargs):
+        mon = SNMonitor(warmup=20, tau=300 * SECOND, **kwargs)
+        results = [ ]
+        for sn in recs:
+            results += mon.add(sn)
+        results += mon.flush()
+        return mon, results
+
+    def testBurst(self):
+        mon, results = self.run_monitor(stream(100, 90, burst=(70, 72, 0.1)))
+        self.assertEqual(len(mon.doms), 100)
+        self.assertEqual(mon.late, 0)
+        for w in mon.windows:
+            rw = [ r for r in results if r.window == w ]
+            quiet = [ r.xi for r in rw if r.t < 10**13 + 69 * SECOND ]
+            loud = [ r.xi for r in rw
+                     if r.t in (10**13 + 715 * SECOND // 10,
+                                10**13 + 72 * SECOND) ]
+            self.assertTrue(len(quiet) > 20)
+            self.assertTrue(max(map(abs, quiet)) < 6, max(quiet))
+            self.assertEqual(len(loud), 2)
+            self.assertTrue(min(loud) > 8, min(loud))
+            self.assertTrue(all([ r.ndom == 100 for r in rw
+                                  if r.t < 10**13 + 80 * SECOND ]))
+
+    def testMissingDOMs(self):
+        gone = set(range(0, 100, 2))
+        mon, results = self.run_monitor(stream(100, 80,
+                                               missing=(50, 60, gone)))
+        during = [ r for r in results if r.window == 5000000000 and
+                   10**13 + 52 * SECOND <= r.t < 10**13 + 60 * SECOND ]
+        self.assertTrue(len(during) > 0)
+        for r in during:
+            self.assertEqual(r.ndom, 50)
+            self.assertAlmostEqual(r.occupancy, 50.0, 6)
+        self.assertTrue(max([ abs(r.xi) for r in results ]) < 6)
+
+    def testLate(self):
+        recs = stream(10, 40)
+        # One DOM arrives 3 s behind - within the default 5 s delay -
+        # and another 8 s behind
+        for lag, mbid in ((3, '%12.12x' % 0x101), (8, '%12.12x' % 0x102)):
+            mine = [ r for r in recs if r.mbid == mbid ]
+            rest = [ r for r in recs if r.mbid != mbid ]
+            recs = rest[:lag * 9] + [ x for i in range(len(mine))
+                                      for x in [ mine[i] ] +
+                                      rest[(lag + i) * 9:(lag + i + 1) * 9] ]
+        mon, results = self.run_monitor(recs)
+        self.assertTrue(mon.late > 0)
+        mon2, results2 = self.run_monitor(stream(10, 40))
+        self.assertEqual(mon2.late, 0)
+        a = [ r.ndom for r in results if r.window == 5000000000 ]
+        self.assertTrue(min(a[-20:]) >= 9)
+
+    def testBreak(self):
+        recs = stream(20, 30)
+        for r in recs[300:]:
+            r.utc += 1000 * SECOND
+        mon, results = self.run_monitor(recs)
+        self.assertTrue(all([ r.ndom <= 20 for r in results ]))
+        self.assertEqual(mon.late, 0)
+        self.assertTrue(mon.closed > 2000)
+
+    def testBadWindow(self):
+        self.assertRaises(ValueError, SNMonitor, (7000000000,))
+
+    def testStream(self):
+        recs = stream(10, 30)
+        data = b''.join([ mp.snData(r.utc, int(r.mbid, 16), 0, r.scalers)
+                          for r in recs ])
+        mon, ref = self.run_monitor(recs)
+        results = list(sn_monitor(BytesIO(data), warmup=20,
+                                  tau=300 * SECOND))
+        self.assertEqual([ (r.t, r.window) for r in results ],
+                         [ (r.t, r.window) for r in ref ])
+        self.assertEqual(list(sn_monitor(BytesIO(data), threshold=100)), [ ])
+
+def suite():
+    return unittest.makeSuite(testSNMonitor)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+#
+# icecube.daq.snseries unit tests
+
+from builtins import range
+import random
+import unittest
+from io import BytesIO
+from icecube.daq.supernova import SNData, SNGapTracker, ScalerComposition, \
+     rebin, procsn, gaps
+from icecube.daq.snseries import SNTimeSeries, sn_series, DOM_BIN
+import MockPayload as mp
+
+def snRecord(utc, mbid, scalers):
+    return SNData(mp.snData(utc, mbid, utc // 250, scalers)[24:], mbid, utc)
+
+class testSNTimeSeries(unittest.TestCase):
+    """Unit tests for the vectorized SN scaler rebinning"""
+
+    def records(self, seed=1, ndom=20, nrec=8):
+        rng = random.Random(seed)
+        recs = [ ]
+        for d in range(ndom):
+            t = 10**12 + rng.randrange(10**9)
+            for i in range(nrec):
+                n = rng.randrange(1, 700)
+                recs.append(snRecord(t, 0x1000 + d,
+                                     [ rng.randrange(16) for k in range(n) ]))
+                t += n * DOM_BIN + rng.choice([ 0, 0, 3 * DOM_BIN ])
+        return recs
+
+    def testMatchesRebin(self):
+        recs = self.records()
+        bw = 5000000000
+        start = min([ r.utc for r in recs ]) // bw * bw
+        ref = [ 0 ] * 10
+        for r in recs:
+            rebin(ref, start, bw, r.scalers, r.utc, DOM_BIN)
+        ts = SNTimeSeries(bw, capacity=2)
+        ts.addBatch(recs[:50])
+        ts.addBatch(recs[50:])
+        self.assertEqual(ts.start, start)
+        self.assertTrue(len(ref) >= ts.nbins)
+        for i in range(len(ref)):
+            c = ts.counts[i] if i < ts.nbins else 0.0
+            self.assertAlmostEqual(c, ref[i], 6)
+        self.assertAlmostEqual(sum(ts.counts),
+                               sum([ sum(r.scalers) for r in recs ]), 6)
+
+    def testOccupancy(self):
+        # Two DOMs covering 3 and 1.5 bins of width 100 DOM bins
+        bw = 100 * DOM_BIN
+        ts = SNTimeSeries(bw, start=0)
+        ts.addBatch([ snRecord(0, 1, [ 1 ] * 300),
+                      snRecord(150 * DOM_BIN, 2, [ 2 ] * 150) ])
+        self.assertEqual(ts.nbins, 3)
+        self.assertEqual(ts.occupancy.tolist(), [ 1.0, 1.5, 2.0 ])
+        self.assertEqual(ts.counts.tolist(), [ 100.0, 200.0, 300.0 ])
+        self.assertEqual(ts.globalArray()[1], (200.0, 150.0))
+        self.assertEqual(ts.binTimes().tolist(), [ 0, bw, 2 * bw ])
+        self.assertAlmostEqual(ts.dom_seconds, 450 * DOM_BIN * 1.0E-10)
+
+    def testMatchesScalerComposition(self):
+        recs = self.records(3, 5, 3)
+        bw = 5000000000
+        ts = SNTimeSeries(bw)
+        ts.addBatch(recs)
+        sc = ScalerComposition(ts.start, bw)
+        for r in recs:
+            for i, s in enumerate(r.scalers):
+                sc.merge(r.utc + i * DOM_BIN, DOM_BIN, s)
+        ref = sc.globalArray()
+        for (c, o), (rc, ro) in zip(ts.globalArray(), ref):
+            self.assertAlmostEqual(c, rc, 6)
+            self.assertAlmostEqual(o, ro, 6)
+        self.assertTrue(all([ x == (0, 0) for x in ref[ts.nbins:] ]))
+
+    def testClipped(self):
+        bw = 100 * DOM_BIN
+        ts = SNTimeSeries(bw, start=1000 * DOM_BIN)
+        ts.addBatch([ snRecord(950 * DOM_BIN, 1, [ 1 ] * 100),
+                      snRecord(0, 2, [ 5 ] * 10) ])
+        self.assertEqual(ts.counts.tolist(), [ 50.0 ])
+        self.assertEqual(ts.occupancy.tolist(), [ 0.5 ])
+
+    def testStream(self):
+        recs = self.records(2, 5, 4)
+        data = b''.join([ mp.snData(r.utc, int(r.mbid, 16), 0, r.scalers)
+                          for r in recs ])
+        ts = sn_series(BytesIO(data), batch=7)
+        ref = SNTimeSeries()
+        ref.addBatch(recs)
+        self.assertEqual(ts.nbins, ref.nbins)
+        for a, b in zip(ts.counts, ref.counts):
+            self.assertAlmostEqual(a, b, 6)
+        a = procsn(BytesIO(data))
+        self.assertAlmostEqual(sum(a), sum(ref.counts), 6)
+
+class testSNGapTracker(unittest.TestCase):
+    """Unit tests for the streaming SN gap tracker"""
+
+    def records(self):
+        # Two DOMs, interleaved; DOM 1 loses 3 and then 40 bins
+        recs = [ ]
+        t = [ 10**12, 10**12 + 12345 ]
+        for i in range(6):
+            for d in range(2):
+                n = 100 + 10 * i
+                recs.append(snRecord(t[d], d + 1, [ 1 ] * n))
+                t[d] += n * DOM_BIN
+                if d == 1 and i in (1, 3):
+                    t[d] += (3 if i == 1 else 40) * DOM_BIN
+        return recs
+
+    def testMatchesGaps(self):
+        recs = self.records()
+        tracker = SNGapTracker()
+        found = [ g for g in map(tracker.add, recs) if g is not None ]
+        self.assertEqual([ (g.mbid, g.lost) for g in found ],
+                         [ ('%12.12x' % 2, 3), ('%12.12x' % 2, 40) ])
+        dom2 = [ r for r in recs if r.mbid == '%12.12x' % 2 ]
+        self.assertEqual(gaps(dom2), [ 1, 3 ])
+        self.assertEqual(found[0].t0, dom2[1].utcend)
+        self.assertEqual(found[0].t1, dom2[2].utc)
+        self.assertEqual(tracker.lost, { '%12.12x' % 1: 0,
+                                         '%12.12x' % 2: 43 })
+        self.assertEqual(tracker.ngaps, 2)
+        self.assertEqual(len(tracker.last), 2)
+        end = max([ r.utcend for r in recs ])
+        late = tracker.close(end + 10 * DOM_BIN)
+        self.assertEqual(sorted([ g.lost for g in late ]), [ 10, 53 ])
+
+    def testDeadTime(self):
+        recs = self.records()
+        data = b''.join([ mp.snData(r.utc, int(r.mbid, 16), r.domclk,
+                                    r.scalers) for r in recs ])
+        tracker = SNGapTracker()
+        bw = 50 * DOM_BIN
+        ts = sn_series(BytesIO(data), bw, batch=5, tracker=tracker)
+        self.assertEqual(tracker.ngaps, 2)
+        # DOM 1 ends 43 bins and 12345 before DOM 2
+        self.assertAlmostEqual(sum(ts.deadtime),
+                               (86 * DOM_BIN + 12345) / float(bw), 6)
+        # Live and dead time add up to both DOMs in the full bins
+        full = ts.occupancy + ts.deadtime
+        self.assertAlmostEqual(max(full[1:-1]), 2.0, 6)
+        self.assertAlmostEqual(min(full[1:-1]), 2.0, 6)
+
+    def testDropout(self):
+        # DOM 1 stops after 2 records; DOM 2 ends with a record 5 bins
+        # after its last one whose DOM clock went back - no bins lost
+        recs = [ r for r in self.records()
+                 if r.mbid == '%12.12x' % 2 or r.utc < 10**12 + 200 * DOM_BIN ]
+        dom1 = [ r for r in recs if r.mbid == '%12.12x' % 1 ]
+        last = recs[-1]
+        data = b''.join([ mp.snData(r.utc, int(r.mbid, 16), r.domclk,
+                                    r.scalers) for r in recs ]) + \
+            mp.snData(last.utcend + 5 * DOM_BIN, 2, last.domclk, [ 1 ] * 10)
+        bw = 50 * DOM_BIN
+        tracker = SNGapTracker()
+        ts = sn_series(BytesIO(data), bw, tracker=tracker)
+        self.assertEqual(tracker.ngaps, 3)
+        end = last.utcend + 15 * DOM_BIN
+        self.assertAlmostEqual(sum(ts.deadtime),
+                               (43 * DOM_BIN + end - dom1[-1].utcend) /
+                               float(bw), 6)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testSNTimeSeries))
+    suite.addTest(unittest.makeSuite(testSNGapTracker))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
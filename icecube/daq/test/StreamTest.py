@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#
+# icecube.daq.stream unit tests
+
+from builtins import range
+import os
+import bz2
+import gzip
+import lzma
+import shutil
+import tempfile
+import unittest
+from zipfile import ZipFile, ZIP_DEFLATED
+from icecube.daq.stream import open_daq_stream, detect_format
+from icecube.daq.payload import read_payloads
+import MockPayload as mp
+
+class testDaqStream(unittest.TestCase):
+    """Unit tests for open_daq_stream()"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.data = b"".join([ mp.sampleEvent19(1000 * (i + 1), i)
+                               for i in range(50) ])
+        self.files = { }
+        for fmt, opener in (('plain', open), ('gzip', gzip.open),
+                            ('bz2', bz2.open), ('xz', lzma.open)):
+            self.files[fmt] = os.path.join(self.dir, 'physics.' + fmt)
+            f = opener(self.files[fmt], 'wb')
+            f.write(self.data)
+            f.close()
+        self.files['zip'] = os.path.join(self.dir, 'physics.zip')
+        zf = ZipFile(self.files['zip'], 'w', ZIP_DEFLATED)
+        zf.writestr('readme.txt', b'not this one')
+        zf.writestr('physics.dat', self.data)
+        zf.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def open(self, fmt, **kw):
+        if fmt == 'zip': kw['member'] = 'physics.dat'
+        return open_daq_stream(self.files[fmt], **kw)
+
+    def testDetect(self):
+        for fmt, path in self.files.items():
+            self.assertEqual(detect_format(path), fmt)
+
+    def testRead(self):
+        for fmt in self.files:
+            f = self.open(fmt, chunk_size=1000, depth=2)
+            self.assertEqual(f.read(10), self.data[:10])
+            self.assertEqual(f.read(3000), self.data[10:3010])
+            self.assertEqual(f.read(), self.data[3010:])
+            self.assertEqual(f.read(10), b"")
+            f.close()
+
+    def testReadinto(self):
+        f = self.open('gzip', chunk_size=777)
+        buf = bytearray(5000)
+        out = b""
+        while True:
+            n = f.readinto(buf)
+            if n == 0: break
+            out += bytes(buf[:n])
+        self.assertEqual(out, self.data)
+        self.assertEqual(f.tell(), len(self.data))
+        f.close()
+
+    def testPayloads(self):
+        expect = [ e.uid for e in read_payloads(open(self.files['plain'],
+                                                     'rb')) ]
+        for fmt in self.files:
+            f = self.open(fmt, chunk_size=4096)
+            self.assertEqual([ e.uid for e in read_payloads(f) ], expect)
+            f.close()
+            f = self.open(fmt, chunk_size=4096)
+            self.assertEqual(len(list(read_payloads(f, types=(13,)))), 0)
+            f.close()
+
+    def testEarlyClose(self):
+        # The reader thread must not stay blocked on a full queue
+        f = self.open('bz2', chunk_size=100, depth=1)
+        f.read(10)
+        f.close()
+        self.assertFalse(f.thread.is_alive())
+
+    def testError(self):
+        data = open(self.files['gzip'], 'rb').read()
+        f = open(self.files['gzip'], 'wb')
+        f.write(data[:len(data) // 2])
+        f.close()
+        f = self.open('gzip')
+        self.assertRaises(EOFError, f.read)
+        f.close()
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testDaqStream))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
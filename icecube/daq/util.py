@@ -1,11 +1,15 @@
 
 from builtins import range
-from icecube.daq.hits import domhit
+from icecube.daq.hits import domhit, lazyhit
 from icecube.daq.slchit import DeltaCompressedHit
-from struct import unpack
+from icecube.daq.deltacodec import encode_hit
+from struct import unpack, pack
 
-def nextHit(f):
-    "Read a TestDAQ hit stream."
+def nextHit(f, lazy=False):
+    """
+    Read a TestDAQ hit stream.  Engineering hits are domhit objects,
+    or with lazy set lazyhit objects decoding their waveforms on demand.
+    """
     hdr = f.read(32)
     if len(hdr) != 32: return None
     recl, fmt, mbid, utc = unpack('>iiq8xq', hdr)
@@ -13,20 +17,47 @@ def nextHit(f):
     hit = None
     
     if fmt == 2:
-    	hit = domhit('%12.12x' % mbid)
+        hit = (lazyhit if lazy else domhit)('%12.12x' % mbid)
         hit.decode(buf)
         hit.utclk = utc
     elif fmt == 3:
         hit = DeltaCompressedHit(buf[6:], '%12.12x' % mbid, utc, True)
+        hit.utclk = utc
         
     return hit
     
-def getHits(f, count=1000, hits=dict()):
+def compress_hits(fin, fout):
+    """
+    Copy the TestDAQ hit stream fin to fout re-compressing the
+    engineering-format hits into delta-compressed hits (see
+    deltacodec.encode_hit); other records are copied unchanged.
+    Returns the number of compressed hits.
+    """
+    n = 0
+    while True:
+        hdr = fin.read(32)
+        if len(hdr) != 32: return n
+        recl, fmt, mbid, utc = unpack('>iiq8xq', hdr)
+        buf = fin.read(recl-32)
+        if fmt != 2:
+            fout.write(hdr + buf)
+            continue
+        hit = domhit('%12.12x' % mbid, buf)
+        word0, word2, data = encode_hit(hit.fadc, hit.atwd, hit.atwd_chip,
+                                        hit.evt_trig_flag)
+        # nextHit() skips the first 6 bytes of a delta-compressed record
+        body = b'\x00' * 6 + pack('<qII', hit.domclk, word0, word2) + data
+        fout.write(pack('>iiq', 32 + len(body), 3, mbid) + hdr[16:] + body)
+        n += 1
+
+def getHits(f, count=1000, hits=None, lazy=False):
     """Read <count> hits from the file stream, return a
     dictionary map keyed by mainboard ID, with lists of
-    hits as elements."""
+    hits as elements.  Pass the dictionary of a previous
+    call as hits to add to it.  lazy is passed to nextHit()."""
+    if hits is None: hits = dict()
     for i in range(count):
-        h = nextHit(f)
+        h = nextHit(f, lazy)
         if h is None: return hits
         if h.mbid not in hits:
             hits[h.mbid] = list()
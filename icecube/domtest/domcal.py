@@ -160,14 +160,16 @@ class calibrator(object):
                 self.atwd_slope[ch][bin] = self.atwd_fit[ch][bin].getParam("slope")
 
     def recoATWD(self, w, ch, bias):
-        """Returns amplitude calibrated vector from raw ATWD waveform."""
-        lenw = len(w)
+        """Returns amplitude calibrated vector from raw ATWD waveform,
+        or the calibrated rows of a (nhits, nsamples) waveform matrix."""
         u = array(w, 'd')
-        if lenw < 128: u = concatenate((zeros(128-lenw, 'd'), u))
+        lenw = u.shape[-1]
+        if lenw < 128:
+            u = concatenate((zeros(u.shape[:-1] + (128-lenw,), 'd'), u), -1)
         v = self.atwd_intercept[ch] + self.atwd_slope[ch]*u - bias
         # Trim v to correct length
-        v = v[128-lenw:] / self.ampgain[ch%4]
-        return v[::-1]
+        v = v[..., 128-lenw:] / self.ampgain[ch%4]
+        return v[..., ::-1]
 
     def calcATWDFreq(self, dac, atwd):
         return self.freq[atwd].getParam("intercept") + dac * self.freq[atwd].getParam("slope")
@@ -320,27 +322,17 @@ class calibrator(object):
         fadcref = q.getDAC(10)
         q.disableHV()
         time.sleep(5.0)
-        hqx = q.acqX(11, 0x100, 'cpu')
-        hqx.pop(0)
-        fadcped = 0
-        n = 0
-        for h in hqx:
-            fadcped += sum(array(h.fadc, 'd'))
-            n += len(h.fadc)
-        fadcped /= n
+        hqx = q.acqX(11, 0x100, 'cpu', arrays=True)
+        fadcped = hqx.fadc[1:].mean()
 
         q.pulserOn()
         pulser_amp = 300
         q.setDAC(PULSER_DAC, pulser_amp)
         vmax = self.pulser.getParam("slope")*pulser_amp + self.pulser.getParam("intercept")
-        hqx = q.acqX(101, 0x100, 'spe')
-        hqx.pop(0)
-        wmax = 0
-        for h in hqx:
-            # Convert to Volts at FADC input
-            w = 2.00/1024*(array(h.fadc, 'd') - fadcped)
-            wmax += max(w)
-        wmax /= 100
+        hqx = q.acqX(101, 0x100, 'spe', arrays=True)
+        # Convert to Volts at FADC input
+        w = 2.00/1024*(hqx.fadc[1:] - fadcped)
+        wmax = w.max(axis=1).sum() / 100
         self.fadcpar = { 'bias': bias, 'fadc_ref': fadcref, 'pedestal': fadcped,
                          'gain' : wmax / vmax }
         q.pulserOff()
@@ -392,19 +384,11 @@ class calibrator(object):
         for bias in range(1000, 2000, 100):
             q.setDAC(7, bias)
             time.sleep(5.0)
-            ped = [ zeros(128, 'd') for ch in range(8) ]
-            hqx = q.acqX(101, 0x07, 'cpu')
-            hqx.pop(0)
-            hqy = q.acqX(101, 0x70, 'cpu')
-            hqy.pop(0)
-            hqx += hqy
-            for h in hqx:
-                for ch in (0, 1, 2, 4, 5, 6):
-                    if h.atwd[ch]:
-                        ped[ch] += array(h.atwd[ch], 'd')
-            for ch in (0, 1, 2, 4, 5, 6):
-                ped[ch] /= 100.0
-                # print "ATWD A ch%d: %.2f" % (ch, sum(ped[ch])/128)
+            hqx = q.acqX(101, 0x07, 'cpu', arrays=True)
+            hqy = q.acqX(101, 0x70, 'cpu', arrays=True)
+            # Channels not read out are zero in both acquisitions
+            ped = (hqx.atwd[1:].sum(axis=0) + hqy.atwd[1:].sum(axis=0)) / 100.0
+            # print "ATWD A ch%d: %.2f" % (ch, sum(ped[ch])/128)
             scan[bias] = ped
 
         # Loop on channel and bin - do regression fit
@@ -443,14 +427,11 @@ class calibrator(object):
             v = self.pulser.getParam("slope")*p + self.pulser.getParam("intercept")
             # print "Set pulser to %d DAC (%.3g V)" % (p, v)
             time.sleep(0.5)
-            hqx = q.acqX(251, 1 << ch, 'spe')
-            hqx.pop(0)
-            wmin = []
-            for h in hqx:
-                w = array(h.atwd[ch], 'd')
-                x = self.atwd_intercept[ch] + self.atwd_slope[ch]*w - biasvolts
-                wmin.append(min(x))
-            u, var = meanvar(wmin)
+            hqx = q.acqX(251, 1 << ch, 'spe', arrays=True)
+            w = hqx.atwd[1:, ch]
+            x = self.atwd_intercept[ch] + self.atwd_slope[ch]*w - biasvolts
+            wmin = x.min(axis=1)
+            u, var = wmin.mean(), wmin.var()
             std = sqrt(var)
             self.ampgain[ch%4], self.ampgain_error[ch%4] = u/v, std/(v*sqrt(250))
 
@@ -466,8 +447,8 @@ class calibrator(object):
             for s in speed:
                 q.setDAC(4*chip, s)
                 time.sleep(0.5)
-                hqx = q.acqX(3, 0x08 << (chip*4), 'cpu')
-                w   = array(hqx[2].atwd[chip*4+3], 'd')
+                hqx = q.acqX(3, 0x08 << (chip*4), 'cpu', arrays=True)
+                w   = array(hqx.atwd[2, chip*4+3], 'd')
                 # Remove DC
                 wx  = w - sum(w) / len(w)
                 # Should put a window here but I forgot Hamming
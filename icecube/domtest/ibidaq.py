@@ -21,6 +21,7 @@ import time
 import os
 import zlib                     # New zlib decompress of acq dumps (ver >= 2.2)
 from select import select
+import numpy
 
 version     = "3.4"
 
@@ -128,24 +129,7 @@ class hit(object):
         
     def toeng(self):
         """Write self out as engineering event"""
-        afmt = self.format & 0x0f
-        bfmt = (self.format & 0xf0) >> 4
-        a = (afmt != 0)
-        b = (bfmt != 0)
-        # Consolidate formats 
-        if (not a) and b:
-            fmt = bfmt
-        elif (not b) and a:
-            fmt = afmt
-        # Check the unsupported case that A and B readout but different format
-        # If this is the case then revert to the least common denominator
-        elif a and b:
-            fmt = afmt & bfmt
-            afmt = fmt
-            bfmt = fmt
-        else:
-            fmt  = 0
-        abfmt = ((not a) and b) + ((a and b)<<1)
+        afmt, bfmt, fmt, abfmt = _eng_formats(self.format)
         nfadc = len(self.fadc) >> 4
         if nfadc > 255: nfadc = 255
         # Format 63 - non-compliant with LBNL engineering V0!
@@ -174,6 +158,211 @@ class hit(object):
                     eng = eng + struct.pack('>H', self.atwb[i][j])
         return struct.pack('>H', len(eng)) + eng
 
+def acqx_dtype(format):
+    """NumPy dtype of one capture in the acqX dump of readout format."""
+    chans = [ ich for ich in range(8) if format & (1 << ich) ]
+    fields = [ ]
+    if len(chans) > 0:
+        fields.append(('atwd', '<i2', (len(chans), 128)))
+    if format & 0x100:
+        fields.append(('fadc', '<i2', (256,)))
+    fields.append(('clock', '<u8', (2,)))
+    return numpy.dtype(fields)
+
+class acqxdata(object):
+    """Acquisition in array form - see ibx.acqX().  The acqX
+    memory dump is unpacked by a single numpy.frombuffer().
+      - data.atwd[k, i, j] : j-th sample of ATWD channel i (0-3 ATWD-A,
+                             4-7 ATWD-B) of the k-th capture
+      - data.fadc[k, j]    : j-th FADC sample of the k-th capture
+      - data.clock0[k]     : ATWD hit time - latched DOM clock
+      - data.clock1[k]
+      - data.channels      : the ATWD channels read out
+    Channels (and the FADC) not in the readout format are zero.
+    """
+    def __init__(self, zbuf, format, tmod):
+        self.format = format
+        self.trigmode = tmod
+        self.channels = [ ich for ich in range(8) if format & (1 << ich) ]
+        recs = numpy.frombuffer(zbuf, acqx_dtype(format))
+        n = len(recs)
+        self.atwd = numpy.zeros((n, 8, 128), 'i2')
+        if len(self.channels) > 0:
+            self.atwd[:, self.channels] = recs['atwd']
+        self.fadc = numpy.zeros((n, 256), 'i2')
+        if format & 0x100:
+            self.fadc[:] = recs['fadc']
+        self.clock0 = recs['clock'][:, 0].copy()
+        self.clock1 = recs['clock'][:, 1].copy()
+
+    def __len__(self):
+        return len(self.clock0)
+
+    def __getitem__(self, index):
+        """Captures index (a slice or index array) as an acqxdata."""
+        sub = acqxdata.__new__(acqxdata)
+        sub.format = self.format
+        sub.trigmode = self.trigmode
+        sub.channels = self.channels
+        sub.atwd = self.atwd[index]
+        sub.fadc = self.fadc[index]
+        sub.clock0 = self.clock0[index]
+        sub.clock1 = self.clock1[index]
+        return sub
+
+def _eng_formats(format):
+    """ATWD-A and -B formats, common format and A/B flag of toeng()."""
+    afmt = format & 0x0f
+    bfmt = (format & 0xf0) >> 4
+    a = (afmt != 0)
+    b = (bfmt != 0)
+    # Consolidate formats 
+    if (not a) and b:
+        fmt = bfmt
+    elif (not b) and a:
+        fmt = afmt
+    # Check the unsupported case that A and B readout but different format
+    # If this is the case then revert to the least common denominator
+    elif a and b:
+        fmt = afmt & bfmt
+        afmt = fmt
+        bfmt = fmt
+    else:
+        fmt  = 0
+    abfmt = ((not a) and b) + ((a and b)<<1)
+    return afmt, bfmt, fmt, abfmt
+
+_TESTDAQ_HEADER = [ ('recl',     '>i4'),
+                    ('hitfmt',   '>i4'),
+                    ('mbid',     '>i8'),
+                    ('reserved', 'V8'),
+                    ('utc',      '>i8') ]
+
+def eng_dtype(format, testdaq=False):
+    """
+    NumPy dtype of the engineering records hit.toeng() writes for
+    captures of readout format, optionally preceded by the 32-byte
+    TestDAQ .hit file header.  Returns (dtype, channels) where channels
+    are the ATWD channels in the record.
+    """
+    afmt, bfmt, fmt, abfmt = _eng_formats(format)
+    fields = [ ]
+    if testdaq:
+        fields += _TESTDAQ_HEADER
+    fields += [ ('length',   '>u2'),
+                ('fmtid',    '>u2'),
+                ('abfmt',    'u1'),
+                ('nfadc',    'u1'),
+                ('atwdfmt',  'u1', (2,)),
+                ('trigger',  'u1'),
+                ('spare',    'u1'),
+                ('clock_hi', '>u2'),
+                ('clock_lo', '>u4') ]
+    if format & 0x100:
+        fields.append(('fadc', '>u2', (256,)))
+    chans = [ i for i in range(4) if afmt & (1 << i) ] + \
+            [ 4 + i for i in range(4) if bfmt & (1 << i) ]
+    if len(chans) > 0:
+        fields.append(('atwd', '>u2', (len(chans), 128)))
+    return numpy.dtype(fields), chans
+
+def _hit_batches(captures):
+    """Split a list of hits into runs of (format, trigmode, arrays)."""
+    batches = [ ]
+    i = 0
+    while i < len(captures):
+        h = captures[i]
+        j = i + 1
+        while j < len(captures) and captures[j].format == h.format and \
+              captures[j].trigmode == h.trigmode:
+            j += 1
+        run = captures[i:j]
+        data = acqxdata.__new__(acqxdata)
+        data.format = h.format
+        data.trigmode = h.trigmode
+        data.channels = [ ich for ich in range(8) if h.format & (1 << ich) ]
+        data.atwd = numpy.zeros((len(run), 8, 128), 'i2')
+        for ich in data.channels:
+            data.atwd[:, ich] = [ x.atwd[ich] for x in run ]
+        data.fadc = numpy.zeros((len(run), 256), 'i2')
+        if h.format & 0x100:
+            data.fadc[:] = [ x.fadc for x in run ]
+        data.clock0 = numpy.array([ x.clock0 for x in run ], 'u8')
+        data.clock1 = numpy.array([ x.clock1 for x in run ], 'u8')
+        batches.append(data)
+        i = j
+    return batches
+
+def eng_records(captures, mbid=None, utc=0):
+    """
+    Serialize a batch of captures - an acqxdata object or a list of
+    hit objects - into engineering-format records in one pass over a
+    preallocated buffer, which is returned.  The records are
+    byte-identical to hit.toeng() of each capture in turn.  If mbid is
+    given each record is preceded by a TestDAQ .hit header with the
+    mainboard ID mbid (an integer or hex string) and the time utc.
+    """
+    if isinstance(captures, acqxdata):
+        batches = [ captures ]
+    else:
+        batches = _hit_batches(captures)
+    if isinstance(mbid, str):
+        mbid = int(mbid, 16)
+    testdaq = mbid is not None
+    layouts = [ eng_dtype(b.format, testdaq) for b in batches ]
+    buf = bytearray(sum([ dt.itemsize * len(b)
+                          for b, (dt, chans) in zip(batches, layouts) ]))
+    pos = 0
+    for b, (dt, chans) in zip(batches, layouts):
+        n = len(b)
+        if n == 0: continue
+        recs = numpy.frombuffer(buf, dt, n, pos)
+        pos += dt.itemsize * n
+        if testdaq:
+            recs['recl'] = dt.itemsize
+            recs['hitfmt'] = 2
+            recs['mbid'] = mbid
+            recs['utc'] = utc
+        afmt, bfmt, fmt, abfmt = _eng_formats(b.format)
+        # The record length does not include the length field itself
+        recs['length'] = dt.itemsize - (testdaq and 34 or 2)
+        recs['fmtid'] = 62
+        recs['abfmt'] = abfmt
+        recs['nfadc'] = 16 if b.format & 0x100 else 0
+        recs['atwdfmt'] = ((fmt & 1 != 0) * 0x0f + (fmt & 2 != 0) * 0xf0,
+                           (fmt & 4 != 0) * 0x0f + (fmt & 8 != 0) * 0xf0)
+        recs['trigger'] = b.trigmode
+        recs['clock_hi'] = (b.clock0 >> 32) & 0xffff
+        recs['clock_lo'] = b.clock0 & 0xffffffff
+        if b.format & 0x100:
+            recs['fadc'] = b.fadc.view('u2')
+        if len(chans) > 0:
+            recs['atwd'] = b.atwd[:, chans].view('u2')
+    return buf
+
+class hitwriter(object):
+    """
+    Streaming writer of captures to a TestDAQ .hit file of engineering
+    records (hit format 2) - batch by batch, as acqX delivers them.
+        - w = hitwriter(f, q.getId())
+        - w.write(q.acqX(100, 0x107, 'spe', arrays=True)[1:])
+        - w.count           : number of records written
+    The header time is utc (default 0) as no RAPCal time is known.
+    """
+    def __init__(self, f, mbid, utc=0):
+        self.f = f
+        self.mbid = mbid
+        self.utc = utc
+        self.count = 0
+
+    def write(self, captures):
+        buf = eng_records(captures, self.mbid, self.utc)
+        self.f.write(buf)
+        self.count += len(captures)
+
+    def close(self):
+        self.f.flush()
+
 class dorint(object):
     def __init__(self, device):
         """New create routine with driver buffersize discovery."""
@@ -389,7 +578,7 @@ class ibx(object):
         words = struct.unpack('i', self.s.recv(4))
         #print "Uncompressed size: " + str(words[0]*4)
         deco = zlib.decompressobj()
-        data = ''
+        data = bytearray()
         nzb  = 0
         while len(data) < 4*count:
             si, so, sx = select([ self.s ], [], [], self._timeout)
@@ -402,13 +591,13 @@ class ibx(object):
                 data += deco.decompress(deco.unconsumed_tail)
         terminator = deco.unused_data
         try:
-            while terminator[-3:] != '> \n':
+            while terminator[-3:] != b'> \n':
                 terminator += self.s.recv(3)
         except IBEX:
             # Allow timeouts here - TODO fix this bug
             pass
         #print "Compressed size: " + str(nzb)
-        return data
+        return bytes(data)
         
     def getId(self):
         """Returns the DOM mainboard identification string."""
@@ -505,13 +694,15 @@ class ibx(object):
         #fadc = unpack_octal_dump(z)
         return (atwda, atwdb, status)
         
-    def acqX(self, nsample, format, mode):
+    def acqX(self, nsample, format, mode, arrays=False):
         """This is the eXtended acqusition mode
         nsample - # / samples to batch acquire
         format  - ATWD / FADC readout format bitmask
         mode    = 'cpu' or 'spe'.
         Returns a list of hit class objects from
-        which you may extract hit data."""
+        which you may extract hit data - or, if arrays
+        is True, the whole acquisition as an acqxdata
+        object of NumPy arrays."""
         # Compute the number of readout points
         #  . 64  32-bit ints per ATWD channel readout
         #  . 128 32-bit ints if the FADC is readout
@@ -535,10 +726,13 @@ class ibx(object):
         else:
             raise IBEX('Unknown trigger mode ' + mode)
         self.send('%s %s acq-%s' % (nsample, format, mstr))
-        z = io.StringIO(self.zdump(node, 0x1000000))
+        zbuf = self.zdump(node, 0x1000000)
+        if arrays:
+            return acqxdata(zbuf, format, mxde)
         # now - parse the zdump into a managable data structure
+        z = io.BytesIO(zbuf)
         acqlist = [ ]
-        while z.pos < z.len:
+        while z.tell() < len(zbuf):
             acqlist.append( hit(z, format, mxde) )
         return acqlist
 
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+#
+# icecube.domtest.ibidaq acqX dump unit tests
+
+from builtins import range
+import io
+import struct
+import unittest
+from icecube.domtest.ibidaq import hit, acqxdata, acqx_dtype, \
+     eng_records, hitwriter
+from icecube.daq.hits import domhit
+
+def acqxDump(format, ncapture, offset=-100):
+    """Build an acqX memory dump of ncapture captures."""
+    buf = b''
+    for k in range(ncapture):
+        for ich in range(8):
+            if format & (1 << ich):
+                buf += struct.pack('<128h', *[ (k*37 + ich*11 + j*5) % 1000 +
+                                               offset for j in range(128) ])
+        if format & 0x100:
+            buf += struct.pack('<256h', *[ (k + j*3) % 1024
+                                           for j in range(256) ])
+        buf += struct.pack('<2Q', 0x123456789a + 1000*k, k)
+    return buf
+
+class testAcqX(unittest.TestCase):
+    """Unit tests for the array form of acqX dumps"""
+
+    def checkFormat(self, format):
+        zbuf = acqxDump(format, 5)
+        data = acqxdata(zbuf, format, 0x10)
+        self.assertEqual(len(data), 5)
+        self.assertEqual(acqx_dtype(format).itemsize * 5, len(zbuf))
+        z = io.BytesIO(zbuf)
+        for k in range(5):
+            h = hit(z, format, 0x10)
+            for ich in range(8):
+                if h.atwd[ich]:
+                    self.assertEqual(tuple(data.atwd[k, ich]), h.atwd[ich])
+                else:
+                    self.assertFalse(data.atwd[k, ich].any())
+            if format & 0x100:
+                self.assertEqual(tuple(data.fadc[k]), h.fadc)
+            else:
+                self.assertFalse(data.fadc[k].any())
+            self.assertEqual((data.clock0[k], data.clock1[k]),
+                             (h.clock0, h.clock1))
+
+    def testAtwdA(self):
+        self.checkFormat(0x07)
+
+    def testAtwdB(self):
+        self.checkFormat(0x70)
+
+    def testMixed(self):
+        self.checkFormat(0x1a5)
+
+    def testFadcOnly(self):
+        self.checkFormat(0x100)
+
+    def testShapes(self):
+        data = acqxdata(acqxDump(0x08, 3), 0x08, 0x01)
+        self.assertEqual(data.atwd.shape, (3, 8, 128))
+        self.assertEqual(data.fadc.shape, (3, 256))
+        self.assertEqual(data.channels, [ 3 ])
+
+    def testSlice(self):
+        data = acqxdata(acqxDump(0x107, 4), 0x107, 0x01)[1:]
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data.clock1.tolist(), [ 1, 2, 3 ])
+
+class testEngRecords(unittest.TestCase):
+    """Unit tests for the bulk engineering record serializer"""
+
+    def captures(self, format, tmod=0x01, n=4):
+        zbuf = acqxDump(format, n, 0)
+        z = io.BytesIO(zbuf)
+        return acqxdata(zbuf, format, tmod), \
+            [ hit(z, format, tmod) for k in range(n) ]
+
+    def checkFormat(self, format):
+        data, hits = self.captures(format)
+        ref = b''.join([ h.toeng() for h in hits ])
+        self.assertEqual(bytes(eng_records(data)), ref)
+        self.assertEqual(bytes(eng_records(hits)), ref)
+
+    def testFormats(self):
+        for format in (0x01, 0x07, 0x70, 0x100, 0x107, 0x1ff, 0x13c, 0x000):
+            self.checkFormat(format)
+
+    def testMixedHits(self):
+        a, ha = self.captures(0x107, 0x10)
+        b, hb = self.captures(0x030, 0x01, 3)
+        hits = ha[:2] + hb + ha[2:]
+        self.assertEqual(bytes(eng_records(hits)),
+                         b''.join([ h.toeng() for h in hits ]))
+
+    def testEmpty(self):
+        data, hits = self.captures(0x107)
+        self.assertEqual(len(eng_records(data[:0])), 0)
+        self.assertEqual(len(eng_records([ ])), 0)
+
+    def testHitFile(self):
+        data, hits = self.captures(0x107)
+        f = io.BytesIO()
+        w = hitwriter(f, '00013c6271bd', 12345)
+        w.write(data[:2])
+        w.write(hits[2:])
+        w.close()
+        self.assertEqual(w.count, 4)
+        f.seek(0)
+        for h in hits:
+            hdr = f.read(32)
+            recl, fmt, mbid, utc = struct.unpack('>iiq8xq', hdr)
+            self.assertEqual((fmt, mbid, utc), (2, 0x00013c6271bd, 12345))
+            buf = f.read(recl - 32)
+            self.assertEqual(buf, h.toeng())
+            d = domhit('00013c6271bd', buf)
+            self.assertEqual(d.domclk, h.clock0 & 0xffffffffffff)
+        self.assertEqual(f.read(), b'')
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testAcqX))
+    suite.addTest(unittest.makeSuite(testEngRecords))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 from builtins import object
 import zlib
+from struct import unpack
 from zipfile import ZipFile
 
 HITS    = 1
@@ -26,10 +27,12 @@ class dataopen(object):
         elif type == HITS:
             entry = [ n for n in self.zip.namelist() if n[-3:] == "hit" ][0]
         zinf  = self.zip.getinfo(entry)
-        return decostream(open(self.filename, "r"),
-                          zinf.file_offset,
-                          zinf.file_offset + zinf.compress_size
-                          )
+        f = open(self.filename, "rb")
+        # Compressed data follows the local header and its variable fields
+        f.seek(zinf.header_offset + 26)
+        nlen, xlen = unpack("<HH", f.read(4))
+        offset = zinf.header_offset + 30 + nlen + xlen
+        return decostream(f, offset, offset + zinf.compress_size)
 
 class decostream(object):
     """Class decostream allows for decompression of ZIP entries
@@ -42,15 +45,23 @@ class decostream(object):
         self.f.seek(offset, 0)
         self.deco = zlib.decompressobj(-15)
         self.blocksize = blocksize
-        self.buf  = ""
+        self.buf  = b""
+        self.pos  = 0
         
     def read(self, bytes):
-        while len(self.buf) < bytes:
-            nr  = min(self.blocksize, self.limit - self.f.tell())
-            if nr == 0: break
-            tmp = self.f.read(nr)
-            self.buf += self.deco.decompress(tmp)
-        r = self.buf[0:bytes]
-        self.buf = self.buf[bytes:]
+        avail = len(self.buf) - self.pos
+        if avail < bytes:
+            # Collect all the blocks needed and join them once
+            parts = [ self.buf[self.pos:] ]
+            while avail < bytes:
+                nr  = min(self.blocksize, self.limit - self.f.tell())
+                if nr == 0: break
+                tmp = self.deco.decompress(self.f.read(nr))
+                parts.append(tmp)
+                avail += len(tmp)
+            self.buf = b"".join(parts)
+            self.pos = 0
+        r = self.buf[self.pos:self.pos + bytes]
+        self.pos += len(r)
         return r
     
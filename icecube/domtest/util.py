@@ -13,39 +13,43 @@ from builtins import object
 from future.utils import raise_
 import sys, os, time, math, struct
 from icecube.domtest.hits import domhit
+from icecube.daq.hits import lazyhit
 from configparser import ConfigParser
 from .PyBook import Histogram
-from numpy import array, arange, zeros, sum, sqrt
+from numpy import array, arange, zeros, sum, sqrt, maximum, minimum, \
+     concatenate, newaxis
 from numpy.numarray import matrixmultiply
 from numpy.numarray.linear_algebra import linear_least_squares, eigenvalues
 from io import StringIO
 
 debug = 1
 
-def nextHit(f):
-    "Read a TestDAQ hit stream."
+def nextHit(f, lazy=False):
+    "Read a TestDAQ hit stream - as lazyhit objects if lazy is set."
     hdr = f.read(32)
     if len(hdr) != 32: return None
     recl, fmt, mbid, utc = struct.unpack('>iiq8xq', hdr)
     buf = f.read(recl-32)
-    hit = domhit('%12.12x' % mbid)
+    hit = (lazyhit if lazy else domhit)('%12.12x' % mbid)
     hit.decode(buf)
     hit.utclk = utc
     return hit
     
-def getHits(f, count=1000, hits=dict()):
+def getHits(f, count=1000, hits=None, lazy=False):
     """Read <count> hits from the file stream, return a
     dictionary map keyed by mainboard ID, with lists of
-    hits as elements."""
+    hits as elements.  Pass the dictionary of a previous
+    call as hits to add to it.  lazy is passed to nextHit()."""
+    if hits is None: hits = dict()
     for i in range(count):
-        h = nextHit(f)
+        h = nextHit(f, lazy)
         if h is None: return hits
         if h.domid not in hits:
             hits[h.domid] = list()
         hits[h.domid].append(h)
     return hits
 
-def readDHHits(f):
+def readDHHits(f, lazy=False):
     """
     This little number will read the DOMHub-Prod formatted output data
     """
@@ -65,7 +69,7 @@ def readDHHits(f):
             # There could be multiple engineering records cat'd together
             while len(buf) > 0:
                 blen, = struct.unpack('>h', buf[0:2])
-                h = domhit(mbid)
+                h = (lazyhit if lazy else domhit)(mbid)
                 h.decode(buf[0:blen])
                 buf = buf[blen:]
                 d[mbid].append(h)
@@ -112,42 +116,23 @@ def ped_noise(q, nseq=101, ncyc=10):
     # Set the MUXer to LED
     q.mux('ledmux')
 
-    # Init the ped pattern
-    pedpat = []
-    for i in range(8):
-        pedpat.append(zeros(128, 'd'))
+    # Acquire ped pattern - channels not read out stay zero, so the
+    # ATWD-A and ATWD-B acquisitions simply add up
+    hqx = q.acqX(101, 0x07, 'cpu', arrays=True)
+    hqy = q.acqX(101, 0x70, 'cpu', arrays=True)
+    pedpat = (hqx.atwd[1:].sum(axis=0) + hqy.atwd[1:].sum(axis=0)) / 100.0
 
-    # Acquire ped pattern
-    hqx = q.acqX(101, 0x07, 'cpu')
-    hqx.pop(0)
-    hqy = q.acqX(101, 0x70, 'cpu')
-    hqy.pop(0)
-    hqx += hqy
-    
-    for hit in hqx:
-        for ich in range(8):
-            if hit.atwd[ich]:
-                pedpat[ich] += array(hit.atwd[ich], 'd')
-
-    for p in pedpat: p /= 100.0
-
-    mvn = [0] * 8
-    mvx = [0] * 8
-    var = [0] * 8
+    mvn = zeros(8, 'd')
+    mvx = zeros(8, 'd')
+    var = zeros(8, 'd')
 
     for icyc in range(ncyc):
-        hqx = q.acqX(nseq, 0x07, 'cpu')
-        hqx.pop(0)
-        hqy = q.acqX(nseq, 0x70, 'cpu')
-        hqy.pop(0)
-        hqx += hqy
-        for hit in hqx:
-            for ich in range(8):
-                if hit.atwd[ich]:
-                    w = array(hit.atwd[ich], 'd') - pedpat[ich]
-                    mvx[ich] = max(max(w), mvx[ich])
-                    mvn[ich] = min(min(w), mvn[ich])
-                    var[ich] += sum(w**2)
+        hqx = q.acqX(nseq, 0x07, 'cpu', arrays=True)
+        hqy = q.acqX(nseq, 0x70, 'cpu', arrays=True)
+        w = hqx.atwd[1:] + hqy.atwd[1:] - pedpat
+        mvx = maximum(w.max(axis=2).max(axis=0), mvx)
+        mvn = minimum(w.min(axis=2).min(axis=0), mvn)
+        var += (w**2).sum(axis=2).sum(axis=0)
 
     chs = [ ]
     for ich in range(8):
@@ -189,27 +174,28 @@ class PMTGainCalibrator(object):
             # Test out saturation
             mode = 1
             ch   = 0
-            hqx = self.q.acqX(11, 1, 'spe')
-            hqx.pop(0)
-            for h in hqx:
-                if max(h.atwd[0]) > 800:
-                    mode = 2
-                    ch   = 1
-                    break
+            hqx = self.q.acqX(11, 1, 'spe', arrays=True)
+            if hqx.atwd[1:, 0].max() > 800:
+                mode = 2
+                ch   = 1
             for i in range(ncyc):
                 try:
-                    hqx = self.q.acqX(nseq, mode, 'spe')
-                    hqx.pop(0)
-                    for h in hqx:
-                        w = self.cal.recoATWD(
-                            array(h.atwd[ch], 'd'),
-                            ch, 1925.0 / 4096.0 * 5)
-                        wmx = max(w)
-                        for k in range(2, len(w)):
-                            if w[k] == wmx:
-                                pc = 0.02*sum(w[k-4:k+8])/self.freq*1E+06
-                                hist.fill(pc)
-                                break
+                    hqx = self.q.acqX(nseq, mode, 'spe', arrays=True)
+                    w = self.cal.recoATWD(hqx.atwd[1:, ch], ch,
+                                          1925.0 / 4096.0 * 5)
+                    # First peak sample from the third one on
+                    atpeak = w[:, 2:] == w.max(axis=1)[:, newaxis]
+                    found = atpeak.any(axis=1)
+                    k = atpeak.argmax(axis=1) + 2
+                    # Charge in samples k-4 .. k+7 (none if k < 4)
+                    c = concatenate((zeros((len(w), 1), 'd'),
+                                     w.cumsum(axis=1)), axis=1)
+                    rows = arange(len(w))
+                    qsum = c[rows, minimum(k + 8, w.shape[1])] - \
+                           c[rows, maximum(k - 4, 0)]
+                    qsum[k < 4] = 0.0
+                    for pc in 0.02*qsum[found]/self.freq*1E+06:
+                        hist.fill(pc)
                 except IBEX as ibex:
                     print("Caught IBEX error:", ibex, "for DOM", self.q.getId())
 
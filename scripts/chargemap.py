@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+#
+# Per-DOM chargestamp charge summary of a run, e.g.
+#   chargemap.py -j 8 physics_run1234_*.dat.gz
+
+from __future__ import print_function
+from getopt import getopt
+from sys import argv, exit
+import numpy
+from icecube.daq.chargemap import chargemap_files
+
+opts, args = getopt(argv[1:], 'j:b:m:')
+workers = None
+nbins = 128
+max_charge = 3072
+for o, a in opts:
+    if o == '-j':
+        workers = int(a)
+    elif o == '-b':
+        nbins = int(a)
+    elif o == '-m':
+        max_charge = int(a)
+
+if len(args) < 1:
+    print("Usage %s [-j workers] [-b nbins] [-m max-charge] data ..." % argv[0])
+    exit(-1)
+
+cmap = chargemap_files(args, workers, nbins, max_charge)
+centers = cmap.binEdges() + 0.5 * max_charge / nbins
+print("%-14s %10s %10s %10s %5s" % ("dom", "hits", "mean", "overflow", "peak"))
+for dom in sorted(cmap.doms, key=str):
+    q = cmap.getCharge(dom)
+    n = q.sum()
+    if n == 0: continue
+    print("%-14s %10d %10.1f %10d %5d" % (dom, n, numpy.dot(q, centers) / n,
+          q[-1], cmap.getPeak(dom).argmax()))
@@ -2,22 +2,22 @@
 
 from __future__ import print_function
 from sys import argv, exit
-from icecube.daq.payload import read_payloads
+from icecube.daq.runsummary import SummaryCache
 
-data_filename = ''
-
-try:
-    data_filename = argv[1]
-except IndexError:
-    print("Usage %s data" % argv[0])
+if len(argv) < 2:
+    print("Usage %s data ..." % argv[0])
     exit(-1)
 
-data_file = open(data_filename)
-payloads = read_payloads(data_file)
-run = payloads[0].run_number
-subrun = payloads[0].subrun_number
-print("file: %-45s run: %-10d  subrun: %3d  events: %10d" % (data_filename, run, subrun, len(payloads)))
-for p in payloads:
-    if p.subrun_number != subrun:
-        print("  outlying subrun number %5d %5d @ %5d" % (p.run_number, p.subrun_number, p.utime))
-
+cache = SummaryCache()
+for data_filename in argv[1:]:
+    summary = cache.get(data_filename)
+    if summary.nevents == 0:
+        print("file: %-45s contains no events" % data_filename)
+        continue
+    # The subrun of the first event is taken as the file's subrun
+    subruns = sorted(summary.subruns.items(), key=lambda x: x[1][1])
+    run, subrun = subruns[0][0]
+    print("file: %-45s run: %-10d  subrun: %3d  events: %10d" % (data_filename, run, subrun, summary.nevents))
+    for (r, s), (n, t0, t1) in subruns[1:]:
+        print("  outlying subrun number %5d %5d @ %5d (%d events)" % (r, s, t0, n))
+cache.save()
@@ -4,62 +4,83 @@
 
 from __future__ import print_function
 import sys
-from icecube.daq.payload import decode_payload
+from icecube.daq.parallel import read_payloads_parallel
 from icecube.daq.subthresh import checkMissingReadouts
+from icecube.daq.runsummary import SummaryCache
 from getopt import getopt
+from functools import partial
 
 def isAmandaTrig(triggers):
     for srcid, trig in triggers:
         if srcid == 10000: return True
     return False
 
-maxevt  = 100000
-verbose = False
-merged  = 0
-requireIceTopSMT = False
-requireInIceSMT  = False
-requireAmanda    = False
-requirePhysMBT   = False
+def examine(evt, merged=0, requireAmanda=False, requireIceTopSMT=False,
+            requireInIceSMT=False, requirePhysMBT=False):
+    """
+    Runs in the decoding workers - reduce event to what we need.  The
+    options are passed in, the workers do not see this script's globals.
+    """
+    trigs = evt.getTriggers()
+    if merged == 1 and len(trigs) <= 2: return None
+    if merged == -1 and len(trigs) > 2: return None
+    if requireAmanda and not isAmandaTrig(trigs): return None
+    if requireIceTopSMT and (5000, 0) not in trigs: return None
+    if requireInIceSMT and (4000, 0) not in trigs: return None
+    if requirePhysMBT and (4000, 13) not in trigs: return None
+    return evt.uid, evt.utime, trigs, checkMissingReadouts(evt)
 
-opts, args = getopt(sys.argv[1:], 'AIJMPTn:v')
-for o, a in opts:
-    if o == '-A':
-        requireAmanda = True
-    elif o == '-I':
-        requireInIceSMT = True
-    elif o == '-J':
-        merged = -1
-    elif o == '-M':
-        merged = +1
-    elif o == '-P':
-        requirePhysMBT = True
-    elif o == '-T':
-        requireIceTopSMT = True
-    elif o == '-n':
-        maxevt = int(a)
-    elif o == '-v':
-        verbose = True
+def main(argv):
+    maxevt  = 100000
+    verbose = False
+    workers = 1
+    summaries = False
+    cuts = { }
 
-totevt = 0
-totsub = 0
+    opts, args = getopt(argv, 'AIJMPTj:n:sv')
+    for o, a in opts:
+        if o == '-A':
+            cuts['requireAmanda'] = True
+        elif o == '-I':
+            cuts['requireInIceSMT'] = True
+        elif o == '-J':
+            cuts['merged'] = -1
+        elif o == '-M':
+            cuts['merged'] = +1
+        elif o == '-P':
+            cuts['requirePhysMBT'] = True
+        elif o == '-T':
+            cuts['requireIceTopSMT'] = True
+        elif o == '-j':
+            workers = int(a)
+        elif o == '-n':
+            maxevt = int(a)
+        elif o == '-s':
+            summaries = True
+        elif o == '-v':
+            verbose = True
 
-for filename in args:
-    f = open(filename, "rb")
-    while totevt < maxevt:
-        evt = decode_payload(f)
-        if evt is None: break
-        trigs = evt.getTriggers()
-        if merged == 1 and len(trigs) <= 2: continue
-        if merged == -1 and len(trigs) > 2: continue
-        if requireAmanda and not isAmandaTrig(trigs): continue
-        if requireIceTopSMT and (5000, 0) not in trigs: continue
-        if requireInIceSMT and (4000, 0) not in trigs: continue
-        if requirePhysMBT and (4000, 13) not in trigs: continue
+    if summaries:
+        # All events of the files, from the (cached) run summaries
+        summary = SummaryCache().summarize(args)
+        print(summary.nevents, summary.missing,
+              "%.4g" % (float(summary.missing) / float(summary.nevents)))
+        return
+
+    totevt = 0
+    totsub = 0
+
+    events = read_payloads_parallel(args, workers, merge=True,
+                                    func=partial(examine, **cuts))
+    for uid, utime, trigs, missing in events:
+        if totevt == maxevt: break
         totevt += 1
-        if checkMissingReadouts(evt):
+        if missing:
             totsub += 1
-            if verbose: print(evt.uid, evt.utime, evt.getTriggers())
-    if totevt == maxevt: break
+            if verbose: print(uid, utime, trigs)
+    events.close()
+
+    print(totevt, totsub, "%.4g" % (float(totsub) / float(totevt)))
 
-print(totevt, totsub, "%.4g" % (float(totsub) / float(totevt)))
- 
+if __name__ == '__main__':
+    main(sys.argv[1:])
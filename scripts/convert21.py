@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+
+# Re-pack an event file in the type-21 format
+
+from __future__ import print_function
+from sys import argv, exit
+from icecube.daq.payload import convert21
+
+try:
+    infile, outfile = argv[1:3]
+except ValueError:
+    print("Usage %s input output [year]" % argv[0])
+    exit(-1)
+
+year = None
+if len(argv) > 3:
+    year = int(argv[3])
+
+fin = open(infile, 'rb')
+fout = open(outfile, 'wb')
+n = convert21(fin, fout, year=year)
+fout.close()
+fin.close()
+print("%s: converted %d events" % (outfile, n))
@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+
+# Re-compress the engineering-format hits of a TestDAQ hit file
+
+from __future__ import print_function
+from sys import argv, exit
+from icecube.daq.util import compress_hits
+
+try:
+    infile, outfile = argv[1:3]
+except ValueError:
+    print("Usage %s input.hit output.hit" % argv[0])
+    exit(-1)
+
+fin = open(infile, 'rb')
+fout = open(outfile, 'wb')
+n = compress_hits(fin, fout)
+fout.close()
+fin.close()
+print("%s: compressed %d hits" % (outfile, n))
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+#
+# Print the hits of several .hit (or, with -p, payload) files in time
+# order, e.g.
+#   mergehits.py -t run.tcal -w 1000 0001*.hit
+
+from __future__ import print_function
+from getopt import getopt
+from sys import argv, exit
+from icecube.daq.merge import HitMerger, hit_file, payload_hits
+
+opts, args = getopt(argv[1:], 'pt:w:')
+reader = hit_file
+tcal = None
+window = 0
+for o, a in opts:
+    if o == '-p':
+        reader = payload_hits
+    elif o == '-t':
+        from icecube.domtest.rapcal import TimeCalibrator
+        tcal = TimeCalibrator(open(a, 'rb'))
+    elif o == '-w':
+        window = int(a)
+
+if len(args) < 1:
+    print("Usage %s [-p] [-t tcal-file] [-w window] file ..." % argv[0])
+    exit(-1)
+
+merger = HitMerger([ reader(f) for f in args ], tcal, window)
+last = None
+for h in merger:
+    dt = 0 if last is None else h.utclk - last
+    print("%s %20d %12d" % (h.mbid, h.utclk, dt))
+    last = h.utclk
+if merger.late > 0:
+    print("%d hits were out of order by more than the window" % merger.late)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+#
+# Pack the supernova payloads of DAQ files into an S2 scaler archive,
+# e.g.
+#   snarchive.py -o run110000.s2 sn_110000_*.dat
+
+from __future__ import print_function
+from getopt import getopt
+from sys import argv, exit
+from icecube.daq.snarchive import SNArchiveWriter, BLOCK_WIDTH
+from icecube.daq.supernova import SNPayloadReader
+from icecube.daq.stream import open_daq_stream
+
+opts, args = getopt(argv[1:], 'o:w:')
+output = None
+width = BLOCK_WIDTH
+for o, a in opts:
+    if o == '-o':
+        output = a
+    elif o == '-w':
+        width = int(float(a) * 1.0E+10)
+
+if output is None or len(args) < 1:
+    print("Usage %s -o archive [-w block-seconds] file ..." % argv[0])
+    exit(-1)
+
+out = open(output, 'wb')
+w = SNArchiveWriter(out, width)
+nrec = nscaler = 0
+for filename in args:
+    f = open_daq_stream(filename)
+    for sn in SNPayloadReader(f):
+        w.add(sn)
+        nrec += 1
+        nscaler += len(sn.scalers)
+    f.close()
+w.close()
+print("%d records, %d scalers in %d blocks, %.2f bits/scaler" %
+      (nrec, nscaler, len(w.index), 8.0 * out.tell() / max(nscaler, 1)))
+out.close()
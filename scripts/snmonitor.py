@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+#
+# Print the sliding window supernova significances of SN payload
+# files, e.g.
+#   snmonitor.py -t 4 sn_*.dat
+
+from __future__ import print_function
+from getopt import getopt
+from sys import argv, exit
+from icecube.daq.snmonitor import SNMonitor
+from icecube.daq.supernova import SNPayloadReader
+from icecube.daq.stream import open_daq_stream
+
+opts, args = getopt(argv[1:], 't:d:')
+threshold = None
+delay = 50000000000
+for o, a in opts:
+    if o == '-t':
+        threshold = float(a)
+    elif o == '-d':
+        delay = int(float(a) * 1.0E+10)
+
+if len(args) < 1:
+    print("Usage %s [-t threshold] [-d delay-seconds] file ..." % argv[0])
+    exit(-1)
+
+def report(results):
+    for r in results:
+        if threshold is None or r.xi >= threshold:
+            print("%20d %5.1f s %8.2f %10.3f %5d %8.1f" %
+                  (r.t, r.window * 1.0E-10, r.xi, r.dmu, r.ndom, r.occupancy))
+
+mon = SNMonitor(delay=delay)
+for filename in args:
+    f = open_daq_stream(filename)
+    for sn in SNPayloadReader(f):
+        report(mon.add(sn))
+    f.close()
+report(mon.flush())
+if mon.late > 0:
+    print("%d records arrived later than the delay" % mon.late)
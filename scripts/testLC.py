@@ -34,7 +34,7 @@ from struct import *
 from icecube.daq import domapp
 from icecube.daq.hal import *
 from icecube.domtest.rapcal import RAPCal
-from icecube.domtest.hits import domhit
+from icecube.daq.hits import lazyhit
 from icecube.domtest.lightsource import pulser
 
 class dom_harness(object):
@@ -128,7 +128,7 @@ class dom_harness(object):
         hits = list()
         while len(w) > 0:
             nb, = unpack('>H', w[0:2])
-            h  = domhit(self.mbid)
+            h  = lazyhit(self.mbid)
             h.decode(w[0:nb])
             if self.rapcal_ok:
                 h.utclk = self.rapcal.dom2UT(h.domclk)